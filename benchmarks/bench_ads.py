@@ -0,0 +1,196 @@
+"""
+Ad detection: a synthetic session (track, loud ad, track, the same ad again
+mastered at the music's level, track) replayed through the Recorder at 4x
+speed, with Spotify reporting each ad two seconds after it started. Compares how
+much ad audio ends up in the music files, and whether the track before each ad
+survives, with local detection off and on. Also checks that an ad learned
+before a capture sample-rate switch is still recognised by its fingerprint
+after it, and measures detector CPU cost.
+"""
+import os
+import time
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir, config_overrides, fake_track, CollectingProcessor
+from spufify.core.ad_detector import AdDetector
+from spufify.core.recorder import Recorder
+from spufify.core.sources import FileSource
+
+NAME = "ads"
+
+SAMPLE_RATE = 48000
+SPEED = 4.0
+API_DELAY_SEC = 2.0  # Spotify reports the ad this long after it started playing
+GAP_SEC = 0.5
+
+
+def _tone(seconds, frequencies, amplitude):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    signal = sum(np.sin(2 * np.pi * f * t) for f in frequencies)
+    return amplitude * signal / len(frequencies)
+
+
+def _ad(rng, seconds=5.0):
+    """Bursty, spectrally busy content (speech-like syllables over a jingle)."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    jingle = np.sin(2 * np.pi * (600 + 400 * np.sin(2 * np.pi * 0.7 * t)) * t)
+    syllables = (np.sin(2 * np.pi * 4.0 * t) > 0).astype(np.float64)
+    noise = rng.normal(0, 1.0, len(t)) * syllables
+    signal = 0.6 * jingle + 0.4 * noise
+    return signal / np.sqrt(np.mean(signal ** 2))
+
+
+def _rms(signal):
+    return float(np.sqrt(np.mean(signal ** 2)))
+
+
+def _session(seed=0):
+    """Returns (signal, segments) with segments as (kind, start_frame, end_frame, track_index)."""
+    rng = np.random.default_rng(seed)
+    ad = _ad(rng)
+    gap = np.zeros(int(GAP_SEC * SAMPLE_RATE))
+    music = [_tone(8.0, f, 0.15) for f in ([220, 330, 440], [262, 392, 523], [196, 294, 392])]
+    level = _rms(music[0])
+    parts = [
+        ('track', music[0], 0), ('gap', gap, None),
+        ('ad', ad * level * 10 ** (12 / 20), None), ('gap', gap, None),          # mastered 12 dB hotter
+        ('track', music[1], 1), ('gap', gap, None),
+        ('ad', ad * level, None), ('gap', gap, None),                            # same ad, level-matched
+        ('track', music[2], 2),
+    ]
+    segments, start = [], 0
+    for kind, signal, index in parts:
+        segments.append((kind, start, start + len(signal), index))
+        start += len(signal)
+    return np.concatenate([signal for _, signal, _ in parts]), segments
+
+
+def _wait_for(recorder, frame):
+    while recorder.ring.write_pos < frame:
+        time.sleep(0.002)
+
+
+def _run(detect, seed=0):
+    signal, segments = _session(seed)
+    ads = [(start, end) for kind, start, end, _ in segments if kind == 'ad']
+    tracks = {index: (start, end) for kind, start, end, index in segments if kind == 'track'}
+    with temp_output_dir() as out, config_overrides(
+        LOCAL_AD_DETECTION=detect, STREAMING_ENCODE=False, TRIM_SILENCE=False, SPLIT_REFINE=True
+    ):
+        path = os.path.join(out, "session.wav")
+        sf.write(path, signal.astype(np.float32), SAMPLE_RATE, subtype='FLOAT')
+
+        recorder = Recorder(source=FileSource(path, speed=SPEED))
+        recorder.processor = CollectingProcessor()
+        suspected_at = []
+        recorder.on_ad_suspected = lambda: suspected_at.append(recorder.ring.write_pos)
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+
+        for ad_index, (ad_start, ad_end) in enumerate(ads, start=1):
+            # What the Controller does on an ad poll: confirm, then pause
+            _wait_for(recorder, ad_start + API_DELAY_SEC * SAMPLE_RATE)
+            recorder.confirm_ad()
+            recorder.pause_recording()
+            # The next track is reported just as late, with its progress
+            _wait_for(recorder, tracks[ad_index][0] + API_DELAY_SEC * SAMPLE_RATE)
+            track = fake_track(ad_index, progress_ms=int(API_DELAY_SEC * 1000))
+            track['fetched_at'] = time.monotonic()
+            recorder.set_current_metadata(track)
+            recorder.resume_recording()
+
+        recorder.capture_thread.join()
+        recorder.finish_track()
+        deadline = time.monotonic() + 10
+        while len(recorder.processor.tracks) < len(tracks) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=5)
+
+        written = {track_id: frames for track_id, frames in recorder.processor.tracks}
+        results = []
+        for index, (start, end) in tracks.items():
+            frames = written.get(fake_track(index)['track_id'])
+            # Each file starts at its track's start; anything past the track + gap is the ad
+            expected = end - start
+            if index < len(ads):
+                expected += int(GAP_SEC * SAMPLE_RATE)
+            results.append({
+                'track': index,
+                'written': frames is not None,
+                'ad_leak_ms': None if frames is None else max(0, frames - expected) * 1000 / SAMPLE_RATE,
+            })
+        leaks = [r['ad_leak_ms'] for r in results if r['ad_leak_ms'] is not None]
+        stats = recorder.get_stats()
+        return {
+            'detect': detect,
+            'tracks_written': sum(r['written'] for r in results),
+            'tracks_expected': len(tracks),
+            'total_ad_leak_ms': sum(leaks),
+            'per_track': results,
+            'suspicion_delay_ms': [
+                (pos - start) * 1000 / SAMPLE_RATE for pos, (start, _) in zip(suspected_at, ads)
+            ],
+            'recorder': stats.get('ads'),
+        }
+
+
+def _feed(detector, audio, start=0, block=4800):
+    found = []
+    for pos in range(0, len(audio), block):
+        found += detector.process(audio[pos:pos + block, None].repeat(2, axis=1).astype(np.float32), start + pos)
+    return found
+
+
+def _learned_across_rate_switch(new_rate=44100):
+    signal, segments = _session()
+    first_ad = next(segment for segment in segments if segment[0] == 'ad')
+    second_ad = [segment for segment in segments if segment[0] == 'ad'][1]
+    with config_overrides(LOCAL_AD_DETECTION=True):
+        recorder = Recorder(source=FileSource(os.devnull))
+        recorder._create_analyzers(SAMPLE_RATE)
+        detector = recorder.ad_detector
+        _feed(detector, signal[:first_ad[1] + SAMPLE_RATE])
+        detector.learn(first_ad[1])  # Spotify confirmed the ad
+        _feed(detector, signal[first_ad[1] + SAMPLE_RATE:first_ad[2]], start=first_ad[1] + SAMPLE_RATE)
+        learned = len(detector.known)
+
+        # Capture switches rate (or restarts); the ring starts over from frame 0
+        recorder._create_analyzers(new_rate)
+        before = signal[second_ad[1] - 4 * SAMPLE_RATE:second_ad[2]]  # Music, gap, then the level-matched ad
+        t_old = np.arange(len(before)) / SAMPLE_RATE
+        resampled = np.interp(np.arange(int(len(before) * new_rate / SAMPLE_RATE)) / new_rate, t_old, before)
+        found = _feed(recorder.ad_detector, resampled)
+    return {
+        'new_rate': new_rate,
+        'learned_before_switch': learned,
+        'known_after_switch': len(recorder.ad_detector.known),
+        'same_detector': recorder.ad_detector is detector,
+        'fingerprint_match_after_switch': any(reason == 'fingerprint' for _, reason in found),
+    }
+
+
+def _cpu(samplerate, seconds):
+    rng = np.random.default_rng(0)
+    audio = (0.1 * rng.standard_normal((int(seconds * samplerate), 2))).astype(np.float32)
+    detector = AdDetector(samplerate)
+    block = samplerate // 10  # The writer wakes about every 100 ms
+    started = time.perf_counter()
+    for pos in range(0, len(audio), block):
+        detector.process(audio[pos:pos + block], pos)
+    elapsed = time.perf_counter() - started
+    return {'samplerate': samplerate, 'audio_sec': seconds, 'cpu_sec': elapsed, 'core_fraction': elapsed / seconds}
+
+
+def run(quick=False):
+    seconds = 30 if quick else 120
+    return {
+        'detection_off': _run(detect=False),
+        'detection_on': _run(detect=True),
+        'learned_across_rate_switch': _learned_across_rate_switch(),
+        'cpu': [_cpu(rate, seconds) for rate in (48000, 192000)],
+    }
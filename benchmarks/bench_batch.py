@@ -0,0 +1,101 @@
+"""
+Batch re-encode: FLAC -> MP3 (FFmpeg) and FLAC -> WAV (native) over a small
+tagged library with one worker process and with the default pool, then the
+incremental re-run (nothing to do), a re-run after every source was touched
+(contents hashed instead of re-encoded) and an in-place re-tag. A last run
+encodes a WAV and a FLAC that share a name to MP3 and checks that both
+outputs are kept apart, in the outputs and in the incremental state. The
+MP3 outputs' ReplayGain tags (measured from the encode's own decode) are
+checked against a separate measurement of each source.
+"""
+import os
+import shutil
+
+from benchmarks.common import temp_output_dir, config_overrides, write_test_audio
+from spufify import batch
+from spufify.core.encode_pool import default_worker_count
+from spufify.core.encoding import transcode_native
+from spufify.core.loudness import analyze_file
+
+NAME = "batch"
+
+
+def _library(out, tracks, seconds):
+    from spufify.core.processor import Processor
+    from spufify.core.encode_pool import EncodePool
+    processor = Processor(pool=EncodePool(workers=1, max_queue=1, name="bench-tag"))
+    for i in range(tracks):
+        wav = write_test_audio(os.path.join(out, f"source_{i}.wav"), seconds, seed=i)
+        path = os.path.join(out, f"Artist {i} - Track {i}.flac")
+        transcode_native(wav, path, 'flac', bit_depth=24, dither=False)
+        os.remove(wav)
+        metadata = {'title': f"Track {i}", 'artist': f"Artist {i}", 'album': "Bench", 'cover_data': b"\xff\xd8" + bytes(20000)}
+        processor._apply_tags('flac', path, metadata)
+    processor.shutdown(wait=True)
+
+
+def _summary(summary):
+    return {key: summary[key] for key in (
+        'jobs', 'done', 'skipped', 'failed', 'workers', 'wall_s', 'files_per_min', 'realtime_factor', 'mb_per_sec'
+    )}
+
+
+def _same_stem(out, seconds):
+    library = os.path.join(out, "same_stem")
+    os.makedirs(library)
+    wav = write_test_audio(os.path.join(library, "Artist - Song.wav"), seconds, seed=1)
+    transcode_native(write_test_audio(os.path.join(out, "other.wav"), seconds, seed=2),
+                     os.path.join(library, "Artist - Song.flac"), 'flac', bit_depth=16, dither=False)
+    dest = os.path.join(library, "mp3")
+    first = batch.run_batch(library, dest, 'mp3', workers=1)
+    rerun = batch.run_batch(library, dest, 'mp3', workers=1)
+    os.utime(wav, ns=(0, 0))
+    os.truncate(wav, os.path.getsize(wav) - 4)  # Only the WAV changed: only its output is redone
+    changed = batch.run_batch(library, dest, 'mp3', workers=1)
+    outputs = sorted(os.listdir(dest))
+    return {
+        'outputs': outputs,
+        'first': _summary(first),
+        'rerun': _summary(rerun),
+        'after_one_source_changed': _summary(changed),
+        'ok': (outputs == [batch.STATE_FILE, "Artist - Song (flac).mp3", "Artist - Song (wav).mp3"]
+               and first['done'] == 2 and rerun['skipped'] == 2 and changed['done'] == 1 and changed['skipped'] == 1),
+    }
+
+
+def _replaygain(out, dest):
+    from mutagen.id3 import ID3
+    errors = []
+    for name in sorted(os.listdir(out)):
+        if name.endswith('.flac'):
+            expected = analyze_file(os.path.join(out, name))['track_gain_db']
+            tag = ID3(os.path.join(dest, name[:-len('.flac')] + ".mp3")).get('TXXX:REPLAYGAIN_TRACK_GAIN')
+            errors.append(abs(float(tag.text[0].split()[0]) - expected) if tag else None)
+    return {'tracks': len(errors), 'tagged': sum(error is not None for error in errors),
+            'max_gain_error_db': max((error for error in errors if error is not None), default=None)}
+
+
+def run(quick=False):
+    tracks, seconds = (6, 30) if quick else (24, 60)
+    results = {'tracks': tracks, 'track_sec': seconds, 'cpu_workers': default_worker_count()}
+    with temp_output_dir() as out, config_overrides(LIBRARY_INDEX=False):
+        _library(out, tracks, seconds)
+        formats = ['wav'] + (['mp3'] if shutil.which('ffmpeg') else [])
+        for fmt in formats:
+            runs = {}
+            for workers in sorted({1, default_worker_count()}):
+                dest = os.path.join(out, f"{fmt}_{workers}")
+                runs[f"workers_{workers}"] = _summary(batch.run_batch(out, dest, fmt, workers=workers))
+            runs['incremental_rerun'] = _summary(batch.run_batch(out, dest, fmt))
+            for name in os.listdir(out):
+                if name.endswith('.flac'):
+                    os.utime(os.path.join(out, name))
+            runs['rerun_after_touch'] = _summary(batch.run_batch(out, dest, fmt))
+            results[f"flac_to_{fmt}"] = runs
+            if fmt == 'mp3':
+                results['mp3_replaygain'] = _replaygain(out, dest)
+        results['retag'] = _summary(batch.run_batch(out, retag=True))
+        results['retag_rerun'] = _summary(batch.run_batch(out, retag=True))
+        if shutil.which('ffmpeg'):
+            results['same_stem_to_mp3'] = _same_stem(out, 5)
+    return results
@@ -0,0 +1,142 @@
+"""
+Adaptive capture block size: a Recorder with ADAPTIVE_BLOCK_SIZE reading a
+synthetic source with simulated backend discontinuities. Checks that the
+block grows at the dropouts and steps back to the latency target once
+capture has been clean for a while. A second run captures two devices side
+by side through the real LoopbackSource path (a stand-in soundcard module,
+one device reporting discontinuities) and checks that only that device's
+block grows.
+"""
+import sys
+import time
+import types
+import warnings
+
+import numpy as np
+
+from benchmarks.common import temp_output_dir, config_overrides
+from spufify.core import sources
+from spufify.core.block_tuner import BlockSizeTuner
+from spufify.core.recorder import Recorder
+from spufify.core.sources import SignalSource
+
+NAME = "block_tuner"
+
+SAMPLE_RATE = 48000
+
+
+def _sizes(stats):
+    return [change['block_size'] for change in stats['history']]
+
+
+def _signal_dropouts(dropouts, clean_seconds):
+    # Unpaced: the tuner counts frames, not wall time, towards its stable stretch
+    seconds = dropouts[-1] + clean_seconds
+    with temp_output_dir(), config_overrides(ADAPTIVE_BLOCK_SIZE=True, BLOCK_SIZE=1024, REPLAYGAIN=False):
+        recorder = Recorder(source=SignalSource(kind='sine', duration=seconds, samplerate=SAMPLE_RATE,
+                                                dropouts=dropouts, speed=None))
+        started = time.perf_counter()
+        recorder.start_capture_thread()
+        recorder.capture_thread.join(timeout=120)
+        elapsed = time.perf_counter() - started
+        recorder.stop_threads()
+        stats = recorder.block_tuner.stats()
+
+    sizes = _sizes(stats)
+    peak = max(sizes)
+    return {
+        'audio_seconds': seconds,
+        'elapsed_s': elapsed,
+        'dropouts': len(dropouts),
+        'discontinuities_seen': stats['discontinuities'],
+        'initial_block_size': sizes[0],
+        'peak_block_size': peak,
+        'final_block_size': stats['block_size'],
+        'preferred_block_size': stats['preferred_block_size'],
+        'changes': [(change['block_size'], change['reason']) for change in stats['history']],
+        'grew_after_dropouts': peak > sizes[0],
+        'settled_after_clean_capture': stats['block_size'] < peak and stats['block_size'] == stats['preferred_block_size'],
+    }
+
+
+class _FakeRecorder:
+    def __init__(self, mic, samplerate, channels):
+        self.mic = mic
+        self.samplerate = samplerate
+        self.channels = channels
+        self.reads = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, numframes):
+        self.reads += 1
+        time.sleep(numframes / self.samplerate)
+        if self.reads in self.mic.dropout_reads:
+            # Raised from the capture thread's record() call, as the soundcard backends do
+            warnings.warn("data discontinuity in recording", self.mic.warning)
+        return np.zeros((numframes, self.channels), dtype=np.float32)
+
+
+class _FakeMic:
+    def __init__(self, name, warning, dropout_reads=()):
+        self.name = name
+        self.warning = warning
+        self.dropout_reads = set(dropout_reads)
+        self.isloopback = True
+        self.channels = 2
+
+    def recorder(self, samplerate, channels):
+        return _FakeRecorder(self, samplerate, channels)
+
+
+def _two_devices(seconds):
+    module = types.ModuleType('soundcard')
+    module.SoundcardRuntimeWarning = type('SoundcardRuntimeWarning', (RuntimeWarning,), {})
+    mics = [_FakeMic("Noisy (Loopback)", module.SoundcardRuntimeWarning, dropout_reads=(5, 10, 15)),
+            _FakeMic("Clean (Loopback)", module.SoundcardRuntimeWarning)]
+    module.all_microphones = lambda include_loopback=False: list(mics)
+    module.default_speaker = lambda: types.SimpleNamespace(name="Speakers")
+    module.default_microphone = lambda: mics[0]
+
+    saved = (sys.modules.get('soundcard'), sources._counter_installed)
+    try:
+        sys.modules['soundcard'] = module
+        # Filters and showwarning go back to what they were (the counter installs both)
+        with warnings.catch_warnings(), temp_output_dir(), \
+                config_overrides(ADAPTIVE_BLOCK_SIZE=True, BLOCK_SIZE=1024, DEVICE_CACHE=False, SAMPLE_RATE=SAMPLE_RATE):
+            sources._counter_installed = False
+            recorders = {mic.name: Recorder(source=sources.LoopbackSource(device_id=mic.name), name=f"dev{i}")
+                         for i, mic in enumerate(mics)}
+            for recorder in recorders.values():
+                recorder.start_capture_thread()
+            time.sleep(seconds)
+            for recorder in recorders.values():
+                recorder.stop_threads()
+            stats = {name: recorder.block_tuner.stats() for name, recorder in recorders.items()}
+    finally:
+        module, sources._counter_installed = saved
+        if module is None:
+            sys.modules.pop('soundcard', None)
+        else:
+            sys.modules['soundcard'] = module
+
+    noisy, clean = (stats[mic.name] for mic in mics)
+    return {
+        'seconds': seconds,
+        'devices': {name: {'discontinuities': s['discontinuities'], 'reads': s['reads'],
+                           'block_sizes': _sizes(s)} for name, s in stats.items()},
+        'noisy_grew': noisy['discontinuities'] == len(mics[0].dropout_reads) and max(_sizes(noisy)) > _sizes(noisy)[0],
+        'clean_unaffected': clean['discontinuities'] == 0 and _sizes(clean) == _sizes(clean)[:1],
+    }
+
+
+def run(quick=False):
+    clean_seconds = BlockSizeTuner.STABLE_SECONDS * 3 + 2  # Three halvings from the peak
+    return {
+        'signal_dropouts': _signal_dropouts([1.0, 2.0, 3.0], clean_seconds),
+        'two_devices': _two_devices(2.0 if quick else 5.0),
+    }
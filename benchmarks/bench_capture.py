@@ -0,0 +1,81 @@
+"""
+Capture pipeline throughput: how many frames per second the Recorder's
+capture -> ring buffer -> _process_loop -> WAV path sustains, per read size,
+and whether real-time capture loses samples at 48/96/192 kHz.
+"""
+import time
+import threading
+
+from benchmarks.common import temp_output_dir, config_overrides
+from spufify.core.recorder import Recorder
+from spufify.core.sources import SignalSource
+
+NAME = "capture"
+
+BLOCK_SIZES = [1, 64, 256, 1024, 4096]
+SAMPLE_RATES = [48000, 96000, 192000]
+
+
+class _GatedSource(SignalSource):
+    """Holds the first read until the writer has been told to start, so every generated frame is written."""
+    def __init__(self, gate, **kwargs):
+        super().__init__(**kwargs)
+        self.gate = gate
+
+    def read(self, numframes):
+        self.gate.wait()
+        return super().read(numframes)
+
+
+def _run_pipeline(block_size, samplerate, seconds, speed):
+    with temp_output_dir(), config_overrides(BLOCK_SIZE=block_size, ADAPTIVE_BLOCK_SIZE=False):
+        gate = threading.Event()
+        source = _GatedSource(gate, kind='noise', duration=seconds, samplerate=samplerate, speed=speed)
+        recorder = Recorder(source=source)
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+        recorder.resume_recording()
+
+        start = time.perf_counter()
+        gate.set()
+        recorder.capture_thread.join()
+        while recorder.ring.available() > 0:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+
+        frames_on_disk = recorder._wav_file.frames if recorder._wav_file else 0
+        recorder._close_wav_file()
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=2)
+
+        stats = recorder.get_stats()
+        return {
+            'block_size': block_size,
+            'sample_rate': samplerate,
+            'audio_seconds': seconds,
+            'speed': speed,
+            'elapsed_s': elapsed,
+            'frames_written': frames_on_disk,
+            'frames_per_sec': frames_on_disk / elapsed if elapsed else 0.0,
+            'realtime_factor': frames_on_disk / elapsed / samplerate if elapsed else 0.0,
+            'overruns': stats.get('overruns', 0),
+            'dropped_frames': stats.get('dropped_frames', 0),
+            'max_fill_frames': stats.get('max_fill_frames', 0),
+        }
+
+
+def run(quick=False):
+    throughput = []
+    for block_size in BLOCK_SIZES:
+        # Tiny blocks are dominated by per-read overhead; keep their runs short
+        seconds = 0.5 if block_size < 256 else 4.0
+        if quick:
+            seconds /= 2
+        throughput.append(_run_pipeline(block_size, 48000, seconds, speed=None))
+
+    realtime = []
+    for samplerate in SAMPLE_RATES:
+        # Paced at 4x real time: any overrun here means samples would be lost live
+        realtime.append(_run_pipeline(1024, samplerate, 2.0 if quick else 8.0, speed=4.0))
+
+    return {'throughput': throughput, 'realtime': realtime}
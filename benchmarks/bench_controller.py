@@ -0,0 +1,42 @@
+"""
+Controller.tick() overhead with a mocked Spotify client: steady playback,
+and a playlist that changes track every few ticks.
+"""
+import time
+
+from benchmarks.common import MockSpotifyClient, fake_track, summarize
+from spufify.core.controller import Controller
+
+NAME = "controller"
+
+
+class _NullRecorder:
+    """Accepts the controller's recorder calls without touching audio."""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def _measure(tracks, ticks):
+    controller = Controller(recorder_ref=_NullRecorder(), spotify_client=MockSpotifyClient(tracks))
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        controller.tick()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def run(quick=False):
+    ticks = 2000 if quick else 20000
+    steady = [fake_track(0)]
+    # New track every 5 ticks, with a pause and an idle gap thrown in
+    changing = []
+    for i in range(ticks // 5):
+        changing.extend([fake_track(i, progress_ms=step * 1000) for step in range(5)])
+    changing[10] = fake_track(2, is_playing=False)
+    changing[11] = None
+
+    return {
+        'steady_playback': _measure(steady, ticks),
+        'track_changes': _measure(changing, ticks),
+    }
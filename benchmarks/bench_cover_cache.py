@@ -0,0 +1,82 @@
+"""
+Cover cache against a local HTTP stand-in: an album rip (same cover for
+every track, requested by tagging and the UI) cold, warm in memory and
+warm on disk only. Then a burst of prefetches (rapid skipping, a library
+scroll): threads started and downloads made for repeated URLs.
+"""
+import os
+import time
+import threading
+
+from benchmarks.common import temp_output_dir, summarize, CoverServer
+from spufify.utils.cover_cache import CoverCache
+from spufify.utils.http import get_http_client
+
+NAME = "cover_cache"
+
+
+def _prefetch_burst(out, urls, repeats):
+    fetched = []
+
+    def slow_fetch(url):
+        time.sleep(0.02)
+        fetched.append(url)
+        return b"cover"
+
+    cache = CoverCache(os.path.join(out, "prefetch"), fetcher=slow_fetch, max_prefetch_pending=urls)
+    threads_before = threading.active_count()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for i in range(urls):
+            cache.prefetch(f"http://covers.invalid/{i}.jpg")
+    burst_ms = (time.perf_counter() - started) * 1000
+    extra_threads = threading.active_count() - threads_before
+    deadline = time.monotonic() + 30
+    while cache.stats()['memory_items'] < urls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = cache.stats()
+    return {
+        'prefetch_calls': urls * repeats,
+        'burst_ms': burst_ms,
+        'threads_started': extra_threads,
+        'downloads': len(fetched),
+        'unique_urls': urls,
+        'cached': stats['memory_items'],
+        'skipped': stats['prefetches_skipped'],
+        'warmed_s': time.perf_counter() - started,
+    }
+
+
+def run(quick=False):
+    tracks = 6 if quick else 12
+    results = {}
+    with temp_output_dir() as out, CoverServer() as server:
+        url = server.url("album.jpg")
+        directory = os.path.join(out, "covers")
+
+        cache = CoverCache(directory)
+        samples = []
+        for _ in range(tracks):
+            # Tagging and dashboard ask at the same time
+            threads = [threading.Thread(target=cache.get, args=(url,)) for _ in range(2)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            samples.append(time.perf_counter() - start)
+        results['album_rip'] = summarize(samples)
+        results['album_rip']['http_requests'] = server.requests
+        results['album_rip']['uncached_requests'] = tracks * 2
+
+        # New process: memory is empty, disk store is warm
+        requests_before = server.requests
+        fresh = CoverCache(directory)
+        start = time.perf_counter()
+        fresh.get(url)
+        results['disk_hit_ms'] = (time.perf_counter() - start) * 1000
+        results['disk_hit_http_requests'] = server.requests - requests_before
+        results['stats'] = cache.stats()
+        results['http'] = get_http_client().stats()
+        results['prefetch_burst'] = _prefetch_burst(out, 10, 5)
+    return results
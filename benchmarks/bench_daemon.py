@@ -0,0 +1,150 @@
+"""
+Headless daemon: a `spufify.daemon.serve` process (synthetic source played in
+real time, mocked Spotify client changing track every few seconds, real
+processor) driven over its control API. Times the API round trips
+(/status, /pause, /resume), the process's CPU use while recording, and a
+SIGTERM shutdown: how long draining takes and whether every track that
+finished before the signal, and the one still playing, was encoded.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import subprocess
+import urllib.request
+
+from benchmarks.common import temp_output_dir, summarize
+
+NAME = "daemon"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_DAEMON_SCRIPT = """
+import os, sys, json, time
+from spufify.main import StartupTimer
+from spufify.config import Config
+from spufify.daemon import serve
+
+TRACK_SEC = float(sys.argv[3])
+
+class _Spotify:
+    # Track i plays from i * TRACK_SEC to (i + 1) * TRACK_SEC of wall time
+    def __init__(self):
+        self.started = time.monotonic()
+
+    def is_authenticated(self):
+        return True
+
+    def get_current_track(self):
+        elapsed = time.monotonic() - self.started
+        index = int(elapsed // TRACK_SEC)
+        return {'is_ad': False, 'is_playing': True, 'title': f"Daemon Track {index}", 'artist': "Spufify Bench",
+                'album': "Synthetic Album", 'cover_url': None, 'duration_ms': int(TRACK_SEC * 1000),
+                'progress_ms': int((elapsed - index * TRACK_SEC) * 1000), 'track_id': f"daemon{index:04d}"}
+
+Config.OUTPUT_DIR = sys.argv[1]
+Config.REPLAYGAIN = False
+Config.LIBRARY_SKIP_KNOWN = False
+from spufify.core.sources import SignalSource
+from spufify.core.session import SessionManager, SessionConfig
+timer = StartupTimer()
+manager = SessionManager()
+manager.create_session(SessionConfig("default"), source=SignalSource(kind='sine'), spotify_client=_Spotify())
+code = serve(manager, int(sys.argv[2]), timer)
+cpu = os.times()
+saved = sorted(name for name in os.listdir(Config.OUTPUT_DIR) if name.endswith('.' + Config.OUTPUT_FORMAT))
+print(json.dumps({'exit_code': code, 'saved': saved, 'cpu_sec': cpu.user + cpu.system,
+                  'encode': manager.processor.get_stats()}, default=str))
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _call(port, path, method='GET'):
+    """(seconds, JSON reply) of one API request."""
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method, data=b'' if method == 'POST' else None)
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=5) as response:
+        document = json.loads(response.read())
+    return time.perf_counter() - started, document
+
+
+def _wait_for_api(port, process, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            return _call(port, '/status')[1]
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("daemon control API did not come up")
+
+
+def _run_daemon(out, track_sec, tracks, status_requests):
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', _DAEMON_SCRIPT, out, str(port), str(track_sec)], cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=dict(os.environ, PYTHONPATH=ROOT)
+    )
+    try:
+        _wait_for_api(port, process)
+        api_up = time.perf_counter() - started
+
+        status_times = []
+        for _ in range(status_requests):
+            elapsed, status = _call(port, '/status')
+            status_times.append(elapsed)
+            time.sleep(0.01)
+        recording_state = status['sessions'][0]['state']
+
+        # Pause and resume within the first track, then let the rest play through
+        pause_sec, paused = _call(port, '/pause', 'POST')
+        time.sleep(0.2)
+        resume_sec, resumed = _call(port, '/resume', 'POST')
+
+        time.sleep(max(0.0, tracks * track_sec + track_sec / 2 - (time.perf_counter() - started)))
+        _, before_stop = _call(port, '/status')
+        finished_before_stop = int(before_stop['sessions'][0]['track']['track_id'][len('daemon'):])
+
+        stop_started = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        stdout, stderr = process.communicate(timeout=60)
+        stop_sec = time.perf_counter() - stop_started
+        wall_sec = time.perf_counter() - started
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+    if process.returncode != 0 or not stdout.strip():
+        raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else "daemon failed")
+    result = json.loads(stdout.strip().splitlines()[-1])
+    return {
+        'api_up_ms': api_up * 1000,
+        'status_request': summarize(status_times),
+        'state_while_playing': recording_state,
+        'pause': {'ms': pause_sec * 1000, 'state': paused['sessions'][0]['state'],
+                  'user_paused': paused['sessions'][0]['user_paused']},
+        'resume': {'ms': resume_sec * 1000, 'user_paused': resumed['sessions'][0]['user_paused']},
+        'encode_queue_at_stop': before_stop['encode'],
+        'sigterm_to_exit_ms': stop_sec * 1000,
+        'exit_code': result['exit_code'],
+        # Tracks that ended before SIGTERM must all be encoded, and the one playing at the signal as a partial take
+        'tracks_finished_before_stop': finished_before_stop,
+        'tracks_saved': len(result['saved']),
+        'open_track_saved': len(result['saved']) == finished_before_stop + 1,
+        'encode_after_drain': {key: result['encode'][key] for key in ('queue_depth', 'active', 'completed', 'failed')},
+        'cpu_percent': 100 * result['cpu_sec'] / wall_sec,
+    }
+
+
+def run(quick=False):
+    with temp_output_dir() as out:
+        if quick:
+            return _run_daemon(out, track_sec=2.0, tracks=3, status_requests=50)
+        return _run_daemon(out, track_sec=5.0, tracks=6, status_requests=500)
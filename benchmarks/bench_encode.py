@@ -0,0 +1,43 @@
+"""
+Encode wall time per minute of audio for each output format, through
+Processor._process_task (ffmpeg conversion + tagging, no cover download).
+"""
+import os
+import shutil
+import time
+
+from benchmarks.common import temp_output_dir, config_overrides, write_test_audio, fake_track
+from spufify.core.processor import Processor
+
+NAME = "encode"
+
+FORMATS = ['mp3', 'flac', 'wav']
+
+
+def run(quick=False):
+    if not shutil.which('ffmpeg'):
+        return {'skipped': 'ffmpeg not found in PATH'}
+
+    seconds = 15 if quick else 60
+    samplerate = 48000
+    results = []
+    with temp_output_dir() as out:
+        source = write_test_audio(os.path.join(out, "source.wav"), seconds, samplerate)
+        processor = Processor()
+        for fmt in FORMATS:
+            with config_overrides(OUTPUT_FORMAT=fmt):
+                wav_copy = os.path.join(out, f"temp_{fmt}.wav")
+                shutil.copyfile(source, wav_copy)
+                metadata = fake_track(index=FORMATS.index(fmt))
+                start = time.perf_counter()
+                processor._process_task(wav_copy, metadata, samplerate)
+                elapsed = time.perf_counter() - start
+                output = os.path.join(out, f"{metadata['artist']} - {metadata['title']}.{fmt}")
+                results.append({
+                    'format': fmt,
+                    'audio_seconds': seconds,
+                    'elapsed_s': elapsed,
+                    'seconds_per_audio_minute': elapsed * 60.0 / seconds,
+                    'output_bytes': os.path.getsize(output) if os.path.exists(output) else None,
+                })
+    return {'formats': results}
@@ -0,0 +1,86 @@
+"""
+Multi-profile output: one capture saved as several formats through a single
+fan-out job (one read of the capture, one ffmpeg process for the ffmpeg
+formats, one cover lookup) against one Processor job per format. Wall time,
+CPU time including encoder children, and cover lookups.
+"""
+import os
+import time
+import shutil
+
+from benchmarks.common import temp_output_dir, config_overrides, write_test_audio, fake_track
+from spufify.core.processor import Processor
+
+NAME = "fanout"
+
+SAMPLE_RATE = 48000
+# (profiles, native FLAC/WAV): with native off every format goes through the one ffmpeg process
+PROFILE_SETS = [(['flac', 'mp3'], True), (['flac', 'mp3', 'wav'], True), (['flac', 'mp3'], False), (['flac', 'mp3', 'wav'], False)]
+
+
+def _cpu_s():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class _CountingProcessor(Processor):
+    """Processor that counts cover lookups instead of fetching (the payload is fixed)."""
+    cover_lookups = 0
+
+    def _download_cover_with_retry(self, url):
+        self.cover_lookups += 1
+        return b"\xff\xd8\xff\xe0" + bytes(64 * 1024)
+
+
+def _timed(processor, source, out, name, metadata):
+    wav = os.path.join(out, f"{name}.wav")
+    shutil.copyfile(source, wav)
+    wall, cpu = time.perf_counter(), _cpu_s()
+    processor._process_task(wav, metadata, SAMPLE_RATE)
+    return time.perf_counter() - wall, _cpu_s() - cpu
+
+
+def _compare(out, source, profiles, native, seconds):
+    processor = _CountingProcessor()
+    results = {'profiles': profiles, 'native_encode': native, 'audio_sec': seconds}
+
+    before = processor.cover_lookups
+    metadata = dict(fake_track(1), cover_url="http://covers.invalid/1.jpg")
+    with config_overrides(OUTPUT_FORMAT=profiles[0], OUTPUT_PROFILES=profiles[1:]):
+        wall, cpu = _timed(processor, source, out, "fanout", metadata)
+    filename = f"{metadata['artist']} - {metadata['title']}"
+    outputs = [os.path.join(out, f"{filename}.{profiles[0]}")]
+    outputs += [os.path.join(out, ext, f"{filename}.{ext}") for ext in profiles[1:]]
+    results['fanout'] = {
+        'wall_s': wall, 'cpu_s': cpu, 'cover_lookups': processor.cover_lookups - before,
+        'outputs_written': sum(os.path.exists(path) for path in outputs),
+    }
+
+    before = processor.cover_lookups
+    wall_total = cpu_total = 0.0
+    for index, ext in enumerate(profiles):
+        metadata = dict(fake_track(10 + index), cover_url="http://covers.invalid/1.jpg")
+        with config_overrides(OUTPUT_FORMAT=ext, OUTPUT_PROFILES=[]):
+            wall, cpu = _timed(processor, source, out, f"separate_{ext}", metadata)
+        wall_total += wall
+        cpu_total += cpu
+    results['separate_jobs'] = {
+        'wall_s': wall_total, 'cpu_s': cpu_total, 'cover_lookups': processor.cover_lookups - before,
+    }
+    results['wall_speedup'] = wall_total / results['fanout']['wall_s']
+    results['cpu_saving'] = 1.0 - results['fanout']['cpu_s'] / cpu_total if cpu_total else None
+    processor.shutdown(wait=True)
+    return results
+
+
+def run(quick=False):
+    if not shutil.which('ffmpeg'):
+        return {'skipped': 'ffmpeg not found in PATH'}
+    seconds = 15 if quick else 60
+    with temp_output_dir() as out, config_overrides(LIBRARY_INDEX=False, CRASH_JOURNAL=False):
+        source = write_test_audio(os.path.join(out, "source.wav"), seconds, SAMPLE_RATE)
+        runs = []
+        for profiles, native in PROFILE_SETS:
+            with config_overrides(NATIVE_ENCODE=native):
+                runs.append(_compare(out, source, profiles, native, seconds))
+        return {'runs': runs}
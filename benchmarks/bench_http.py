@@ -0,0 +1,59 @@
+"""
+Shared HTTP client against local stand-in servers: a 429 with Retry-After
+must come back to the caller after one request without sleeping (the
+caller backs off on its own schedule), while 5xx errors are still retried
+with backoff inside the adapter. Hosts sleeping in that backoff must not
+hold the concurrency slots a healthy host's request needs.
+"""
+import time
+import threading
+
+from benchmarks.common import CoverServer
+from spufify.utils.http import HttpClient
+
+NAME = "http"
+
+
+def _get(status, headers, retries, backoff_factor):
+    client = HttpClient(retries=retries, backoff_factor=backoff_factor, timeout=5)
+    with CoverServer(payload_size=16, status=status, headers=headers) as server:
+        started = time.perf_counter()
+        response = client.get(server.url())
+        elapsed = time.perf_counter() - started
+        return {'status': response.status_code, 'requests_sent': server.requests, 'ms': elapsed * 1000,
+                'client_requests': client.stats()['requests']}
+
+
+def _retrying_hosts_stall(slots):
+    """`slots` requests retrying 503s with backoff, then one request to a healthy host: how long it waits."""
+    client = HttpClient(max_concurrency=slots, retries=3, backoff_factor=0.2, timeout=5)
+    with CoverServer(payload_size=16, status=503) as failing, CoverServer(payload_size=16) as healthy:
+        threads = [threading.Thread(target=client.get, args=(failing.url(f"retry{i}.jpg"),)) for i in range(slots)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while failing.requests < 2 * slots:
+            time.sleep(0.005)  # Every retrying request is in its backoff
+        waited = time.perf_counter()
+        response = client.get(healthy.url())
+        healthy_ms = (time.perf_counter() - waited) * 1000
+        for thread in threads:
+            thread.join()
+        return {'slots': slots, 'healthy_status': response.status_code, 'healthy_ms': healthy_ms,
+                'retrying_requests_ms': (time.perf_counter() - started) * 1000}
+
+
+def run(quick=False):
+    rate_limited = _get(429, {'Retry-After': '3'}, retries=3, backoff_factor=0.5)
+    assert rate_limited['status'] == 429 and rate_limited['requests_sent'] == 1, rate_limited
+    assert rate_limited['ms'] < 1000, f"429 slept in the adapter: {rate_limited}"
+
+    # 503 with Retry-After: retried with the client's own backoff, not the header's 3 s
+    unavailable = _get(503, {'Retry-After': '3'}, retries=2, backoff_factor=0.05)
+    assert unavailable['requests_sent'] == 3 and unavailable['ms'] < 2000, unavailable
+
+    server_error = _get(500, None, retries=2, backoff_factor=0.05)
+    assert server_error['requests_sent'] == 3, server_error
+    stall = _retrying_hosts_stall(slots=2)
+    return {'rate_limited': rate_limited, 'unavailable_retry_after': unavailable, 'server_error': server_error,
+            'retrying_hosts_stall': stall}
@@ -0,0 +1,229 @@
+"""
+Crash journal: cost of keeping in-flight captures valid on disk (header patch
++ fsync once a second) against plain SoundFile writes, and what survives when
+the process is killed mid-track (capture) or mid-job (after the encode, before
+tagging) and the next start runs recovery. Recovery also has to leave alone
+the captures of another instance that is still running.
+"""
+import os
+import sys
+import time
+import shutil
+import subprocess
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir, config_overrides, write_test_audio, fake_track
+from spufify.core.journal import JobJournal, JournalWavWriter, DONE
+
+NAME = "journal"
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child process: writes a journaled capture in real time and dies without closing it
+_CRASH_CAPTURE = """
+import os, sys, time, numpy as np
+from spufify.core.journal import JobJournal, JournalWavWriter, RECORDING
+journal = JobJournal(sys.argv[1])
+path = journal.capture_path()
+journal.update(path, RECORDING, kind='wav', metadata={metadata}, sample_rate={rate}, channels={channels})
+writer = JournalWavWriter(path, {rate}, {channels}, sync_interval={sync})
+block = (0.1 * np.random.default_rng(0).standard_normal(({block}, {channels}))).astype(np.float32)
+deadline = time.monotonic() + {seconds}
+while time.monotonic() < deadline:
+    writer.write(block)
+    time.sleep({block} / {rate})
+print(writer.frames, flush=True)
+os._exit(1)
+"""
+
+# Child process: a second live instance with a capture in flight, until its stdin closes
+_LIVE_CAPTURE = """
+import os, sys, numpy as np
+from spufify.core.journal import JobJournal, JournalWavWriter, RECORDING
+journal = JobJournal(sys.argv[1])
+path = journal.capture_path()
+journal.update(path, RECORDING, kind='wav', metadata={metadata}, sample_rate={rate}, channels={channels})
+writer = JournalWavWriter(path, {rate}, {channels})
+writer.write((0.1 * np.random.default_rng(0).standard_normal(({rate} * 2, {channels}))).astype(np.float32))
+writer.sync()
+print(path, flush=True)
+sys.stdin.read()
+os._exit(1)
+"""
+
+# Child process: encodes a queued track, then dies before tagging
+_CRASH_JOB = """
+import os, sys
+from spufify.config import Config
+Config.OUTPUT_DIR = sys.argv[1]
+Config.OUTPUT_FORMAT = 'flac'
+from spufify.core.processor import Processor
+processor = Processor(pool=None)
+processor._tag_and_register = lambda *args: os._exit(1)
+processor._journal(sys.argv[2], 'queued', kind='wav', metadata={metadata}, sample_rate={rate})
+processor._process_task(sys.argv[2], {metadata}, {rate})
+"""
+
+
+class _RecoveringProcessor:
+    """Processor stand-in for recovery: records which path each resumed step got."""
+    def __init__(self):
+        self.processed = []
+        self.resumed = []
+
+    def process_track(self, path, metadata, sample_rate):
+        self.processed.append((path, sf.info(path).frames))
+
+    def finish_stream(self, path, metadata):
+        self.processed.append((path, None))
+
+    def resume_job(self, job):
+        self.resumed.append(job)
+
+
+def _child(script, *args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True, env=env)
+
+
+def _write_overhead(out, seconds):
+    block = (0.1 * np.random.default_rng(0).standard_normal((480, CHANNELS))).astype(np.float32)  # 10 ms
+    writes = int(seconds * SAMPLE_RATE / len(block))
+    results = {}
+
+    path = os.path.join(out, "soundfile.wav")
+    started = time.perf_counter()
+    with sf.SoundFile(path, mode='w', samplerate=SAMPLE_RATE, channels=CHANNELS, subtype='FLOAT') as f:
+        for _ in range(writes):
+            f.write(block)
+    results['soundfile'] = {'elapsed_s': time.perf_counter() - started}
+
+    for label, sync in (('journal_no_sync', None), ('journal_sync_1s', 1.0), ('journal_sync_every_write', 0.0)):
+        path = os.path.join(out, f"{label}.wav")
+        writer = JournalWavWriter(path, SAMPLE_RATE, CHANNELS, sync_interval=sync)
+        started = time.perf_counter()
+        for i in range(writes):
+            writer.write(block)
+            if sync == 1.0 and i % 100 == 99:
+                writer.sync()  # Writes here run faster than real time: sync once per second of audio
+        writer.close()
+        elapsed = time.perf_counter() - started
+        results[label] = {
+            'elapsed_s': elapsed,
+            'syncs': writer.syncs,
+            'avg_sync_ms': writer.sync_s / writer.syncs * 1000 if writer.syncs else None,
+            'readable_frames': sf.info(path).frames,
+        }
+    for entry in results.values():
+        entry['audio_sec'] = seconds
+        entry['realtime_factor'] = seconds / entry['elapsed_s']
+    return results
+
+
+def _crash_capture(out, seconds, sync):
+    directory = os.path.join(out, f"journal_capture_{sync}")
+    metadata = fake_track(1, duration_ms=int(seconds * 1000))
+    script = _CRASH_CAPTURE.format(
+        metadata=repr(metadata), rate=SAMPLE_RATE, channels=CHANNELS, sync=sync, block=480, seconds=seconds
+    )
+    result = _child(script, directory)
+    written = int(result.stdout.strip().splitlines()[-1])
+
+    journal = JobJournal(directory)
+    path = journal.unfinished()[0]['path']
+    header_frames = sf.info(path).frames  # What the header claimed at the moment of the crash
+
+    processor = _RecoveringProcessor()
+    started = time.perf_counter()
+    resumed = journal.recover(processor)
+    recover_s = time.perf_counter() - started
+    recovered = processor.processed[0][1] if processor.processed else 0
+    return {
+        'sync_interval_s': sync,
+        'frames_written': written,
+        'header_frames_at_crash': header_frames,
+        'frames_recovered': recovered,
+        'lost_ms': (written - recovered) * 1000 / SAMPLE_RATE,
+        'jobs_resumed': resumed,
+        'recover_ms': recover_s * 1000,
+    }
+
+
+def _live_owner(out):
+    directory = os.path.join(out, "journal_live")
+    script = _LIVE_CAPTURE.format(metadata=repr(fake_track(3)), rate=SAMPLE_RATE, channels=CHANNELS)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    child = subprocess.Popen([sys.executable, "-c", script, directory], stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, text=True, env=env)
+    path = child.stdout.readline().strip()
+
+    processor = _RecoveringProcessor()
+    journal = JobJournal(directory)
+    while_running = journal.recover(processor)
+    untouched = not processor.processed and os.path.getsize(path) > 0
+    child.stdin.close()  # The other instance dies without finishing its capture
+    child.wait(timeout=30)
+    after_exit = JobJournal(directory).recover(processor)
+    return {
+        'resumed_while_owner_running': while_running,
+        'capture_untouched': untouched,
+        'resumed_after_owner_exit': after_exit,
+    }
+
+
+def _crash_job(out, seconds):
+    from spufify.core import journal as journal_module
+    from spufify.core.processor import Processor
+    with config_overrides(OUTPUT_DIR=out, OUTPUT_FORMAT='flac', LIBRARY_INDEX=False):
+        source = write_test_audio(os.path.join(out, "job_source.wav"), seconds, SAMPLE_RATE)
+        wav = os.path.join(out, "job.wav")
+        shutil.copyfile(source, wav)
+        metadata = fake_track(2, duration_ms=seconds * 1000)
+
+        # Reference: the whole job uninterrupted
+        reference = os.path.join(out, "reference.wav")
+        shutil.copyfile(source, reference)
+        processor = Processor()
+        started = time.perf_counter()
+        processor._process_task(reference, dict(metadata, track_id="reference", title="Reference"), SAMPLE_RATE)
+        full_s = time.perf_counter() - started
+
+        result = _child(_CRASH_JOB.format(metadata=repr(metadata), rate=SAMPLE_RATE), out, wav)
+        if result.returncode != 1:
+            raise RuntimeError(result.stderr)
+        journal_module._job_journal = None  # Next start: the journal is read back from disk
+        journal = journal_module.get_job_journal()
+        state_after_crash = journal.get(wav)['state']
+
+        encodes = []
+        original = processor._process_task
+        processor._process_task = lambda *args: (encodes.append(args), original(*args))
+        started = time.perf_counter()
+        journal.recover(processor)
+        processor.shutdown(wait=True)
+        resume_s = time.perf_counter() - started
+        job = journal.get(wav)
+        return {
+            'audio_sec': seconds,
+            'state_after_crash': state_after_crash,
+            'state_after_recovery': job['state'],
+            'reencoded': bool(encodes),
+            'full_job_s': full_s,
+            'resume_s': resume_s,
+            'output_tagged': sf.info(job['output_path']).frames > 0 and job['state'] == DONE,
+        }
+
+
+def run(quick=False):
+    seconds = 10 if quick else 60
+    with temp_output_dir() as out:
+        return {
+            'write_overhead': _write_overhead(out, seconds),
+            'crash_during_capture': [_crash_capture(out, 3.5 if quick else 10.5, sync) for sync in (1.0, 0.25)],
+            'crash_before_tagging': _crash_job(out, seconds),
+            'live_owner': _live_owner(out),
+        }
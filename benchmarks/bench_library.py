@@ -0,0 +1,207 @@
+"""
+Library index: load and lookup cost for a large library, chroma fingerprint
+cost and robustness (re-encoded, shifted and re-leveled take vs different
+audio), which takes of one track stay indexed as takes of equal, better and
+different-sounding audio arrive (also after a reload), and a replayed
+listening session where a playlist comes around three times, counting how
+many tracks get recorded and encoded with and without the index.
+"""
+import os
+import time
+import random
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir, config_overrides, fake_track, MockSpotifyClient
+from spufify.core.controller import Controller
+from spufify.core.library import LibraryIndex, chroma_fingerprint, fingerprint_similarity, describe_take
+
+NAME = "library"
+
+SAMPLE_RATE = 48000
+
+
+def _song(seconds, seed):
+    """A chord progression (one chord per second) with a little noise."""
+    rng = np.random.default_rng(seed)
+    roots = rng.integers(0, 12, size=int(seconds))
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    blocks = []
+    for root in roots:
+        freqs = [220.0 * 2 ** ((root + step) / 12) for step in (0, 4, 7)]
+        chord = sum(np.sin(2 * np.pi * f * t) for f in freqs) / 3
+        blocks.append(0.3 * chord + rng.normal(0, 0.01, len(t)))
+    audio = np.concatenate(blocks)
+    return np.stack([audio, audio], axis=1).astype(np.float32)
+
+
+def _index_scaling(out, entries):
+    path = os.path.join(out, f"index_{entries}.jsonl")
+    metadata = {'title': 'Track', 'artist': 'Artist', 'duration_ms': 200000}
+    take = describe_take(path, metadata, 'flac', SAMPLE_RATE, 200.0, "abc" * 200)  # 200 s fingerprint
+    index = LibraryIndex(path)
+    index._entries = {f"track{i:08d}": [dict(take, track_id=f"track{i:08d}")] for i in range(entries)}
+    index._takes = entries
+    index._compact()
+
+    created = time.perf_counter()
+    fresh = LibraryIndex(path)
+    construct_s = time.perf_counter() - created
+    started = time.perf_counter()
+    fresh.get("track00000000")  # First lookup loads the file
+    first_lookup_s = time.perf_counter() - started
+
+    rng = random.Random(0)
+    keys = [f"track{rng.randrange(entries):08d}" for _ in range(2000)]
+    started = time.perf_counter()
+    for key in keys:
+        fresh.get(key)
+    per_lookup_s = (time.perf_counter() - started) / len(keys)
+    return {
+        'entries': entries,
+        'file_mb': os.path.getsize(path) / 1e6,
+        'construct_ms': construct_s * 1000,
+        'first_lookup_ms': first_lookup_s * 1000,
+        'lookup_us': per_lookup_s * 1e6,
+    }
+
+
+def _fingerprints(out, seconds):
+    original = _song(seconds, seed=1)
+    path = os.path.join(out, "original.wav")
+    sf.write(path, original, SAMPLE_RATE, subtype='FLOAT')
+
+    # Same song: 16-bit FLAC, 6 dB quieter, 1.3 s of extra lead-in
+    retake = np.concatenate([np.zeros((int(1.3 * SAMPLE_RATE), 2), dtype=np.float32), original * 0.5])
+    retake_path = os.path.join(out, "retake.flac")
+    sf.write(retake_path, retake, SAMPLE_RATE, subtype='PCM_16')
+
+    other_path = os.path.join(out, "other.flac")
+    sf.write(other_path, _song(seconds, seed=2), SAMPLE_RATE, subtype='PCM_16')
+
+    started = time.perf_counter()
+    a = chroma_fingerprint(path)
+    fingerprint_s = time.perf_counter() - started
+    b = chroma_fingerprint(retake_path)
+    c = chroma_fingerprint(other_path)
+    return {
+        'audio_sec': seconds,
+        'fingerprint_ms': fingerprint_s * 1000,
+        'fingerprint_bytes': len(a),
+        'similarity_same_song': fingerprint_similarity(a, b),
+        'similarity_other_song': fingerprint_similarity(a, c),
+    }
+
+
+def _takes(out):
+    path = os.path.join(out, "takes.jsonl")
+    metadata = {'title': 'Track', 'artist': 'Artist', 'duration_ms': 200000}
+    files = {name: os.path.join(out, name) for name in ("take.flac", "take.wav", "take_96k.flac", "live.flac")}
+    for file in files.values():
+        open(file, 'wb').close()
+    same, other = "123" * 60, "e5a" * 60  # Fingerprints: same song / different audio
+
+    index = LibraryIndex(path)
+    flac = index.record("t1", describe_take(files["take.flac"], metadata, 'flac', SAMPLE_RATE, 200.0, same))
+    # Equal quality in another lossless format: both stay
+    wav = index.record("t1", describe_take(files["take.wav"], metadata, 'wav', SAMPLE_RATE, 200.0, same))
+    after_equal = sorted(os.path.basename(take['path']) for take in index.takes("t1"))
+    # Different-sounding audio at a higher rate: kept next to the others
+    live = index.record("t1", describe_take(files["live.flac"], metadata, 'flac', 96000, 200.0, other))
+    # Same song at a higher rate: supersedes the two 48 kHz takes, not the live one
+    better = index.record("t1", describe_take(files["take_96k.flac"], metadata, 'flac', 96000, 200.0, same))
+    final = [os.path.basename(take['path']) for take in index.takes("t1")]
+    reloaded = [os.path.basename(take['path']) for take in LibraryIndex(path).takes("t1")]
+    return {
+        'superseded_by_first': flac,
+        'superseded_by_equal_wav': wav,
+        'takes_after_equal': after_equal,
+        'superseded_by_different_audio': live,
+        'superseded_by_better': sorted(os.path.basename(p) for p in better),
+        'takes_final': final,
+        'takes_after_reload': reloaded,
+        'ok': (not flac and not wav and after_equal == ["take.flac", "take.wav"] and not live
+               and sorted(better) == sorted([files["take.flac"], files["take.wav"]])
+               and sorted(final) == ["live.flac", "take_96k.flac"] and sorted(reloaded) == sorted(final)),
+    }
+
+
+class _LibraryRecorder:
+    """Recorder stand-in: counts recorded tracks and files them in the library the way Processor does."""
+    actual_sample_rate = SAMPLE_RATE
+
+    def __init__(self, library, out):
+        self.library = library
+        self.out = out
+        self.current_metadata = None
+        self.recording_metadata = None
+        self.recorded = 0
+
+    def set_current_metadata(self, metadata):
+        self.current_metadata = metadata
+
+    def _file(self):
+        metadata = self.recording_metadata
+        if metadata:
+            path = os.path.join(self.out, f"{metadata['track_id']}.flac")
+            open(path, 'wb').close()
+            seconds = metadata['duration_ms'] / 1000
+            self.library.record(metadata['track_id'], describe_take(path, metadata, 'flac', SAMPLE_RATE, seconds))
+            self.recorded += 1
+        self.recording_metadata = None
+
+    def resume_recording(self):
+        self.recording_metadata = self.current_metadata
+
+    def split_track(self, metadata):
+        self._file()
+        self.recording_metadata = metadata
+
+    def skip_track(self, metadata):
+        self._file()
+
+    def pause_recording(self):
+        pass
+
+    def stop_recording(self):
+        self._file()
+
+    def dismiss_ad_suspicion(self):
+        pass
+
+
+def _session(out, use_index, unique=20, rounds=3):
+    rng = random.Random(0)
+    order = []
+    for _ in range(rounds):
+        plays = list(range(unique))
+        rng.shuffle(plays)
+        order.extend(plays)
+    # One poll per track is enough for the controller to see every change
+    script = [fake_track(index, progress_ms=1000) for index in order] + [None]
+    with config_overrides(LIBRARY_INDEX=use_index, LIBRARY_SKIP_KNOWN=use_index):
+        library = LibraryIndex(os.path.join(out, f"session_{use_index}.jsonl"))
+        recorder = _LibraryRecorder(library, os.path.join(out, f"files_{use_index}"))
+        os.makedirs(recorder.out, exist_ok=True)
+        controller = Controller(recorder_ref=recorder, spotify_client=MockSpotifyClient(script), library=library)
+        for _ in script:
+            controller.tick()
+    return {
+        'plays': len(order),
+        'unique_tracks': unique,
+        'recorded': recorder.recorded,
+        'library': library.stats(),
+    }
+
+
+def run(quick=False):
+    sizes = [1000, 10000] if quick else [1000, 10000, 100000]
+    with temp_output_dir() as out:
+        return {
+            'index': [_index_scaling(out, entries) for entries in sizes],
+            'fingerprint': _fingerprints(out, 60 if quick else 240),
+            'takes': _takes(out),
+            'session_without_index': _session(out, use_index=False),
+            'session_with_index': _session(out, use_index=True),
+        }
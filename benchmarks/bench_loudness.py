@@ -0,0 +1,233 @@
+"""
+ReplayGain / EBU R128 analyzer: accuracy of the incremental, FFT-based meter
+against a straightforward per-sample reference (the BS.1770 biquads run
+sample by sample, 400 ms blocks gated directly) and FFmpeg's ebur128 filter
+on test signals with known answers, true peak on an inter-sample peak, and
+the CPU cost of feeding it writer-sized blocks. The live Recorder hands each
+track off with its loudness already measured; the separate decode pass that
+saves is timed too.
+"""
+import os
+import re
+import time
+import shutil
+import subprocess
+
+import numpy as np
+
+from benchmarks.common import temp_output_dir, config_overrides, fake_track, summarize, CollectingProcessor
+from spufify.core.loudness import LoudnessAnalyzer, k_weighting_coefficients, analyze_file
+from spufify.core.recorder import Recorder
+from spufify.core.sources import FileSource
+
+NAME = "loudness"
+
+BLOCK_FRAMES = 480  # Writer-sized blocks (10 ms at 48 kHz)
+
+
+def _biquad(x, b, a):
+    """Direct form I, one sample at a time (the reference; deliberately not vectorized)."""
+    b0, b1, b2 = (float(v) for v in b)
+    a1, a2 = float(a[1]), float(a[2])
+    x1 = x2 = y1 = y2 = 0.0
+    out = [0.0] * len(x)
+    for i, v in enumerate(x.tolist()):
+        y = b0 * v + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+        x2, x1, y2, y1 = x1, v, y1, y
+        out[i] = y
+    return np.array(out)
+
+
+def _gated(power, relative_lu):
+    loud = -0.691 + 10 * np.log10(np.maximum(power, 1e-20))
+    power = power[loud > -70.0]
+    if not len(power):
+        return None, power
+    gate = -0.691 + 10 * np.log10(power.mean()) + relative_lu
+    return power, power[-0.691 + 10 * np.log10(power) > gate]
+
+
+def reference_loudness(audio, samplerate):
+    """Integrated loudness, LRA and sample peak computed the textbook way."""
+    weighted = []
+    for channel in audio.T.astype(np.float64):
+        for b, a in k_weighting_coefficients(samplerate):
+            channel = _biquad(channel, b, a)
+        weighted.append(channel)
+    squared = np.sum(np.square(weighted), axis=0)  # Channel weights 1.0 (mono/stereo)
+
+    def windows(seconds, hop):
+        size, step = int(round(seconds * samplerate)), int(round(hop * samplerate))
+        return np.array([squared[start:start + size].mean() for start in range(0, len(squared) - size + 1, step)])
+
+    _, kept = _gated(windows(0.4, 0.1), -10.0)
+    integrated = float(-0.691 + 10 * np.log10(kept.mean())) if kept is not None and len(kept) else None
+    _, kept = _gated(windows(3.0, 0.1), -20.0)
+    lra = None
+    if kept is not None and len(kept):
+        levels = -0.691 + 10 * np.log10(kept)
+        lra = float(np.percentile(levels, 95) - np.percentile(levels, 10))
+    return {'integrated_lufs': integrated, 'loudness_range_lu': lra, 'sample_peak': float(np.abs(audio).max())}
+
+
+def _ffmpeg_ebur128(path):
+    """FFmpeg's own meter (integrated, LRA, true peak in dBTP), or None without FFmpeg."""
+    if not shutil.which('ffmpeg'):
+        return None
+    run = subprocess.run(
+        ['ffmpeg', '-nostats', '-i', path, '-filter_complex', 'ebur128=peak=true', '-f', 'null', '-'],
+        capture_output=True, text=True
+    )
+    summary = run.stderr[run.stderr.rfind('Summary:'):]
+    values = {}
+    for key, pattern in (('integrated_lufs', r'I:\s+(-?[\d.]+) LUFS'), ('loudness_range_lu', r'LRA:\s+(-?[\d.]+) LU'),
+                         ('true_peak_dbtp', r'Peak:\s+(-?[\d.]+|-inf) dBFS')):
+        match = re.search(pattern, summary)
+        values[key] = float(match.group(1)) if match else None
+    return values
+
+
+def _signals(samplerate, quick):
+    seconds = 10 if quick else 20
+    t = np.arange(int(samplerate * seconds)) / samplerate
+    rng = np.random.default_rng(0)
+    sine = 10 ** (-23 / 20) * np.sin(2 * np.pi * 1000 * t)
+    # Pink-ish noise: white noise through a one-pole low-pass, mixed with the original
+    white = rng.standard_normal(len(t))
+    pinkish = np.convolve(white, 0.05 * 0.95 ** np.arange(200), mode='same') + 0.3 * white
+    pinkish *= 0.05 / np.sqrt(np.mean(np.square(pinkish)))
+    # EBU Tech 3341/3342 style level steps: 1 kHz at -20 dBFS then -30 dBFS (LRA 10 LU)
+    step = np.where(t < seconds / 2, 10 ** (-20 / 20), 10 ** (-30 / 20)) * np.sin(2 * np.pi * 1000 * t)
+    # Inter-sample peak: fs/4 at 45 degrees never lands a sample on the crest (true peak 0.5, samples 0.354)
+    isp = 0.5 * np.sin(2 * np.pi * samplerate / 4 * t[:samplerate * 2] + np.pi / 4)
+    return [
+        ('sine_1k_-23dBFS', np.stack([sine, sine], axis=1), {'integrated_lufs': -23.0}),
+        ('pinkish_noise', np.stack([pinkish, rng.permutation(pinkish)], axis=1), {}),
+        ('level_steps_-20_-30', np.stack([step, step], axis=1), {'loudness_range_lu': 10.0}),
+        ('intersample_peak', isp[:, None], {'true_peak': 0.5}),
+    ]
+
+
+def _measure(audio, samplerate, block_frames=BLOCK_FRAMES):
+    analyzer = LoudnessAnalyzer(samplerate, audio.shape[1])
+    for start in range(0, len(audio), block_frames):
+        analyzer.feed(audio[start:start + block_frames])
+    return analyzer.result()
+
+
+def _accuracy(out, samplerate, quick):
+    import soundfile as sf
+    results = []
+    for name, audio, expected in _signals(samplerate, quick):
+        audio = audio.astype(np.float32)
+        measured = _measure(audio, samplerate)
+        reference = reference_loudness(audio, samplerate)
+        row = {
+            'signal': name, 'samplerate': samplerate, 'expected': expected,
+            'integrated_lufs': measured['integrated_lufs'], 'loudness_range_lu': measured['loudness_range_lu'],
+            'true_peak': measured['true_peak'], 'sample_peak': measured['sample_peak'],
+            'reference': reference,
+        }
+        for key in ('integrated_lufs', 'loudness_range_lu'):
+            if measured[key] is not None and reference[key] is not None:
+                row[f"{key}_error_vs_reference"] = measured[key] - reference[key]
+        # Block size must not matter
+        whole = _measure(audio, samplerate, block_frames=len(audio))
+        row['block_size_invariant'] = all(
+            (whole[key] is None and measured[key] is None) or abs(whole[key] - measured[key]) < 1e-6
+            for key in ('integrated_lufs', 'loudness_range_lu', 'true_peak')
+        )
+        path = os.path.join(out, f"{name}_{samplerate}.wav")
+        sf.write(path, audio, samplerate, subtype='FLOAT')
+        ffmpeg = _ffmpeg_ebur128(path)
+        if ffmpeg:
+            row['ffmpeg'] = ffmpeg
+            row['analyze_file_matches'] = abs(
+                (analyze_file(path)['integrated_lufs'] or 0) - (measured['integrated_lufs'] or 0)
+            ) < 1e-6
+        results.append(row)
+    return results
+
+
+class _LoudnessProcessor(CollectingProcessor):
+    """Keeps the loudness handed off with each track and what a second pass over the file would measure."""
+    def __init__(self):
+        super().__init__()
+        self.handed_off = []
+
+    def _collect(self, path, metadata):
+        started = time.perf_counter()
+        second_pass = analyze_file(path)
+        self.handed_off.append((metadata.get('loudness'), second_pass, time.perf_counter() - started))
+        super()._collect(path, metadata)
+
+
+def _pipeline(out, seconds, samplerate=48000):
+    """Two tracks through the live Recorder (4x real time): a -23 dBFS and a -16 dBFS 1 kHz tone."""
+    import soundfile as sf
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    tone = np.sin(2 * np.pi * 1000 * t)
+    audio = np.concatenate([10 ** (-23 / 20) * tone, 10 ** (-16 / 20) * tone])
+    path = os.path.join(out, "playlist.wav")
+    sf.write(path, np.stack([audio, audio], axis=1).astype(np.float32), samplerate, subtype='FLOAT')
+
+    with config_overrides(REPLAYGAIN=True, STREAMING_ENCODE=False, TRIM_SILENCE=False):
+        recorder = Recorder(source=FileSource(path, speed=4.0))
+        recorder.processor = _LoudnessProcessor()
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+        while recorder.ring.write_pos < len(tone):
+            time.sleep(0.002)
+        track = fake_track(1, progress_ms=int((recorder.ring.write_pos - len(tone)) * 1000 / samplerate))
+        track['fetched_at'] = time.monotonic()
+        recorder.split_track(track)
+        recorder.capture_thread.join()
+        recorder.finish_track()
+        deadline = time.monotonic() + 10
+        while len(recorder.processor.handed_off) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=5)
+
+    tracks = []
+    for live, second_pass, second_pass_s in recorder.processor.handed_off:
+        tracks.append({
+            'integrated_lufs': live and live['integrated_lufs'],
+            'track_gain_db': live and live['track_gain_db'],
+            'true_peak': live and live['true_peak'],
+            'second_pass_integrated_lufs': second_pass['integrated_lufs'],
+            'second_pass_ms_saved': second_pass_s * 1000,
+        })
+    return {'expected_lufs': [-23.0, -16.0], 'track_sec': seconds, 'tracks': tracks}
+
+
+def _cost(samplerate, seconds):
+    """Writer-thread cost: x real time over a stereo track, and per-feed latency (FFT chunks land on some feeds)."""
+    audio = (0.1 * np.random.default_rng(1).standard_normal((samplerate * seconds, 2))).astype(np.float32)
+    analyzer = LoudnessAnalyzer(samplerate, 2)
+    latencies = []
+    started = time.perf_counter()
+    for start in range(0, len(audio), BLOCK_FRAMES):
+        t0 = time.perf_counter()
+        analyzer.feed(audio[start:start + BLOCK_FRAMES])
+        latencies.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    analyzer.result()
+    finish_ms = (time.perf_counter() - t0) * 1000
+    elapsed = time.perf_counter() - started
+    return {
+        'samplerate': samplerate, 'audio_sec': seconds, 'fir_taps': len(analyzer.fir),
+        'realtime_factor': seconds / elapsed, 'feed_latency': summarize(latencies), 'result_ms': finish_ms,
+    }
+
+
+def run(quick=False):
+    with temp_output_dir() as out:
+        rates = [48000] if quick else [44100, 48000, 96000]
+        return {
+            'accuracy': [row for rate in rates for row in _accuracy(out, rate, quick)],
+            'pipeline': _pipeline(out, 8 if quick else 30),
+            'cost': [_cost(rate, 30 if quick else 120) for rate in (44100, 48000, 96000)],
+        }
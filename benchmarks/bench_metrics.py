@@ -0,0 +1,173 @@
+"""
+Metrics registry: cost of one update (counter, gauge, histogram) next to the
+hot loops it sits in, the capture/writer pipeline with and without its
+instrumentation, scrape time of the Prometheus and JSON renderings over the
+local endpoint, and the periodic JSON dump. Two named sessions check that
+their controller and processor metrics are reported apart, not overwritten.
+"""
+import os
+import json
+import time
+import urllib.request
+
+from benchmarks.common import temp_output_dir, config_overrides, MockSpotifyClient, fake_track
+from spufify.core.controller import Controller
+from spufify.core.processor import Processor
+from spufify.core.recorder import Recorder
+from spufify.core.sources import SignalSource
+from spufify.utils.metrics import MetricsRegistry, MetricsServer, MetricsDumper, get_metrics
+
+NAME = "metrics"
+
+SAMPLE_RATE = 48000
+
+
+class _Null:
+    """Stands in for a metric: accepts updates and does nothing."""
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _op_costs(ops):
+    registry = MetricsRegistry()
+    counter = registry.counter('bench_total')
+    gauge = registry.gauge('bench_gauge')
+    histogram = registry.histogram('bench_seconds')
+    results = {}
+    for name, op in (('empty_loop', None), ('counter_inc', counter.inc), ('gauge_set_max', gauge.set_max),
+                     ('histogram_observe', histogram.observe)):
+        started = time.perf_counter()
+        if op is None:
+            for i in range(ops):
+                pass
+        else:
+            for i in range(ops):
+                op(0.003)
+        results[name] = (time.perf_counter() - started) / ops * 1e9
+    base = results.pop('empty_loop')
+    results = {f"{name}_ns": cost - base for name, cost in results.items()}
+    # The capture loop adds one observe per block, the writer one inc per write
+    block_ms = 10.0
+    per_block_ns = results['histogram_observe_ns'] + results['counter_inc_ns']
+    results['per_10ms_block_overhead_pct'] = per_block_ns / (block_ms * 1e6) * 100
+    return results
+
+
+def _cpu_s():
+    times = os.times()
+    return times.user + times.system
+
+
+def _pipeline(seconds, instrumented):
+    """Recorder capture + writer over a paced signal at 8x real time; CPU used and what the metrics saw."""
+    with temp_output_dir(), config_overrides(BLOCK_SIZE=480, ADAPTIVE_BLOCK_SIZE=False, REPLAYGAIN=False):
+        source = SignalSource(kind='noise', duration=seconds, samplerate=SAMPLE_RATE, speed=8.0)
+        recorder = Recorder(source=source)
+        if not instrumented:
+            recorder._read_latency = recorder._bytes_written = _Null()
+        reads_before = get_metrics().histogram('spufify_capture_read_seconds').count
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+        recorder.resume_recording()
+        cpu, wall = _cpu_s(), time.perf_counter()
+        recorder.capture_thread.join()
+        while recorder.ring.available() > 0:
+            time.sleep(0.001)
+        cpu, wall = _cpu_s() - cpu, time.perf_counter() - wall
+        recorder._close_wav_file()
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=2)
+        return {
+            'instrumented': instrumented,
+            'cpu_s': cpu,
+            'cpu_pct_of_wall': cpu / wall * 100,
+            'read_latency_observations': get_metrics().histogram('spufify_capture_read_seconds').count - reads_before,
+        }
+
+
+def _controller_ticks(ticks):
+    controller = Controller(spotify_client=MockSpotifyClient([fake_track(0)]))
+    started = time.perf_counter()
+    for _ in range(ticks):
+        controller.tick()
+    elapsed = time.perf_counter() - started
+    histogram = get_metrics().histogram('spufify_controller_tick_seconds')
+    return {'ticks': ticks, 'mean_tick_us': elapsed / ticks * 1e6, 'histogram_count': histogram.count}
+
+
+def _sessions(ticks):
+    names = {'bench_a': ticks, 'bench_b': ticks * 3}
+    processors = {name: Processor(name=name) for name in names}  # Kept alive: their gauges read the pools
+    for name, count in names.items():
+        controller = Controller(spotify_client=MockSpotifyClient([fake_track(0)]), name=name)
+        for _ in range(count):
+            controller.tick()
+    snapshot = get_metrics().snapshot()
+
+    def by_session(metric, field=None):
+        values = {entry['labels'].get('session'): entry['value'] for entry in snapshot[metric]['values']}
+        return {name: values[name][field] if field else values[name] for name in names if name in values}
+
+    ticks_seen = by_session('spufify_controller_tick_seconds', 'count')
+    queue_gauges = by_session('spufify_encode_queue_depth')
+    for processor in processors.values():
+        processor.shutdown(wait=True)
+    return {
+        'ticks_per_session': names,
+        'tick_counts_seen': ticks_seen,
+        'queue_depth_series': queue_gauges,
+        'kept_apart': ticks_seen == names and len(queue_gauges) == len(names),
+    }
+
+
+def _scrape(scrapes):
+    server = MetricsServer(get_metrics(), port=0)
+    results = {'series': sum(len(family['values']) for family in get_metrics().snapshot().values())}
+    try:
+        for path in ('/metrics', '/metrics.json'):
+            times = []
+            for _ in range(scrapes):
+                started = time.perf_counter()
+                with urllib.request.urlopen(f"http://127.0.0.1:{server.port}{path}") as response:
+                    body = response.read()
+                times.append(time.perf_counter() - started)
+            results[path] = {'bytes': len(body), 'mean_ms': sum(times) / len(times) * 1000}
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            text = response.read().decode('utf-8')
+        results['sample_lines'] = [line for line in text.splitlines() if line.startswith('spufify_capture')][:6]
+    finally:
+        server.stop()
+    return results
+
+
+def _dump(out):
+    path = os.path.join(out, "metrics.json")
+    dumper = MetricsDumper(get_metrics(), path, interval=3600)
+    counter = get_metrics().counter('spufify_capture_bytes_written_total')
+    dumper.dump()
+    time.sleep(0.2)
+    counter.inc(48000 * 8)  # 1 s of stereo float audio
+    started = time.perf_counter()
+    dumper.stop()  # Writes a final dump
+    elapsed = time.perf_counter() - started
+    with open(path) as f:
+        document = json.load(f)
+    entry = document['metrics']['spufify_capture_bytes_written_total']['values'][0]
+    return {'dump_ms': elapsed * 1000, 'bytes_written_rate_per_sec': entry.get('rate_per_sec'), 'dumps': dumper.dumps}
+
+
+def run(quick=False):
+    seconds = 10 if quick else 60
+    with temp_output_dir() as out:
+        pipeline = [_pipeline(seconds, instrumented) for instrumented in (False, True, False, True)]
+        return {
+            'op_costs': _op_costs(200000 if quick else 2000000),
+            'pipeline': pipeline,
+            'controller': _controller_ticks(2000 if quick else 20000),
+            'sessions': _sessions(100 if quick else 1000),
+            'scrape': _scrape(20 if quick else 200),
+            'json_dump': _dump(out),
+        }
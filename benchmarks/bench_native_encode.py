@@ -0,0 +1,99 @@
+"""
+In-process (libsndfile) lossless encoding versus the ffmpeg subprocess,
+for FLAC and WAV from the recorder's 32-bit float WAV. A recorder streaming
+to the native encoder whose writes start failing mid-track checks that the
+writer keeps draining the capture buffer and the rest of the track is
+handed off as WAV.
+"""
+import os
+import shutil
+import subprocess
+import time
+
+from benchmarks.common import temp_output_dir, write_test_audio, config_overrides, fake_track, CollectingProcessor
+from spufify.core.encoding import transcode_native, ffmpeg_output_args, output_bit_depth
+
+NAME = "native_encode"
+
+
+def _ffmpeg(src, dst, ext, samplerate):
+    cmd = ['ffmpeg', '-y', '-i', src] + ffmpeg_output_args(ext, samplerate) + [dst]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+
+def _failing_stream(seconds=8.0, fail_after=2.0, samplerate=48000):
+    from spufify.core.recorder import Recorder
+    from spufify.core.sources import SignalSource
+    with temp_output_dir(), config_overrides(STREAMING_ENCODE=True, NATIVE_ENCODE=True, OUTPUT_FORMAT='flac',
+                                             TRIM_SILENCE=False, CRASH_JOURNAL=False, SPLIT_LOOKBACK_SEC=1.0):
+        # The writer trails capture by SPLIT_LOOKBACK_SEC: the failure has to come while capture still runs
+        recorder = Recorder(source=SignalSource(kind='sine', duration=seconds, samplerate=samplerate, speed=4.0))
+        recorder.processor = CollectingProcessor()
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+        while recorder._stream is None and recorder.capture_thread.is_alive():
+            time.sleep(0.002)
+        stream = recorder._stream
+        if stream is None:
+            return {'skipped': 'stream did not open while capturing'}
+        write, written = stream.write, [0]
+
+        def flaky_write(data):
+            if written[0] >= fail_after * samplerate:
+                raise ValueError("encoder state corrupted")  # Not an OSError
+            written[0] += len(data)
+            write(data)
+        stream.write = flaky_write
+
+        recorder.capture_thread.join()
+        deadline = time.monotonic() + 10
+        while recorder.ring.available() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        drained = recorder.ring.available() == 0
+        recorder.finish_track()
+        while not recorder.processor.tracks and time.monotonic() < deadline:
+            time.sleep(0.005)
+        writer_alive = recorder.processing_thread.is_alive()
+        recorder.stop_threads()
+    frames = recorder.processor.tracks[0][1] if recorder.processor.tracks else 0
+    return {
+        'audio_seconds': seconds,
+        'failed_after_seconds': written[0] / samplerate,
+        'buffer_drained': drained,
+        'writer_alive': writer_alive,
+        'wav_fallback_seconds': frames / samplerate,
+    }
+
+
+def run(quick=False):
+    seconds = 15 if quick else 60
+    samplerate = 48000
+    has_ffmpeg = bool(shutil.which('ffmpeg'))
+    results = []
+    with temp_output_dir() as out:
+        source = write_test_audio(os.path.join(out, "source.wav"), seconds, samplerate)
+        for ext in ('flac', 'wav'):
+            bit_depth = output_bit_depth(ext)
+            entry = {'format': ext, 'bit_depth': bit_depth, 'audio_seconds': seconds}
+
+            dst = os.path.join(out, f"native.{ext}")
+            start = time.perf_counter()
+            transcode_native(source, dst, ext, bit_depth=bit_depth, dither=True)
+            entry['native_s'] = time.perf_counter() - start
+            entry['native_bytes'] = os.path.getsize(dst)
+
+            if has_ffmpeg:
+                dst = os.path.join(out, f"ffmpeg.{ext}")
+                start = time.perf_counter()
+                _ffmpeg(source, dst, ext, samplerate)
+                entry['ffmpeg_s'] = time.perf_counter() - start
+                entry['ffmpeg_bytes'] = os.path.getsize(dst)
+                entry['speedup'] = entry['ffmpeg_s'] / entry['native_s'] if entry['native_s'] else None
+            else:
+                entry['ffmpeg_s'] = None
+            results.append(entry)
+    return {'formats': results, 'ffmpeg_available': has_ffmpeg, 'stream_failure': _failing_stream()}
@@ -0,0 +1,152 @@
+"""
+Spotify polling: fixed 1 s interval versus the adaptive scheduler, replayed
+against a simulated playback timeline (tracks, a pause, an ad, an idle gap and
+a stretch of 429s) on a virtual clock, so an hour of listening runs in well
+under a second. Reports API calls and how late each track change was seen.
+"""
+import random
+
+from benchmarks.common import fake_track, summarize
+from spufify.api.spotify import RateLimitError
+from spufify.core.controller import Controller
+
+NAME = "polling"
+
+
+class _NullRecorder:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class _SimulatedPlayback:
+    """
+    Mock SpotifyClient answering from a timeline of (kind, seconds) segments,
+    kind being 'track', 'pause', 'ad' or 'idle'. Reported progress lags real
+    playback by up to `report_lag` seconds, as the Web API's does.
+    """
+    def __init__(self, clock, segments, latency=0.15, report_lag=0.3, rate_limit=None, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.report_lag = report_lag
+        self.rate_limit = rate_limit  # (start, end, retry_after)
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.rate_limited_calls = 0
+        self.first_seen = {}
+
+        self.timeline = []
+        start, track_index, last_track = 0.0, 0, None
+        for kind, seconds in segments:
+            index = None
+            if kind == 'track':
+                index = last_track = track_index
+                track_index += 1
+            elif kind == 'pause':
+                index = last_track
+            self.timeline.append((start, start + seconds, kind, index))
+            start += seconds
+        self.duration = start
+
+    def boundaries(self):
+        """Start times of tracks that directly follow another track."""
+        return {
+            index: seg_start
+            for (_, _, prev_kind, _), (seg_start, _, kind, index) in zip(self.timeline, self.timeline[1:])
+            if prev_kind == 'track' and kind == 'track'
+        }
+
+    def is_authenticated(self):
+        return True
+
+    def get_current_track(self):
+        self.calls += 1
+        t = self.clock()
+        self.clock.advance(self.latency)
+        if self.rate_limit and self.rate_limit[0] <= t < self.rate_limit[1]:
+            self.rate_limited_calls += 1
+            raise RateLimitError(self.rate_limit[2])
+
+        for start, end, kind, index in self.timeline:
+            if start <= t < end:
+                break
+        else:
+            return None
+        if kind == 'idle':
+            return None
+        if kind == 'ad':
+            return {'is_ad': True, 'is_playing': True, 'title': 'Advertisement', 'artist': 'Spotify'}
+
+        self.first_seen.setdefault(index, t)
+        seg = next(s for s in self.timeline if s[2] == 'track' and s[3] == index)
+        duration_ms = int((seg[1] - seg[0]) * 1000)
+        if kind == 'pause':
+            return fake_track(index, duration_ms=duration_ms, progress_ms=duration_ms // 2, is_playing=False)
+        lag = self.rng.uniform(0, self.report_lag)
+        progress_ms = int(max(0.0, t - start - lag) * 1000)
+        return fake_track(index, duration_ms=duration_ms, progress_ms=progress_ms)
+
+
+def _timeline(hours, seed=0):
+    rng = random.Random(seed)
+    segments, total = [], 0.0
+    while total < hours * 3600:
+        block = [('track', rng.uniform(150, 270)) for _ in range(8)]
+        block += [('pause', 300), ('track', rng.uniform(150, 270)), ('ad', 30)]
+        block += [('track', rng.uniform(150, 270)) for _ in range(4)]
+        block += [('idle', 600)]
+        segments.extend(block)
+        total += sum(seconds for _, seconds in block)
+    return segments
+
+
+def _simulate(segments, adaptive, rate_limit):
+    """adaptive=False replays the old loop: tick(), then sleep(1), regardless of 429s."""
+    clock = _VirtualClock()
+    spotify = _SimulatedPlayback(clock, segments, rate_limit=rate_limit)
+    controller = Controller(recorder_ref=_NullRecorder(), spotify_client=spotify, clock=clock)
+    while clock.now < spotify.duration:
+        controller.tick()
+        clock.advance(controller.next_poll_interval() if adaptive else 1.0)
+
+    latencies = [
+        spotify.first_seen[index] - start
+        for index, start in spotify.boundaries().items()
+        if index in spotify.first_seen
+    ]
+    hours = spotify.duration / 3600
+    return {
+        'api_calls': spotify.calls,
+        'api_calls_per_hour': spotify.calls / hours,
+        'calls_while_rate_limited': spotify.rate_limited_calls,
+        'boundary_latency': summarize(latencies),
+        'scheduler': controller.get_stats(),
+    }
+
+
+def run(quick=False):
+    hours = 1 if quick else 4
+    segments = _timeline(hours)
+    # Two minutes of 429s in the middle of a track (kept clear of track changes)
+    rate_limit = (1100.0, 1220.0, 10.0)
+    fixed = _simulate(segments, adaptive=False, rate_limit=rate_limit)
+    adaptive = _simulate(segments, adaptive=True, rate_limit=rate_limit)
+    return {
+        'simulated_hours': hours,
+        'fixed_1s': fixed,
+        'adaptive': adaptive,
+        'api_call_reduction': 1.0 - adaptive['api_calls'] / fixed['api_calls'],
+        'boundary_latency_reduction': (
+            1.0 - adaptive['boundary_latency']['mean_ms'] / fixed['boundary_latency']['mean_ms']
+        ),
+    }
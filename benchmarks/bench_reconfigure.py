@@ -0,0 +1,235 @@
+"""
+Hot reconfiguration of the audio engine: block size changes, a device
+switch and a sample rate change while a track is being recorded, against
+the previous stop-and-restart path. The source is a ramp (every frame holds
+its own index) shared across the swapped sources, so the recorded file shows
+exactly which frames made it: any lost or repeated frame breaks the ramp.
+The stream resampler used across a rate change is checked for accuracy
+(SNR on a sine) and block-size invariance separately.
+"""
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import temp_output_dir, config_overrides, fake_track, summarize
+from spufify.core.recorder import Recorder
+from spufify.core.resample import StreamResampler
+from spufify.core.sources import CaptureSource
+
+NAME = "reconfigure"
+
+SPEED = 4.0  # Sources run at 4x real time
+RAMP_STEP = 2.0 ** -24  # Frame index i is stored as i * 2^-24 (exact in float32)
+
+
+class _Counter:
+    def __init__(self):
+        self.next = 0
+        self.open_sources = 0
+        self.closed_at = None  # While no source is open the audio plays on unheard
+
+
+class _RampSource(CaptureSource):
+    """
+    Every channel of frame i holds i * 2^-24; the index continues across sources
+    sharing `counter`. Like a live device, frames that play while no source is
+    open are lost.
+    """
+    def __init__(self, counter, samplerate, name, speed=SPEED):
+        super().__init__(speed=speed)
+        self.counter = counter
+        self._samplerate = samplerate
+        self._name = name
+
+    def open(self):
+        self.samplerate = self._samplerate
+        self.channels = 2
+        self.name = self._name
+        if self.counter.open_sources == 0 and self.counter.closed_at is not None:
+            self.counter.next += int((time.perf_counter() - self.counter.closed_at) * self.samplerate * self.speed)
+        self.counter.open_sources += 1
+
+    def close(self):
+        self.counter.open_sources -= 1
+        if self.counter.open_sources == 0:
+            self.counter.closed_at = time.perf_counter()
+
+    def read(self, numframes):
+        start = self.counter.next
+        self.counter.next += numframes
+        ramp = (np.arange(start, start + numframes, dtype=np.float64) * RAMP_STEP).astype(np.float32)
+        self._pace(numframes)
+        return np.repeat(ramp[:, None], 2, axis=1)
+
+
+class _KeepingProcessor:
+    """Keeps the audio, sample rate and metadata of each handed-off track."""
+    def __init__(self):
+        self.tracks = []
+
+    def process_track(self, path, metadata, sample_rate):
+        import soundfile as sf
+        audio, rate = sf.read(path, dtype='float32', always_2d=True)
+        self.tracks.append({'metadata': metadata, 'audio': audio, 'samplerate': rate, 'reported_rate': sample_rate})
+        os.remove(path)
+
+    def finish_stream(self, path, metadata):
+        self.process_track(path, metadata, None)
+
+
+def _ramp_check(audio):
+    """Lost/repeated frames in a ramp recorded at one rate."""
+    steps = np.rint(np.diff(audio[:, 0].astype(np.float64)) / RAMP_STEP).astype(np.int64)
+    return {'frames': len(audio), 'lost_frames': int(np.sum(steps[steps > 1] - 1)),
+            'repeated_frames': int(np.sum(steps < 1))}
+
+
+def _record(actions, settle=0.3):
+    """Records one track while `actions(recorder, counter)` runs; returns (recorder, tracks, action results)."""
+    with config_overrides(TRIM_SILENCE=False, REPLAYGAIN=False, LOCAL_AD_DETECTION=False, STREAMING_ENCODE=False,
+                          ADAPTIVE_BLOCK_SIZE=False, BLOCK_SIZE=480, SPLIT_LOOKBACK_SEC=1.0):
+        counter = _Counter()
+        recorder = Recorder(source=_RampSource(counter, 48000, "ramp:48000"))
+        recorder.processor = _KeepingProcessor()
+        recorder.start_capture_thread()
+        recorder.wait_until_capturing(timeout=5)
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+        time.sleep(settle)
+        results = actions(recorder, counter)
+        time.sleep(settle)
+        recorder.finish_track()
+        recorder.recording = False
+        recorder.capture_thread.join(timeout=5)
+        recorder.processing_thread.join(timeout=5)
+        return recorder, recorder.processor.tracks, results
+
+
+def _timed(call):
+    started = time.perf_counter()
+    result = call()
+    return dict(result, call_ms=(time.perf_counter() - started) * 1000)
+
+
+def _block_sizes(switches):
+    def actions(recorder, counter):
+        results = []
+        for i in range(switches):
+            results.append(_timed(lambda: recorder.reconfigure(block_size=(256, 1024, 4096)[i % 3])))
+            time.sleep(0.05)
+        return results
+    recorder, tracks, results = _record(actions)
+    return {
+        'switches': switches,
+        'switch_ms': summarize([r['switch_ms'] / 1000 for r in results]),
+        'call_ms': summarize([r['call_ms'] / 1000 for r in results]),
+        'tracks': len(tracks),
+        'ramp': _ramp_check(tracks[0]['audio']) if tracks else None,
+        'dropped_frames': recorder.ring.dropped_frames,
+    }
+
+
+def _device_switch(switches):
+    def actions(recorder, counter):
+        results = []
+        for i in range(switches):
+            source = _RampSource(counter, 48000, f"ramp:48000:device{i + 1}")
+            results.append(_timed(lambda: recorder.reconfigure(source=source)))
+            time.sleep(0.05)
+        return results
+    recorder, tracks, results = _record(actions)
+    return {
+        'switches': switches,
+        'switch_ms': summarize([r['switch_ms'] / 1000 for r in results]),
+        'tracks': len(tracks),
+        'ramp': _ramp_check(tracks[0]['audio']) if tracks else None,
+        'dropped_frames': recorder.ring.dropped_frames,
+    }
+
+
+def _rate_change():
+    """48 kHz -> 44.1 kHz mid-track, then a new track: the first stays at 48 kHz (resampled tail), the second is 44.1 kHz."""
+    def actions(recorder, counter):
+        result = _timed(lambda: recorder.reconfigure(source=_RampSource(counter, 44100, "ramp:44100")))
+        time.sleep(0.3)
+        recorder.split_track(fake_track(1, progress_ms=0))
+        return result
+    recorder, tracks, result = _record(actions)
+    first = tracks[0]
+    switch = result['position']
+    audio = first['audio'][:, 0].astype(np.float64) / RAMP_STEP  # Frame indices (fractional after resampling)
+    start = int(round(audio[0]))
+    at_48k = switch - start  # Frames of the track captured before the switch
+    resampled = audio[at_48k + 64:-64]  # Away from the kink at the switch and the end
+    step = 44100 / 48000
+    fit = np.polyfit(np.arange(len(resampled)), resampled, 1)
+    return {
+        'switch_ms': result['switch_ms'],
+        'call_ms': result['call_ms'],
+        'first_track': {
+            'samplerate': first['samplerate'],
+            'resampled_from': first['metadata'].get('resampled_from'),
+            'before_switch': _ramp_check(first['audio'][:at_48k]),
+            'resampled_step': fit[0],
+            'expected_step': step,
+            'resampled_max_deviation_frames': float(np.abs(resampled - np.polyval(fit, np.arange(len(resampled)))).max()),
+        },
+        'second_track': {'samplerate': tracks[1]['samplerate'], 'ramp': _ramp_check(tracks[1]['audio'])}
+        if len(tracks) > 1 else None,
+        'dropped_frames': recorder.ring.dropped_frames,
+    }
+
+
+def _legacy_restart():
+    """The previous path (stop both threads, start again) mid-track, resumed right after."""
+    def actions(recorder, counter):
+        started = time.perf_counter()
+        recorder._restart_threads()
+        recorder.wait_until_capturing(timeout=5)
+        elapsed = time.perf_counter() - started
+        recorder.resume_recording()  # The controller would not: the track stays cut until the next one
+        return {'call_ms': elapsed * 1000}
+    recorder, tracks, result = _record(actions)
+    return {
+        'call_ms': result['call_ms'],
+        'tracks': len(tracks),
+        'ramp': _ramp_check(tracks[0]['audio']) if tracks else None,
+    }
+
+
+def _resampler(quick):
+    results = []
+    for from_rate, to_rate in ((44100, 48000), (48000, 44100), (96000, 48000), (48000, 96000)):
+        seconds = 2 if quick else 10
+        t = np.arange(from_rate * seconds) / from_rate
+        x = np.repeat(np.sin(2 * np.pi * 1000 * t)[:, None], 2, axis=1).astype(np.float32)
+        blocked = StreamResampler(from_rate, to_rate, 2)
+        started = time.perf_counter()
+        y = np.concatenate([blocked.process(x[i:i + 480]) for i in range(0, len(x), 480)] + [blocked.flush()])
+        elapsed = time.perf_counter() - started
+        whole = StreamResampler(from_rate, to_rate, 2)
+        y_whole = np.concatenate([whole.process(x), whole.flush()])
+        ref = np.sin(2 * np.pi * 1000 * np.arange(len(y)) / to_rate)
+        inner = slice(to_rate // 10, len(y) - to_rate // 10)
+        noise = np.mean(np.square(y[inner, 0] - ref[inner]))
+        results.append({
+            'from': from_rate, 'to': to_rate, 'taps': blocked.taps,
+            'frames_out': len(y), 'frames_expected': len(x) * to_rate / from_rate,
+            'snr_db': float(10 * np.log10(np.mean(np.square(ref[inner])) / noise)),
+            'block_size_invariant': bool(np.array_equal(y, y_whole)),
+            'realtime_factor': seconds / elapsed,
+        })
+    return results
+
+
+def run(quick=False):
+    switches = 6 if quick else 30
+    with temp_output_dir():
+        return {
+            'block_size': _block_sizes(switches),
+            'device_switch': _device_switch(switches),
+            'rate_change': _rate_change(),
+            'legacy_restart': _legacy_restart(),
+            'resampler': _resampler(quick),
+        }
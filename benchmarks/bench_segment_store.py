@@ -0,0 +1,194 @@
+"""
+Memory-mapped capture store: write syscalls per second of audio and per-write
+latency (jitter) of the mapped writer against the buffered journal writer,
+the same for the live Recorder writer thread, the cost of rotating to a new
+file at a track boundary, zero-copy reads for the encoder, and crash repair
+of a preallocated file.
+"""
+import os
+import time
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir, config_overrides, summarize, write_test_audio
+from spufify.core.journal import JournalWavWriter, repair_wav
+from spufify.core.segment_store import MappedWavWriter, map_float_wav
+from spufify.core.encoding import transcode_native
+from spufify.core.recorder import Recorder
+from spufify.core.sources import SignalSource
+
+NAME = "segment_store"
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+
+
+def _syscalls():
+    """Read + write syscalls made by this process so far (Linux), or None."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["syscr"]) + int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _writer(kind, path, sync_interval=None):
+    if kind == 'mmap':
+        return MappedWavWriter(path, SAMPLE_RATE, CHANNELS, sync_interval=sync_interval, segment_frames=SAMPLE_RATE * 60)
+    return JournalWavWriter(path, SAMPLE_RATE, CHANNELS, sync_interval=sync_interval)
+
+
+def _write_run(out, kind, block_frames, seconds, speed=20.0):
+    block = (0.1 * np.random.default_rng(0).standard_normal((block_frames, CHANNELS))).astype(np.float32)
+    writes = int(seconds * SAMPLE_RATE / block_frames)
+    sync_every = max(1, SAMPLE_RATE // block_frames)  # Paced faster than real time: sync once per second of audio
+    interval = block_frames / SAMPLE_RATE / speed
+    path = os.path.join(out, f"{kind}_{block_frames}.wav")
+    writer = _writer(kind, path)
+    latencies = []
+    calls = _syscalls()
+    started = time.perf_counter()
+    for i in range(writes):
+        delay = started + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        t0 = time.perf_counter()
+        writer.write(block)
+        latencies.append(time.perf_counter() - t0)
+        if i % sync_every == sync_every - 1:
+            writer.sync()
+    writer.close()
+    elapsed = time.perf_counter() - started
+    calls = _syscalls() - calls if calls is not None else None
+    return {
+        'writer': kind,
+        'block_ms': block_frames * 1000 / SAMPLE_RATE,
+        'audio_sec': seconds,
+        'speed': speed,
+        'syscalls_per_audio_sec': calls / seconds if calls is not None else None,
+        'write_latency': summarize(latencies),
+        'readable_frames': sf.info(path).frames,
+    }
+
+
+def _pipeline(mmap, seconds):
+    """Live Recorder at 4x real time: syscalls per second of wall time and writer-thread write latency."""
+    with temp_output_dir(), config_overrides(MMAP_CAPTURE=mmap, BLOCK_SIZE=480, ADAPTIVE_BLOCK_SIZE=False):
+        source = SignalSource(kind='noise', duration=seconds, samplerate=SAMPLE_RATE, speed=4.0)
+        recorder = Recorder(source=source)
+        latencies = []
+        write_output = recorder._write_output
+
+        def timed_write(data):
+            t0 = time.perf_counter()
+            write_output(data)
+            latencies.append(time.perf_counter() - t0)
+
+        recorder._write_output = timed_write
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+        recorder.resume_recording()
+        calls = _syscalls()
+        started = time.perf_counter()
+        recorder.capture_thread.join()
+        while recorder.ring.available() > 0:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - started
+        calls = _syscalls() - calls if calls is not None else None
+        frames = recorder._wav_file.frames if recorder._wav_file else 0
+        recorder._close_wav_file()
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=2)
+        # Capture-side reads are the same for both; the difference is the writer
+        return {
+            'mmap': mmap,
+            'elapsed_s': elapsed,
+            'frames_written': frames,
+            'syscalls_per_sec': calls / elapsed if calls is not None else None,
+            'write_latency': summarize(latencies),
+        }
+
+
+def _rotation(out, kind, tracks=50):
+    """Close the finished track and open the next one, as the writer does at a boundary."""
+    block = np.zeros((480, CHANNELS), dtype=np.float32) + 0.01
+    times = []
+    writer = _writer(kind, os.path.join(out, f"rotate_{kind}_0.wav"), sync_interval=1.0)
+    for i in range(1, tracks + 1):
+        for _ in range(100):
+            writer.write(block)
+        t0 = time.perf_counter()
+        writer.close()
+        writer = _writer(kind, os.path.join(out, f"rotate_{kind}_{i}.wav"), sync_interval=1.0)
+        times.append(time.perf_counter() - t0)
+    writer.abort()
+    return dict(summarize(times), writer=kind)
+
+
+def _encoder_read(out, seconds):
+    path = write_test_audio(os.path.join(out, "capture.wav"), seconds, SAMPLE_RATE)
+    results = {}
+
+    started = time.perf_counter()
+    total = 0.0
+    with sf.SoundFile(path) as f:
+        for block in f.blocks(blocksize=65536, dtype='float32', always_2d=True):
+            total += float(block[0, 0])
+    results['soundfile_read_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    audio, _ = map_float_wav(path)
+    for start in range(0, len(audio), 65536):
+        block = np.asarray(audio[start:start + 65536])
+        total += float(block[0, 0])
+    results['mmap_read_ms'] = (time.perf_counter() - started) * 1000
+    del audio, block
+
+    started = time.perf_counter()
+    frames = transcode_native(path, os.path.join(out, "capture.flac"), 'flac', bit_depth=24, dither=False)
+    results['transcode_flac_ms'] = (time.perf_counter() - started) * 1000
+    results['transcode_frames'] = frames
+    results['audio_sec'] = seconds
+    return results
+
+
+def _crash_repair(out, seconds):
+    """A mapped capture abandoned without close() (the page cache outlives the process)."""
+    path = os.path.join(out, "crashed.wav")
+    writer = MappedWavWriter(path, SAMPLE_RATE, CHANNELS, sync_interval=None, segment_frames=SAMPLE_RATE * 60)
+    block = (0.1 * np.random.default_rng(1).standard_normal((480, CHANNELS))).astype(np.float32)
+    for i in range(int(seconds * 100)):
+        writer.write(block)
+        if i == 99:
+            writer.sync()  # Header claims one second
+    written = writer.frames
+    writer._stop_prefault()
+    writer._map.flush()
+    writer._map = None
+    os.close(writer._fd)
+    size_before = os.path.getsize(path)
+    started = time.perf_counter()
+    recovered = repair_wav(path)
+    return {
+        'frames_written': written,
+        'preallocated_mb': size_before / 1e6,
+        'frames_recovered': recovered,
+        'repair_ms': (time.perf_counter() - started) * 1000,
+    }
+
+
+def run(quick=False):
+    seconds = 10 if quick else 60
+    with temp_output_dir() as out:
+        return {
+            'writes': [
+                _write_run(out, kind, block_frames, seconds)
+                for block_frames in (480, 2400) for kind in ('journal', 'mmap')
+            ],
+            'pipeline': [_pipeline(mmap, 20.0 if quick else 60.0) for mmap in (False, True)],
+            'rotation': [_rotation(out, kind) for kind in ('journal', 'mmap')],
+            'encoder_read': _encoder_read(out, seconds * 3),
+            'crash_repair': _crash_repair(out, 3.5),
+        }
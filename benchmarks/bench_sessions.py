@@ -0,0 +1,148 @@
+"""
+Multi-session recording: N accounts (synthetic source each, mocked Spotify
+client per account with its own track timetable) recorded by one process
+through a SessionManager, against N single-session processes running side by
+side, as before sessions existed. Compares total CPU time and resident
+memory, threads, how late the shared poll loop ran each account's polls, and
+checks that every track of every session was saved (the one playing at
+shutdown as a partial take). A last run makes
+one account's Spotify calls slow (as when rate limited) and checks that the
+other accounts' polls stay on time and their tracks are still all saved.
+"""
+import os
+import sys
+import json
+import math
+import time
+import subprocess
+
+from benchmarks.common import temp_output_dir
+
+NAME = "sessions"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SESSIONS_SCRIPT = """
+import os, sys, json, time, resource, threading
+from spufify.config import Config
+from spufify.core.sources import SignalSource
+from spufify.core.session import SessionManager, SessionConfig
+
+out, names, seconds, track_sec = sys.argv[1], sys.argv[2].split(','), float(sys.argv[3]), float(sys.argv[4])
+slow_name, slow_sec = sys.argv[5], float(sys.argv[6])
+
+class _Spotify:
+    # Account `name` changes track every TRACK_SEC of wall time
+    def __init__(self, name, started):
+        self.name = name
+        self.started = started
+
+    def is_authenticated(self):
+        return True
+
+    def get_current_track(self):
+        if self.name == slow_name:
+            time.sleep(slow_sec)
+        elapsed = time.monotonic() - self.started
+        index = int(elapsed // track_sec)
+        return {'is_ad': False, 'is_playing': True, 'title': f"{self.name} Track {index}", 'artist': "Spufify Bench",
+                'album': "Synthetic Album", 'cover_url': None, 'duration_ms': int(track_sec * 1000),
+                'progress_ms': int((elapsed - index * track_sec) * 1000), 'track_id': f"{self.name}{index:04d}"}
+
+Config.OUTPUT_DIR = out
+Config.REPLAYGAIN = False
+Config.LIBRARY_SKIP_KNOWN = False
+started = time.monotonic()
+manager = SessionManager()
+for i, name in enumerate(names):
+    manager.create_session(SessionConfig(name), source=SignalSource(kind='sine', frequency=220.0 * (i + 1)),
+                           spotify_client=_Spotify(name, started))
+manager.start()
+time.sleep(seconds / 2)
+threads = threading.active_count()
+time.sleep(seconds - (time.monotonic() - started))
+manager.shutdown(wait=True)
+cpu = os.times()
+saved = [f for f in os.listdir(out) if f.endswith('.' + Config.OUTPUT_FORMAT)]
+print(json.dumps({
+    'cpu_sec': cpu.user + cpu.system,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'threads': threads,
+    'saved': {name: sum(1 for f in saved if f" - {name} Track " in f) for name in names},
+    'polling': manager.get_stats(),
+}))
+"""
+
+
+def _spawn(out, names, seconds, track_sec, slow_name='', slow_sec=0.0):
+    return subprocess.Popen(
+        [sys.executable, '-c', _SESSIONS_SCRIPT, out, ','.join(names), str(seconds), str(track_sec), slow_name,
+         str(slow_sec)], cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=dict(os.environ, PYTHONPATH=ROOT)
+    )
+
+
+def _collect(processes):
+    results = []
+    for process in processes:
+        stdout, stderr = process.communicate(timeout=120)
+        if process.returncode != 0 or not stdout.strip():
+            raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else "session process failed")
+        results.append(json.loads(stdout.strip().splitlines()[-1]))
+    return results
+
+
+def _summary(results, names, wall_sec, expected_tracks):
+    saved = {}
+    for result in results:
+        saved.update(result['saved'])
+    return {
+        'processes': len(results),
+        'wall_sec': wall_sec,
+        'cpu_sec': sum(result['cpu_sec'] for result in results),
+        'max_rss_mb_total': sum(result['max_rss_mb'] for result in results),
+        'threads_total': sum(result['threads'] for result in results),
+        'max_poll_lag_ms': max(result['polling']['max_poll_lag_ms'] for result in results),
+        'tracks_expected_per_session': expected_tracks,
+        'tracks_saved': saved,
+        'all_saved': all(saved.get(name) == expected_tracks for name in names),
+    }
+
+
+def _run(sessions, seconds, track_sec):
+    names = [f"acct{i}" for i in range(sessions)]
+    expected = math.ceil(seconds / track_sec)  # The track playing at shutdown is saved as a partial take
+    results = {}
+    for mode in ('one_process', 'process_per_session'):
+        with temp_output_dir() as out:
+            started = time.perf_counter()
+            if mode == 'one_process':
+                processes = [_spawn(out, names, seconds, track_sec)]
+            else:
+                processes = [_spawn(out, [name], seconds, track_sec) for name in names]
+            collected = _collect(processes)
+            results[mode] = _summary(collected, names, time.perf_counter() - started, expected)
+    one, many = results['one_process'], results['process_per_session']
+    results['cpu_saving_percent'] = 100 * (1 - one['cpu_sec'] / many['cpu_sec'])
+    results['memory_saving_percent'] = 100 * (1 - one['max_rss_mb_total'] / many['max_rss_mb_total'])
+
+    # Every Spotify call of the first account takes most of a track; the others must not wait on it
+    slow_name, slow_sec = names[0], track_sec * 0.75
+    with temp_output_dir() as out:
+        slow = _collect([_spawn(out, names, seconds, track_sec, slow_name, slow_sec)])[0]
+    others = [name for name in names if name != slow_name]
+    lag = slow['polling']['max_poll_lag_ms_by_session']
+    results['slow_account'] = {
+        'slow_call_ms': slow_sec * 1000,
+        'max_poll_lag_ms': lag,
+        'others_max_poll_lag_ms': max(lag.get(name, 0.0) for name in others),
+        'others_all_saved': all(slow['saved'].get(name) == expected for name in others),
+        'tracks_saved': slow['saved'],
+    }
+    return results
+
+
+def run(quick=False):
+    if quick:
+        return {'sessions': 3, **_run(3, seconds=7.0, track_sec=2.0)}
+    return {'sessions': 6, **_run(6, seconds=25.0, track_sec=4.0)}
@@ -0,0 +1,79 @@
+"""
+Silence analysis: CPU cost of the vectorized analyzer on writer-sized slices
+at 48/96/192 kHz stereo (target: under 2% of one core at 192 kHz), and the
+trimming it drives through the Recorder on a scripted signal with leading,
+inner and trailing silence.
+"""
+import time
+
+import numpy as np
+
+from benchmarks.common import temp_output_dir, config_overrides, fake_track, CollectingProcessor
+from spufify.config import Config
+from spufify.core.recorder import Recorder
+from spufify.core.silence import SilenceAnalyzer
+from spufify.core.sources import SignalSource
+
+NAME = "silence"
+
+SAMPLE_RATES = [48000, 96000, 192000]
+
+
+def _analyzer_cost(samplerate, seconds, slice_ms):
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.3, 0.3, size=(int(seconds * samplerate), 2)).astype(np.float32)
+    # Every other second silent, so both branches are exercised
+    for start in range(samplerate, len(audio), 2 * samplerate):
+        audio[start:start + samplerate] *= 1e-4
+    analyzer = SilenceAnalyzer(samplerate, Config.SILENCE_THRESHOLD_DB, Config.MIN_SILENCE_DURATION_SEC)
+    step = samplerate * slice_ms // 1000
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for offset in range(0, len(audio), step):
+        analyzer.runs(audio[offset:offset + step])
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return {
+        'sample_rate': samplerate,
+        'audio_seconds': seconds,
+        'slice_ms': slice_ms,
+        'cpu_s': cpu,
+        'wall_s': wall,
+        'core_percent': cpu / seconds * 100,
+        'silent_fraction': analyzer.silent_frames / analyzer.frames_analyzed,
+    }
+
+
+def _trimming(samplerate=48000):
+    script = [('silence', 1.0), ('noise', 3.0), ('silence', 3.5), ('noise', 3.0), ('silence', 1.0)]
+    with temp_output_dir(), config_overrides(STREAMING_ENCODE=False, TRIM_SILENCE=True, MIN_SILENCE_DURATION_SEC=2.0):
+        recorder = Recorder(source=SignalSource(script=script, samplerate=samplerate, amplitude=0.3, speed=None))
+        recorder.processor = CollectingProcessor()
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+        recorder.start_capture_thread()
+        recorder.capture_thread.join()
+        recorder.finish_track()
+        deadline = time.monotonic() + 10
+        while not recorder.processor.tracks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=5)
+
+        frames = recorder.processor.tracks[0][1] if recorder.processor.tracks else 0
+        return {
+            'captured_seconds': sum(seconds for _, seconds in script),
+            # 1 s lead and 1 s tail dropped, the 3.5 s gap capped at MIN_SILENCE_DURATION_SEC
+            'expected_seconds': 3.0 + 2.0 + 3.0,
+            'written_seconds': frames / samplerate,
+            'silence': recorder.get_stats().get('silence'),
+        }
+
+
+def run(quick=False):
+    seconds = 10 if quick else 60
+    return {
+        'analyzer': [_analyzer_cost(rate, seconds, slice_ms=50) for rate in SAMPLE_RATES],
+        'trimming': _trimming(),
+    }
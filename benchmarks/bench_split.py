@@ -0,0 +1,150 @@
+"""
+Track split accuracy: a synthetic playlist (silence gap, gapless level jump,
+short tail silence, equal-level hand-over) replayed through the Recorder at
+4x speed, with track changes reported late the way polling sees them. Compares
+cuts placed from progress_ms alone against cuts refined on the audio, and
+checks that every captured frame ends up in exactly one file (silence
+trimming is off so file lengths map straight back to cut positions). A pause
+in the middle of a track, noticed a paused-poll interval late on resume,
+checks that the take continues where playback picked up (nothing of the
+resumed audio lost, none of the silent pause kept).
+"""
+import os
+import random
+import time
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir, config_overrides, fake_track, summarize, CollectingProcessor
+from spufify.core.recorder import Recorder
+from spufify.core.sources import FileSource
+
+NAME = "split"
+
+SAMPLE_RATE = 48000
+SPEED = 4.0
+
+
+def _tone(seconds, frequency, amplitude):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+def _playlist(rng):
+    """Returns the track signals; boundaries fall between consecutive entries."""
+    fade = np.linspace(1.0, 0.0, SAMPLE_RATE)
+    t0 = _tone(6.0, 440, 0.4)
+    t0[-SAMPLE_RATE:] *= fade
+    t0 = np.concatenate([t0, np.zeros(SAMPLE_RATE)])                   # fade out + 1 s gap
+    t1 = _tone(6.0, 330, 0.05)                                          # quiet, ends abruptly...
+    t2 = rng.uniform(-0.5, 0.5, int(6.0 * SAMPLE_RATE))                 # ...into a loud start
+    t2 = np.concatenate([t2, np.zeros(int(0.3 * SAMPLE_RATE))])         # short tail silence
+    t3 = _tone(6.0, 660, 0.3)                                           # equal level hand-over
+    t4 = _tone(6.0, 880, 0.3)
+    return [t0, t1, t2, t3, t4]
+
+
+def _run(refine, seed=0):
+    rng = random.Random(seed)
+    signals = _playlist(np.random.default_rng(seed))
+    boundaries = np.cumsum([len(s) for s in signals])[:-1]
+    with temp_output_dir() as out, config_overrides(SPLIT_REFINE=refine, STREAMING_ENCODE=False, TRIM_SILENCE=False):
+        path = os.path.join(out, "playlist.wav")
+        sf.write(path, np.concatenate(signals).astype(np.float32), SAMPLE_RATE, subtype='FLOAT')
+        total_frames = sf.info(path).frames
+
+        recorder = Recorder(source=FileSource(path, speed=SPEED))
+        recorder.processor = CollectingProcessor()
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+
+        delays = []
+        for index, boundary in enumerate(boundaries, start=1):
+            # Polling notices the change 100-400 ms late; the API's progress lags by up to 300 ms
+            delay = rng.uniform(0.1, 0.4)
+            lag = rng.uniform(0.0, 0.3)
+            while recorder.ring.write_pos < boundary + delay * SAMPLE_RATE:
+                time.sleep(0.002)
+            track = fake_track(index, progress_ms=int((delay - lag) * 1000))
+            track['fetched_at'] = time.monotonic()
+            recorder.split_track(track)
+            delays.append(delay)
+
+        recorder.capture_thread.join()
+        recorder.finish_track()
+        deadline = time.monotonic() + 10
+        while len(recorder.processor.tracks) < len(signals) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=5)
+
+        lengths = [frames for _, frames in recorder.processor.tracks]
+        cuts = np.cumsum(lengths)[:-1]
+        errors_ms = [(int(c) - int(b)) * 1000 / SAMPLE_RATE for c, b in zip(cuts, boundaries)]
+        return {
+            'refine': refine,
+            'tracks_written': len(lengths),
+            'frames_captured': total_frames,
+            'frames_in_files': int(sum(lengths)),
+            'cut_error_ms': errors_ms,
+            'abs_cut_error': summarize([abs(e) / 1000 for e in errors_ms]),
+            'detection_delay': summarize(delays),
+            'recorder': recorder.get_stats()['splits'],
+        }
+
+
+def _pause_resume(played=2.0, paused=3.0, rest=6.0, noticed=5.0):
+    """`noticed`: seconds of resumed playback before a poll (POLL_IDLE_SEC while paused) sees it."""
+    signal = np.concatenate([_tone(played, 440, 0.3), np.zeros(int(paused * SAMPLE_RATE)), _tone(rest, 440, 0.3)])
+    with temp_output_dir() as out, config_overrides(STREAMING_ENCODE=False, TRIM_SILENCE=False, SPLIT_REFINE=False):
+        path = os.path.join(out, "paused.wav")
+        sf.write(path, signal.astype(np.float32), SAMPLE_RATE, subtype='FLOAT')
+
+        recorder = Recorder(source=FileSource(path, speed=SPEED))
+        recorder.processor = CollectingProcessor()
+        recorder.set_current_metadata(fake_track(0, progress_ms=0))
+        recorder.resume_recording()
+        recorder.start_capture_thread()
+        recorder._ring_ready.wait(timeout=5)
+
+        def wait_for(seconds):
+            while recorder.ring.write_pos < seconds * SAMPLE_RATE:
+                time.sleep(0.002)
+
+        wait_for(played + 0.2)  # The poll after playback stopped
+        recorder.set_current_metadata(fake_track(0, progress_ms=int(played * 1000), is_playing=False))
+        recorder.pause_recording()
+        wait_for(played + paused + noticed)
+        track = fake_track(0, progress_ms=int((played + noticed) * 1000))
+        track['fetched_at'] = time.monotonic()
+        recorder.set_current_metadata(track)
+        recorder.resume_recording()
+
+        recorder.capture_thread.join()
+        recorder.finish_track()
+        deadline = time.monotonic() + 10
+        while not recorder.processor.tracks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        recorder.recording = False
+        recorder.processing_thread.join(timeout=5)
+
+    frames = recorder.processor.tracks[0][1] if recorder.processor.tracks else 0
+    expected = int((played + rest) * SAMPLE_RATE)
+    return {
+        'resume_noticed_after_s': noticed,
+        'frames_expected': expected,
+        'frames_in_file': frames,
+        'error_ms': (frames - expected) * 1000 / SAMPLE_RATE,
+    }
+
+
+def run(quick=False):
+    seeds = [0] if quick else [0, 1, 2]
+    return {
+        'estimate_only': [_run(refine=False, seed=seed) for seed in seeds],
+        'refined': [_run(refine=True, seed=seed) for seed in seeds],
+        'pause_resume': _pause_resume(),
+    }
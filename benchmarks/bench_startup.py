@@ -0,0 +1,187 @@
+"""
+Start-up time: what each heavy dependency costs to import in a fresh
+interpreter, what the window path (spufify.main, settings, dashboard) still
+imports before anything is shown, compared with the eager import set main.py
+used to load first, and a headless fast start (synthetic source, mocked
+Spotify client) broken down per phase by main.StartupTimer up to captured
+audio and the first poll. The device probe is timed against a fake device
+whose recorder opens are slow, next to the previous probe strategy (one
+trial open per rate, then a reopen).
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+
+from benchmarks.common import temp_output_dir, config_overrides
+from spufify.core.sources import LoopbackSource
+
+NAME = "startup"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['numpy', 'soundfile', 'soundcard', 'spotipy', 'mutagen', 'requests', 'customtkinter', 'PIL.Image']
+
+# What main.py imported before showing anything (plus the UI toolkit when it is installed)
+EAGER_IMPORTS = ['numpy', 'spufify.config', 'spufify.core.controller', 'spufify.core.recorder',
+                 'spufify.core.journal', 'spufify.utils.metrics', 'spotipy', 'spotipy.oauth2']
+WINDOW_IMPORTS = ['spufify.main', 'spufify.ui.dashboard']
+
+_IMPORT_SCRIPT = """
+import sys, time, json, importlib
+started = time.perf_counter()
+failed = []
+for name in sys.argv[1:]:
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        failed.append(f"{name}: {type(e).__name__}")
+print(json.dumps({'seconds': time.perf_counter() - started, 'failed': failed}))
+"""
+
+_HEADLESS_SCRIPT = """
+import sys, json, time
+from spufify.main import StartupTimer, start_core
+from spufify.config import Config
+
+class _Spotify:
+    def is_authenticated(self):
+        return True
+
+    def get_current_track(self):
+        return None
+
+timer = StartupTimer()
+timer.mark('main_imported')
+Config.OUTPUT_DIR = sys.argv[1]
+Config.load_settings()
+Config.REPLAYGAIN = False
+timer.mark('settings_loaded')
+from spufify.core.sources import SignalSource
+recorder, controller = start_core(timer, source=SignalSource(kind='noise', duration=5), spotify_client=_Spotify())
+deadline = time.monotonic() + 10
+while 'audio_ready' not in timer.phases and time.monotonic() < deadline:
+    time.sleep(0.001)
+controller.tick()
+timer.mark('first_poll')
+recorder.recording = False
+print(json.dumps(timer.phases))
+"""
+
+
+def _python(script, args, env=None):
+    run = subprocess.run([sys.executable, '-c', script] + list(args), capture_output=True, text=True, cwd=ROOT,
+                         env=dict(os.environ, PYTHONPATH=ROOT, **(env or {})))
+    if run.returncode != 0:
+        raise RuntimeError(run.stderr.strip().splitlines()[-1] if run.stderr.strip() else "subprocess failed")
+    return json.loads(run.stdout.strip().splitlines()[-1])
+
+
+def _import_ms(modules, runs):
+    """Best-of-runs import time (ms) of `modules` in a fresh interpreter; modules that fail are listed."""
+    results = [_python(_IMPORT_SCRIPT, modules) for _ in range(runs)]
+    return {'ms': min(result['seconds'] for result in results) * 1000, 'failed': results[0]['failed']}
+
+
+def _imports(runs):
+    per_module = {}
+    for name in HEAVY_MODULES:
+        measured = _import_ms([name], runs)
+        per_module[name] = None if measured['failed'] else measured['ms']
+    eager = EAGER_IMPORTS + [name for name in ('customtkinter', 'PIL.Image') if per_module.get(name) is not None]
+    return {
+        'per_module_ms': per_module,  # None = not installed / no backend here
+        'main_module': _import_ms(['spufify.main'], runs),
+        'window_path': _import_ms(WINDOW_IMPORTS, runs),
+        'core': _import_ms(['spufify.core.recorder', 'spufify.core.controller'], runs),
+        'eager_baseline': _import_ms(eager, runs),
+    }
+
+
+def _headless(runs):
+    """Per-phase start-up timeline (ms since main was imported) of a headless fast start; best of runs per phase."""
+    timelines = []
+    with temp_output_dir() as out:
+        for _ in range(runs):
+            timelines.append(_python(_HEADLESS_SCRIPT, [out]))
+    phases = {phase: min(timeline[phase] for timeline in timelines if phase in timeline) * 1000
+              for phase in timelines[0]}
+    return {'runs': runs, 'phases_ms': phases}
+
+
+class _FakeRecorder:
+    def __init__(self, device, samplerate):
+        self.device = device
+        self.samplerate = samplerate
+
+    def __enter__(self):
+        self.device.opens += 1
+        time.sleep(self.device.open_delay)
+        if self.samplerate not in self.device.rates:
+            raise RuntimeError(f"{self.samplerate} Hz not supported")
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakeDevice:
+    """Loopback device whose recorder opens take `open_delay` seconds (WASAPI opens are tens of ms)."""
+    name = "Fake Speakers (Loopback)"
+    channels = 2
+
+    def __init__(self, rates, open_delay):
+        self.rates = set(rates)
+        self.open_delay = open_delay
+        self.opens = 0
+
+    def recorder(self, samplerate, channels):
+        return _FakeRecorder(self, samplerate)
+
+
+def _previous_probe(device):
+    """The probe before fast start: trial open/close per rate in a fixed order, then open the winner again."""
+    for rate in LoopbackSource.PROBE_RATES:
+        try:
+            with device.recorder(samplerate=rate, channels=2):
+                break
+        except Exception:
+            continue
+    recorder = device.recorder(samplerate=rate, channels=2)
+    recorder.__enter__()
+    return rate
+
+
+def _probe(open_delay):
+    scenarios = [
+        ('configured_rate_supported', 48000, [48000, 44100]),
+        ('device_44k1_only', 48000, [44100]),
+        ('device_44k1_only_configured_44k1', 44100, [44100]),
+        ('device_96k_only', 48000, [96000]),
+    ]
+    results = []
+    for name, configured, rates in scenarios:
+        row = {'scenario': name, 'configured_rate': configured}
+        for label, probe in (('previous', _previous_probe), ('current', None)):
+            device = _FakeDevice(rates, open_delay)
+            started = time.perf_counter()
+            with config_overrides(SAMPLE_RATE=configured):
+                if probe is None:
+                    _, rate, _ = LoopbackSource()._open_device_recorder(device)
+                else:
+                    rate = probe(device)
+            row[label] = {'rate': rate, 'opens': device.opens, 'ms': (time.perf_counter() - started) * 1000}
+        results.append(row)
+    return {'open_delay_ms': open_delay * 1000, 'scenarios': results}
+
+
+def run(quick=False):
+    runs = 3 if quick else 10
+    imports = _imports(runs)
+    return {
+        'imports': imports,
+        'import_saving_before_window_ms': imports['eager_baseline']['ms'] - imports['window_path']['ms'],
+        'headless_fast_start': _headless(runs),
+        'device_probe': _probe(0.03),
+    }
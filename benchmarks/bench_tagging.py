@@ -0,0 +1,47 @@
+"""
+Tagging latency for FLAC and MP3 outputs, with and without cover art.
+Covers are served by a local HTTP stand-in so no network is involved.
+"""
+import os
+import time
+
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir, write_test_audio, fake_track, summarize, CoverServer
+from spufify.core.processor import Processor
+
+NAME = "tagging"
+
+
+def _encode_fixture(out, fmt):
+    wav = write_test_audio(os.path.join(out, f"fixture_{fmt}.wav"), 10, subtype='PCM_16')
+    path = os.path.join(out, f"fixture.{fmt}")
+    data, samplerate = sf.read(wav, dtype='float32')
+    sf.write(path, data, samplerate, format=fmt.upper())
+    return path
+
+
+def run(quick=False):
+    iterations = 5 if quick else 20
+    processor = Processor()
+    results = []
+    with temp_output_dir() as out, CoverServer() as covers:
+        for fmt in ('flac', 'mp3'):
+            try:
+                path = _encode_fixture(out, fmt)
+            except Exception as e:
+                results.append({'format': fmt, 'skipped': f"cannot create fixture: {e}"})
+                continue
+            apply_tags = processor._apply_tags_flac if fmt == 'flac' else processor._apply_tags_mp3
+            for with_cover in (False, True):
+                samples = []
+                for i in range(iterations):
+                    metadata = fake_track(index=i, cover_url=covers.url(f"{i}.jpg") if with_cover else None)
+                    start = time.perf_counter()
+                    apply_tags(path, metadata)
+                    samples.append(time.perf_counter() - start)
+                entry = {'format': fmt, 'cover': with_cover}
+                entry.update(summarize(samples))
+                results.append(entry)
+        cover_requests = covers.requests
+    return {'results': results, 'cover_requests': cover_requests}
@@ -0,0 +1,41 @@
+"""
+Raw WAV write bandwidth: SoundFile FLOAT writes (the format the recorder
+uses for in-flight tracks) at different chunk sizes.
+"""
+import os
+import time
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import temp_output_dir
+
+NAME = "wav_write"
+
+CHUNK_FRAMES = [256, 2400, 48000]
+
+
+def run(quick=False):
+    samplerate, channels = 48000, 2
+    total_frames = samplerate * (10 if quick else 60)
+    results = []
+    with temp_output_dir() as out:
+        for chunk in CHUNK_FRAMES:
+            block = np.random.default_rng(0).uniform(-0.5, 0.5, size=(chunk, channels)).astype(np.float32)
+            path = os.path.join(out, f"write_{chunk}.wav")
+            writes = total_frames // chunk
+            start = time.perf_counter()
+            with sf.SoundFile(path, mode='w', samplerate=samplerate, channels=channels, subtype='FLOAT') as f:
+                for _ in range(writes):
+                    f.write(block)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+            results.append({
+                'chunk_frames': chunk,
+                'writes': writes,
+                'bytes': size,
+                'elapsed_s': elapsed,
+                'mb_per_sec': size / elapsed / 1e6 if elapsed else 0.0,
+                'writes_per_sec': writes / elapsed if elapsed else 0.0,
+            })
+            os.remove(path)
+    return {'chunks': results}
@@ -0,0 +1,173 @@
+"""
+Shared helpers for the benchmark suite: timing, synthetic audio files,
+a mocked Spotify client and a local stand-in for the cover art CDN.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Allow running as `python benchmarks/run.py` as well as `python -m benchmarks.run`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def summarize(samples):
+    """Mean/median/p95/max of a list of durations (seconds), reported in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    arr = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        'count': int(arr.size),
+        'mean_ms': float(arr.mean()),
+        'median_ms': float(np.median(arr)),
+        'p95_ms': float(np.percentile(arr, 95)),
+        'max_ms': float(arr.max()),
+    }
+
+
+@contextlib.contextmanager
+def temp_output_dir():
+    """Points Config.OUTPUT_DIR at a throwaway directory for the duration of a benchmark."""
+    from spufify.config import Config
+    previous = Config.OUTPUT_DIR
+    path = tempfile.mkdtemp(prefix="spufify_bench_")
+    Config.OUTPUT_DIR = path
+    try:
+        yield path
+    finally:
+        Config.OUTPUT_DIR = previous
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def config_overrides(**values):
+    """Temporarily overrides Config attributes."""
+    from spufify.config import Config
+    previous = {key: getattr(Config, key) for key in values}
+    for key, value in values.items():
+        setattr(Config, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(Config, key, value)
+
+
+def write_test_audio(path, seconds, samplerate=48000, channels=2, subtype='FLOAT', seed=0):
+    """Writes a deterministic tone + noise file, the same shape the recorder produces."""
+    import soundfile as sf
+    rng = np.random.default_rng(seed)
+    chunk = samplerate * 5
+    with sf.SoundFile(path, mode='w', samplerate=samplerate, channels=channels, subtype=subtype) as f:
+        written = 0
+        total = int(seconds * samplerate)
+        while written < total:
+            n = min(chunk, total - written)
+            t = np.arange(written, written + n) / samplerate
+            tone = 0.3 * np.sin(2 * np.pi * 440.0 * t)
+            block = tone[:, None] + rng.normal(0, 0.05, size=(n, channels))
+            f.write(block.astype(np.float32))
+            written += n
+    return path
+
+
+def fake_track(index=0, duration_ms=180000, progress_ms=0, is_playing=True, cover_url=None):
+    return {
+        'is_ad': False,
+        'is_playing': is_playing,
+        'title': f"Benchmark Track {index}",
+        'artist': "Spufify Bench",
+        'album': "Synthetic Album",
+        'cover_url': cover_url,
+        'duration_ms': duration_ms,
+        'progress_ms': progress_ms,
+        'track_id': f"bench{index:06d}",
+    }
+
+
+class MockSpotifyClient:
+    """
+    Drop-in for SpotifyClient that replays a scripted playback timeline.
+    `tracks` is a list of track dicts; each get_current_track() call advances
+    the script by one entry (the last entry repeats).
+    """
+    def __init__(self, tracks=None, latency=0.0):
+        self.tracks = tracks or [fake_track()]
+        self.latency = latency
+        self.calls = 0
+
+    def is_authenticated(self):
+        return True
+
+    def get_current_track(self):
+        if self.latency:
+            time.sleep(self.latency)
+        track = self.tracks[min(self.calls, len(self.tracks) - 1)]
+        self.calls += 1
+        return dict(track) if track else None
+
+
+class CollectingProcessor:
+    """Stands in for the Recorder's Processor: records (track_id, frames) of each handed-off track."""
+    def __init__(self):
+        self.tracks = []
+
+    def _collect(self, path, metadata):
+        import soundfile as sf
+        self.tracks.append((metadata['track_id'], sf.info(path).frames))
+        os.remove(path)
+
+    def process_track(self, path, metadata, sample_rate):
+        self._collect(path, metadata)
+
+    def finish_stream(self, path, metadata):
+        self._collect(path, metadata)
+
+
+class CoverServer:
+    """
+    Local HTTP stand-in for the album art CDN. Serves the same JPEG-sized payload for every path
+    (with `status` and extra `headers`, e.g. 429 + Retry-After, it answers every request that way).
+    """
+    def __init__(self, payload_size=64 * 1024, status=200, headers=None):
+        payload = b"\xff\xd8\xff\xe0" + os.urandom(payload_size)
+        self.requests = 0
+        server_ref = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server_ref.requests += 1
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, name="cover.jpg"):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/{name}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
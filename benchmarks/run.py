@@ -0,0 +1,113 @@
+"""
+Spufify benchmark runner.
+
+Usage:
+    python -m benchmarks.run                      # all benchmarks, JSON to stdout
+    python -m benchmarks.run --only capture,encode --output results.json
+    python -m benchmarks.run --quick              # shorter runs for CI
+"""
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCHMARKS = [
+    "benchmarks.bench_capture",
+    "benchmarks.bench_block_tuner",
+    "benchmarks.bench_split",
+    "benchmarks.bench_silence",
+    "benchmarks.bench_ads",
+    "benchmarks.bench_library",
+    "benchmarks.bench_wav_write",
+    "benchmarks.bench_journal",
+    "benchmarks.bench_segment_store",
+    "benchmarks.bench_encode",
+    "benchmarks.bench_native_encode",
+    "benchmarks.bench_batch",
+    "benchmarks.bench_fanout",
+    "benchmarks.bench_tagging",
+    "benchmarks.bench_loudness",
+    "benchmarks.bench_cover_cache",
+    "benchmarks.bench_http",
+    "benchmarks.bench_controller",
+    "benchmarks.bench_polling",
+    "benchmarks.bench_metrics",
+    "benchmarks.bench_startup",
+    "benchmarks.bench_device_cache",
+    "benchmarks.bench_reconfigure",
+    "benchmarks.bench_daemon",
+    "benchmarks.bench_sessions",
+]
+
+
+def _git_revision():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Spufify benchmarks and emit JSON results.")
+    parser.add_argument('--only', help="Comma-separated benchmark names (e.g. capture,encode)")
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    parser.add_argument('--quick', action='store_true', help="Shorter runs (less stable numbers)")
+    parser.add_argument('--verbose', action='store_true', help="Show Spufify log output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='[%(asctime)s] [%(name)s] %(levelname)s: %(message)s',
+        datefmt='%H:%M:%S',
+        stream=sys.stderr
+    )
+
+    selected = set(args.only.split(',')) if args.only else None
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'quick': args.quick,
+        },
+        'results': {},
+    }
+
+    for module_name in BENCHMARKS:
+        module = importlib.import_module(module_name)
+        if selected and module.NAME not in selected:
+            continue
+        print(f"Running {module.NAME}...", file=sys.stderr)
+        start = time.perf_counter()
+        try:
+            result = module.run(quick=args.quick)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Benchmark {module.NAME} failed: {e}", exc_info=True)
+            result = {'error': str(e)}
+        result['wall_time_s'] = time.perf_counter() - start
+        report['results'][module.NAME] = result
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,45 @@
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
 import time
 import os
 import logging
 from spufify.config import Config
+from spufify.utils.http import get_http_client
+from spufify.utils.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
+
+class RateLimitError(Exception):
+    """Spotify answered 429. `retry_after` is the server's Retry-After in seconds, if it sent one."""
+    def __init__(self, retry_after=None):
+        super().__init__(f"Rate limited by Spotify (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
 class SpotifyClient:
-    def __init__(self, auto_authenticate=False):
+    def __init__(self, auto_authenticate=False, cache_path=None):
         # We need a scope that allows reading playback state
         self.scope = "user-read-playback-state user-read-currently-playing"
         self.retry_count = 0
         self.max_retries = 3
         self.sp = None
         self.auth_manager = None
+        metrics = get_metrics()
+        self._latency = metrics.histogram('spufify_spotify_request_seconds', "Spotify playback-state request time")
+        self._requests = metrics.counter('spufify_spotify_requests_total', "Spotify playback-state requests")
+        self._errors = {
+            kind: metrics.counter('spufify_spotify_errors_total', "Failed Spotify requests by kind", labels={'kind': kind})
+            for kind in ('rate_limited', 'api', 'unexpected')
+        }
         
         # Initialize Spotipy
         # Note: In a real app we might need to handle the browser auth flow gracefully.
         # For now, we assume standard flow with a redirect URI (e.g., http://localhost:8888/callback)
         try:
-            cache_handler = spotipy.CacheFileHandler(cache_path=os.path.join(Config.OUTPUT_DIR, '.spotify_token_cache'))
+            import spotipy  # Heavy (pulls in its cache backends); loaded when the client is built, not on import
+            from spotipy.oauth2 import SpotifyOAuth
+            # One token cache per account (cache_path); the default is the single-account one
+            self.cache_path = cache_path or os.path.join(Config.OUTPUT_DIR, '.spotify_token_cache')
+            cache_handler = spotipy.CacheFileHandler(cache_path=self.cache_path)
             
             self.auth_manager = SpotifyOAuth(
                 client_id=Config.SPOTIPY_CLIENT_ID,
@@ -28,14 +47,16 @@ class SpotifyClient:
                 redirect_uri=Config.SPOTIPY_REDIRECT_URI,
                 scope=self.scope,
                 cache_handler=cache_handler,
-                open_browser=auto_authenticate # Only open browser if explicitly requested
+                open_browser=auto_authenticate, # Only open browser if explicitly requested
+                requests_session=get_http_client().session,
+                requests_timeout=Config.HTTP_TIMEOUT_SEC
             )
             
             # Only initialize Spotify client if we have valid credentials
             if Config.SPOTIPY_CLIENT_ID and Config.SPOTIPY_CLIENT_SECRET:
                 # Check if we have a valid cached token or if auto_authenticate is True
                 if auto_authenticate or self.is_authenticated():
-                    self.sp = spotipy.Spotify(auth_manager=self.auth_manager)
+                    self.sp = self._build_spotify()
                     logger.info("Spotify client initialized successfully.")
                 else:
                     logger.warning("Spotify client initialized but not authenticated. Please authenticate via Settings.")
@@ -45,6 +66,19 @@ class SpotifyClient:
             logger.error(f"Failed to initialize Spotify client: {e}")
             # Don't raise - allow app to start without Spotify
     
+    def _build_spotify(self):
+        # Shared keep-alive session; its adapter already retries connection errors and 5xx
+        import spotipy
+        return spotipy.Spotify(
+            auth_manager=self.auth_manager,
+            requests_session=get_http_client().session,
+            requests_timeout=Config.HTTP_TIMEOUT_SEC
+        )
+
+    def get_stats(self):
+        """Request counts, connection reuse and latency histogram of the shared HTTP pool."""
+        return get_http_client().stats()
+    
     def is_authenticated(self):
         """Check if we have a valid cached token"""
         try:
@@ -67,7 +101,7 @@ class SpotifyClient:
             token_info = self.auth_manager.get_access_token(as_dict=False)
             
             if token_info:
-                self.sp = spotipy.Spotify(auth_manager=self.auth_manager)
+                self.sp = self._build_spotify()
                 logger.info("Spotify authentication successful!")
                 return True
             else:
@@ -87,18 +121,33 @@ class SpotifyClient:
             logger.error(f"Error getting auth URL: {e}")
             return None
 
+    @staticmethod
+    def _retry_after(error):
+        try:
+            return float((error.headers or {}).get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
     def get_current_track(self):
         """
         Fetches current playback info.
         Returns a dict with relevant metadata or None if nothing playing.
+        Raises RateLimitError on 429.
         """
         if not self.sp:
             logger.warning("Spotify client not initialized. Please authenticate via Settings.")
             return None
+        import spotipy  # Already loaded by __init__ (self.sp exists)
             
         for attempt in range(self.max_retries):
             try:
-                current = self.sp.current_playback()
+                # progress_ms refers to (roughly) the moment of the request; the recorder back-dates splits from it
+                fetched_at = time.monotonic()
+                self._requests.inc()
+                try:
+                    current = self.sp.current_playback()
+                finally:
+                    self._latency.observe(time.monotonic() - fetched_at)
                 
                 # Reset retry counter on success
                 self.retry_count = 0
@@ -137,9 +186,14 @@ class SpotifyClient:
                     'cover_url': cover_url,
                     'duration_ms': duration_ms,
                     'progress_ms': progress_ms,
-                    'track_id': track_id
+                    'track_id': track_id,
+                    'fetched_at': fetched_at
                 }
             except spotipy.exceptions.SpotifyException as e:
+                self._errors['rate_limited' if e.http_status == 429 else 'api'].inc()
+                if e.http_status == 429:
+                    # Retrying here would only dig deeper; let the caller back off
+                    raise RateLimitError(self._retry_after(e))
                 logger.warning(f"Spotify API error (attempt {attempt + 1}/{self.max_retries}): {e}")
                 if attempt < self.max_retries - 1:
                     time.sleep(1 * (attempt + 1))  # Exponential backoff
@@ -147,5 +201,6 @@ class SpotifyClient:
                     logger.error(f"Failed to fetch Spotify data after {self.max_retries} attempts")
                     return None
             except Exception as e:
+                self._errors['unexpected'].inc()
                 logger.error(f"Unexpected error fetching Spotify data: {e}", exc_info=True)
                 return None
@@ -0,0 +1,430 @@
+"""
+Spufify batch tool: re-encode or re-tag an existing library without re-recording.
+
+Usage:
+    python -m spufify.batch --format mp3                  # FLAC/WAV in OUTPUT_DIR -> OUTPUT_DIR/mp3
+    python -m spufify.batch --format flac --dest D:\\Music  # into another folder
+    python -m spufify.batch --retag                       # re-apply tags and covers in place
+    python -m spufify.batch --format mp3 --dry-run        # list what would run
+
+Runs are incremental: a state file next to the outputs remembers each source's
+size, mtime and hash and the encode settings, and up-to-date files are skipped.
+Sources that share a name (song.wav, song.flac) get "song (wav).mp3" and
+"song (flac).mp3".
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import concurrent.futures
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soundfile as sf
+from spufify.config import Config
+from spufify.core.encode_pool import default_worker_count
+from spufify.core.encoding import (
+    SUPPORTED_FORMATS, NATIVE_FORMATS, output_extension, ffmpeg_output_args, output_bit_depth,
+    use_native_encoder, transcode_native, transcode_fanout
+)
+from spufify.core.loudness import LoudnessAnalyzer
+
+logger = logging.getLogger("spufify.batch")
+
+STATE_FILE = ".batch_state.json"
+
+# Settings a worker process needs to encode and tag the way the parent would
+_WORKER_SETTINGS = (
+    'OUTPUT_DIR', 'COVER_CACHE_DIR', 'COVER_CACHE_MAX_MB', 'NATIVE_ENCODE', 'OUTPUT_BIT_DEPTH', 'DITHER',
+    'ENCODE_LOW_PRIORITY', 'REPLAYGAIN', 'REPLAYGAIN_REFERENCE_LUFS',
+    'HTTP_POOL_SIZE', 'HTTP_MAX_CONCURRENCY', 'HTTP_TIMEOUT_SEC', 'HTTP_RETRIES',
+)
+
+_processor = None  # Per worker process, for tagging
+
+
+def _init_worker(settings):
+    global _processor
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    from spufify.core.processor import Processor
+    from spufify.core.encode_pool import EncodePool
+    logging.getLogger("spufify.core.encode_pool").setLevel(logging.WARNING)
+    _processor = Processor(pool=EncodePool(workers=1, max_queue=1, name="batch-tag"))
+
+
+def read_metadata(path):
+    """Title/artist/album and embedded cover of an audio file; falls back to the "Artist - Title" file name."""
+    import mutagen
+    stem = os.path.splitext(os.path.basename(path))[0]
+    artist, _, title = stem.partition(" - ")
+    metadata = {'title': title or stem, 'artist': artist if title else 'Unknown', 'album': ''}
+    try:
+        tags = mutagen.File(path, easy=True)
+        if tags is not None and tags.tags is not None:
+            for key in ('title', 'artist', 'album'):
+                if tags.get(key):
+                    metadata[key] = tags[key][0]
+        audio = mutagen.File(path)
+        if getattr(audio, 'pictures', None):
+            metadata['cover_data'] = audio.pictures[0].data
+        elif audio is not None and audio.tags is not None and hasattr(audio.tags, 'getall'):
+            covers = audio.tags.getall('APIC')
+            if covers:
+                metadata['cover_data'] = covers[0].data
+    except Exception as e:
+        logger.debug(f"Could not read tags of {path}: {e}")
+    return metadata
+
+
+def _sample_rate(path):
+    try:
+        return sf.info(path).samplerate
+    except Exception:
+        import mutagen
+        return mutagen.File(path).info.sample_rate
+
+
+def _duration(path):
+    try:
+        import mutagen
+        return mutagen.File(path).info.length
+    except Exception:
+        return 0.0
+
+
+def _loudness_analyzer(path, metadata):
+    """An analyzer for the encode's decode pass to feed; None if loudness is off, known or can't be decoded here."""
+    if not Config.REPLAYGAIN or metadata.get('loudness'):
+        return None
+    try:
+        info = sf.info(path)
+    except Exception:
+        return None  # ffmpeg decodes it (as _with_loudness could not either)
+    return LoudnessAnalyzer(info.samplerate, info.channels)
+
+
+def _transcode_job(job):
+    """Worker: encodes one file to the target format (via a temporary name) and tags it."""
+    started = time.perf_counter()
+    source, output, ext = job['source'], job['output'], job['ext']
+    result = {'source': source, 'output': output, 'bytes_in': os.path.getsize(source), 'seconds': 0.0}
+    partial = os.path.join(os.path.dirname(output), f".partial_{os.getpid()}_{os.path.basename(output)}")
+    try:
+        metadata = dict(read_metadata(source), **job.get('metadata', {}))
+        sample_rate = _sample_rate(source)
+        # Loudness is measured from the encode's own decode, not a second pass over the source
+        analyzer = _loudness_analyzer(source, metadata)
+        if use_native_encoder(ext) and os.path.splitext(source)[1].lstrip('.').lower() in NATIVE_FORMATS:
+            frames = transcode_native(
+                source, partial, ext, bit_depth=output_bit_depth(ext), dither=Config.DITHER, analyzer=analyzer
+            )
+            result['seconds'] = frames / sample_rate
+        else:
+            # Decoded here and piped to ffmpeg when loudness is measured; otherwise ffmpeg reads the file itself
+            transcode_fanout(source, [(ext, partial)], sample_rate, dither=Config.DITHER, analyzer=analyzer)
+            result['seconds'] = _duration(partial)
+        if analyzer is not None and analyzer.frames:
+            metadata = dict(metadata, loudness=analyzer.result(Config.REPLAYGAIN_REFERENCE_LUFS))
+        _processor._apply_tags(ext, partial, metadata)
+        os.replace(partial, output)
+    except Exception as e:
+        result['error'] = str(e)
+        if os.path.exists(partial):
+            os.remove(partial)
+    result['elapsed_s'] = time.perf_counter() - started
+    return result
+
+
+def _retag_job(job):
+    """Worker: re-applies tags and cover art to one file in place."""
+    started = time.perf_counter()
+    path = job['source']
+    result = {'source': path, 'output': path, 'bytes_in': os.path.getsize(path), 'seconds': 0.0}
+    try:
+        metadata = dict(read_metadata(path), **job.get('metadata', {}))
+        if metadata.get('cover_url'):
+            metadata.pop('cover_data', None)  # The library knows where the cover came from: fetch it again
+        metadata = _processor._with_loudness(metadata, path)
+        ext = os.path.splitext(path)[1].lstrip('.').lower()
+        _processor._apply_tags(ext, path, metadata)
+        result['seconds'] = _duration(path)
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed_s'] = time.perf_counter() - started
+    return result
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchState:
+    """
+    Incremental state: for every output, the source file it was made from (size,
+    mtime, hash) and the settings used. A JSON file, rewritten atomically.
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable batch state {path}: {e}")
+            self.entries = {}
+
+    def is_current(self, key, source, profile, output=None):
+        """True if `key` was made from this exact `source` with `profile` (and its output still exists)."""
+        entry = self.entries.get(key)
+        if not entry or entry.get('profile') != profile or (output and not os.path.exists(output)):
+            return False
+        stat = os.stat(source)
+        if entry['size'] != stat.st_size:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        # Touched but maybe not changed (copied, restored from backup): compare contents
+        if entry.get('sha1') and entry['sha1'] == file_hash(source):
+            entry['mtime_ns'] = stat.st_mtime_ns
+            return True
+        return False
+
+    def record(self, key, source, profile):
+        stat = os.stat(source)
+        self.entries[key] = {
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_hash(source), 'profile': profile
+        }
+
+    def save(self):
+        temp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp, self.path)
+        except OSError as e:
+            logger.error(f"Could not save batch state: {e}")
+
+
+def scan_library(directory, exclude_ext=None):
+    """Audio files directly in `directory` (not subfolders, temp files or in-flight captures)."""
+    files = []
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return files
+    for name in names:
+        path = os.path.join(directory, name)
+        ext = os.path.splitext(name)[1].lstrip('.').lower()
+        if name.startswith(('.', 'temp_')) or ext not in SUPPORTED_FORMATS or ext == exclude_ext:
+            continue
+        if os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def _library_metadata(directory):
+    """Album and cover URL for files the library index knows (keyed by absolute path)."""
+    if not Config.LIBRARY_INDEX:
+        return {}
+    from spufify.core.library import LibraryIndex
+    path = Config.LIBRARY_INDEX_PATH or os.path.join(directory, ".library_index.jsonl")
+    known = {}
+    for entry in LibraryIndex(path).entries():
+        fields = {key: entry[key] for key in ('album', 'cover_url') if entry.get(key)}
+        if fields:
+            known[os.path.abspath(entry['path'])] = fields
+    return known
+
+
+def _profile(ext):
+    """Settings an output depends on: changing any of them makes existing outputs stale."""
+    profile = {'format': ext, 'ffmpeg': ffmpeg_output_args(ext, 0)}
+    if use_native_encoder(ext):
+        profile.update(native=True, bit_depth=output_bit_depth(ext), dither=Config.DITHER)
+    return profile
+
+
+def _output_names(sources, ext):
+    """
+    Output file name per source: "<stem>.<ext>", or "<stem> (<source ext>).<ext>"
+    for sources that share a stem (song.wav and song.flac). Raises ValueError if
+    two outputs would still land on the same file.
+    """
+    stems = {}
+    for source in sources:
+        stem = os.path.splitext(os.path.basename(source))[0]
+        stems.setdefault(stem.lower(), []).append(source)  # Case-insensitive: one file on Windows and macOS
+    names = {}
+    for shared in stems.values():
+        for source in shared:
+            stem, source_ext = os.path.splitext(os.path.basename(source))
+            names[source] = f"{stem}.{ext}" if len(shared) == 1 else f"{stem} ({source_ext.lstrip('.')}).{ext}"
+    by_name = {}
+    for source, name in names.items():
+        by_name.setdefault(name.lower(), []).append(source)
+    clashes = [sorted(os.path.basename(source) for source in sources) for sources in by_name.values() if len(sources) > 1]
+    if clashes:
+        raise ValueError(f"Sources would overwrite each other's output: {clashes}")
+    return names
+
+
+def plan(source_dir, dest_dir, ext, retag=False, force=False):
+    """
+    Jobs to run and the number of files already up to date, plus the state to
+    record results in. Jobs and state are keyed by the source's path relative
+    to `source_dir` (extension included). Raises ValueError if two sources
+    would write the same output.
+    """
+    state = BatchState(os.path.join(source_dir if retag else dest_dir, STATE_FILE))
+    known = _library_metadata(source_dir)
+    sources = scan_library(source_dir, exclude_ext=None if retag else ext)
+    names = {} if retag else _output_names(sources, ext)
+    jobs, skipped = [], 0
+    for source in sources:
+        metadata = known.get(os.path.abspath(source), {})
+        key = os.path.relpath(source, source_dir)
+        if retag:
+            output, profile = source, {'retag': True, 'cover_url': metadata.get('cover_url')}
+        else:
+            output, profile = os.path.join(dest_dir, names[source]), _profile(ext)
+            legacy = names[source]  # State files from before were keyed by output name
+            if key not in state.entries and legacy in state.entries:
+                state.entries[key] = state.entries.pop(legacy)
+        if not force and state.is_current(key, source, profile, output):
+            skipped += 1
+            continue
+        jobs.append({'key': key, 'source': source, 'output': output, 'ext': ext, 'profile': profile, 'metadata': metadata})
+    return jobs, skipped, state
+
+
+def run_batch(source_dir=None, dest_dir=None, fmt=None, retag=False, workers=None, force=False, progress=None):
+    """
+    Transcodes (or re-tags) every file in `source_dir` across a process pool.
+    Returns a summary dict: jobs done/skipped/failed, audio seconds, wall time and throughput.
+    Raises ValueError (before anything runs) if two sources would write the same output.
+    """
+    source_dir = source_dir or Config.OUTPUT_DIR
+    ext = output_extension(fmt)
+    dest_dir = dest_dir or os.path.join(source_dir, ext)
+    started = time.perf_counter()
+    jobs, skipped, state = plan(source_dir, dest_dir, ext, retag=retag, force=force)
+    summary = {'jobs': len(jobs), 'done': 0, 'skipped': skipped, 'failed': 0, 'audio_sec': 0.0, 'bytes_in': 0, 'errors': []}
+    if jobs and not retag:
+        os.makedirs(dest_dir, exist_ok=True)
+    workers = max(1, min(workers or default_worker_count(), len(jobs) or 1))
+    logger.info(f"{len(jobs)} file(s) to {'re-tag' if retag else 'encode to ' + ext.upper()}, {skipped} up to date, {workers} worker(s)")
+
+    if jobs:
+        settings = {name: getattr(Config, name) for name in _WORKER_SETTINGS}
+        task = _retag_job if retag else _transcode_job
+        by_source = {job['source']: job for job in jobs}
+        last_save = time.monotonic()
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(settings,)) as pool:
+            futures = [pool.submit(task, job) for job in jobs]
+            try:
+                for finished, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    result = future.result()
+                    job = by_source[result['source']]
+                    if result.get('error'):
+                        summary['failed'] += 1
+                        summary['errors'].append({'source': result['source'], 'error': result['error']})
+                        logger.error(f"[{finished}/{len(jobs)}] {os.path.basename(result['source'])}: {result['error']}")
+                    else:
+                        summary['done'] += 1
+                        summary['audio_sec'] += result['seconds']
+                        summary['bytes_in'] += result['bytes_in']
+                        state.record(job['key'], job['source'], job['profile'])
+                        speed = result['seconds'] / result['elapsed_s'] if result['elapsed_s'] else 0.0
+                        logger.info(f"[{finished}/{len(jobs)}] {os.path.basename(result['output'])} ({speed:.0f}x realtime)")
+                    if progress:
+                        progress(finished, len(jobs), result)
+                    if time.monotonic() - last_save > 10:
+                        state.save()  # An interrupted run keeps what it finished
+                        last_save = time.monotonic()
+            except KeyboardInterrupt:
+                logger.warning("Interrupted, keeping finished files")
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                state.save()
+    else:
+        state.save()
+
+    wall = time.perf_counter() - started
+    summary.update(
+        wall_s=wall,
+        workers=workers,
+        files_per_min=summary['done'] / wall * 60 if wall else 0.0,
+        realtime_factor=summary['audio_sec'] / wall if wall else 0.0,
+        mb_per_sec=summary['bytes_in'] / 1e6 / wall if wall else 0.0,
+    )
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-encode or re-tag an existing Spufify library.")
+    parser.add_argument("--format", help=f"Target format ({', '.join(SUPPORTED_FORMATS)}); default: OUTPUT_FORMAT")
+    parser.add_argument("--source", help="Library folder to scan (default: the configured output folder)")
+    parser.add_argument("--dest", help="Where encoded files go (default: <source>/<format>)")
+    parser.add_argument("--retag", action="store_true", help="Re-apply tags and covers in place instead of encoding")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores but one)")
+    parser.add_argument("--force", action="store_true", help="Redo files that are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="List the jobs without running them")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(levelname)s: %(message)s',
+        datefmt='%H:%M:%S'
+    )
+    Config.load_settings()
+    source_dir = args.source or Config.OUTPUT_DIR
+    ext = output_extension(args.format)
+    if not args.retag and ext == 'mp3' and not shutil.which('ffmpeg'):
+        logger.error("MP3 encoding needs FFmpeg in PATH.")
+        return 1
+
+    if args.dry_run:
+        try:
+            jobs, skipped, _ = plan(source_dir, args.dest or os.path.join(source_dir, ext), ext, args.retag, args.force)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+        for job in jobs:
+            print(f"{job['source']} -> {job['output']}")
+        print(f"{len(jobs)} to run, {skipped} up to date")
+        return 0
+
+    try:
+        summary = run_batch(source_dir, args.dest, ext, retag=args.retag, workers=args.workers, force=args.force)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    print(
+        f"Done: {summary['done']} processed, {summary['skipped']} up to date, {summary['failed']} failed "
+        f"in {summary['wall_s']:.1f} s ({summary['workers']} worker(s))"
+    )
+    if summary['done']:
+        print(
+            f"Throughput: {summary['files_per_min']:.1f} files/min, {summary['realtime_factor']:.0f}x realtime, "
+            f"{summary['mb_per_sec']:.1f} MB/s read"
+        )
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,20 +15,105 @@ class Config:
     # Using 44100Hz causes resampling artifacts or robotic sound on loopback.
     SAMPLE_RATE = 48000  # Changed to 48000 to match Windows WASAPI native rate
     CHANNELS = 2
-    BLOCK_SIZE = 1  # Small block for low latency (larger values cause distortion)
+    # Frames per capture read. With ADAPTIVE_BLOCK_SIZE this is only the starting point:
+    # the recorder grows it on discontinuities/CPU pressure and shrinks it back when stable.
+    BLOCK_SIZE = 1024
+    ADAPTIVE_BLOCK_SIZE = True
+    BLOCK_SIZE_MIN = 128
+    BLOCK_SIZE_MAX = 16384
+    BLOCK_TARGET_LATENCY_MS = 20  # Block size the tuner settles back to when capture is stable
+    RING_BUFFER_SECONDS = 20  # Preallocated capture buffer between capture and writer threads
+    
+    # Track splitting: the writer trails capture so late-detected track changes can be cut retroactively
+    SPLIT_LOOKBACK_SEC = 6.0
+    SPLIT_REFINE = True  # Refine the progress_ms estimate against silence/onsets in the audio
+    SPLIT_SEARCH_MS = 500  # +/- window searched around the estimated boundary
     
     # Output Format (mp3, flac, wav)
     OUTPUT_FORMAT = "flac"
+    # Extra formats saved alongside it from the same capture (e.g. ["mp3"]), each into OUTPUT_DIR/<format>
+    OUTPUT_PROFILES = []
+    
+    # Encoding: 0 workers = all cores but one (one is left for capture)
+    ENCODE_WORKERS = 0
+    ENCODE_QUEUE_SIZE = 16  # Waiting encodes before recovery/batch submits block (the recorder never waits)
+    ENCODE_LOW_PRIORITY = True  # Run ffmpeg below normal OS priority
+    # Pipe audio into ffmpeg while the track plays instead of writing a float WAV first
+    # (falls back to the WAV path if ffmpeg can't be started)
+    STREAMING_ENCODE = False
+    # Write FLAC/WAV in-process with libsndfile instead of spawning ffmpeg (MP3 always uses ffmpeg)
+    NATIVE_ENCODE = True
+    OUTPUT_BIT_DEPTH = None  # 16 or 24 for FLAC/WAV; None = format default (FLAC 24, WAV 16)
+    DITHER = True  # TPDF dither when converting the float capture to integer samples
+    # ReplayGain 2.0 tags (EBU R128 loudness measured while the track is captured)
+    REPLAYGAIN = True
+    REPLAYGAIN_REFERENCE_LUFS = -18.0
     
     # Paths
     OUTPUT_DIR = os.path.join(os.path.expanduser("~"), "Music", "Spufify")
+    COVER_CACHE_DIR = None  # None = OUTPUT_DIR/.cover_cache
+    
+    # Crash journal: in-flight captures and encode jobs survive a crash and resume on the next start
+    CRASH_JOURNAL = True
+    JOURNAL_DIR = None  # None = OUTPUT_DIR/.journal
+    JOURNAL_SYNC_SEC = 1.0  # Capture files are made valid on disk (header patched + fsync) this often
+    JOURNAL_MAX_ATTEMPTS = 3  # A job failing this many times is dropped
+    MMAP_CAPTURE = True  # Captures are written through a memory map (no write() per block)
+    MMAP_SEGMENT_SEC = 60  # Capture files are preallocated in segments of this length
+    COVER_CACHE_MAX_MB = 100
+    
+    # Library index: tracks already recorded (keyed by Spotify track_id) are not recorded again
+    LIBRARY_INDEX = True
+    LIBRARY_SKIP_KNOWN = True  # Skip songs whose stored take is as good as a new one would be
+    LIBRARY_INDEX_PATH = None  # None = OUTPUT_DIR/.library_index.jsonl
+    LIBRARY_COMPLETE_RATIO = 0.95  # A take covering this much of the track's duration counts as complete
+    LIBRARY_MATCH_SIMILARITY = 0.75  # Fingerprint agreement below this means a take is different audio
+    
+    # Outbound HTTP (Spotify API + cover art share one keep-alive pool)
+    HTTP_POOL_SIZE = 8
+    HTTP_MAX_CONCURRENCY = 4
+    HTTP_TIMEOUT_SEC = 10
+    HTTP_RETRIES = 3
+    
+    # Spotify polling: slow while idle/paused, tight just before the predicted end of a track
+    ADAPTIVE_POLLING = True
+    POLL_INTERVAL_SEC = 1.0  # Fixed interval when adaptive polling is off (and during ads)
+    POLL_IDLE_SEC = 5.0
+    POLL_PLAYING_MAX_SEC = 5.0  # Longest gap between polls mid-track (bounds how late a skip is noticed)
+    POLL_BOUNDARY_SEC = 0.25
+    POLL_BOUNDARY_WINDOW_SEC = 2.0  # Start polling tightly this long before the predicted track end
+    POLL_MAX_BACKOFF_SEC = 60.0  # Cap for exponential backoff after 429s
+    
+    # Metrics: Prometheus text on http://127.0.0.1:<port>/metrics (None = off) and a periodic JSON dump (0 = off)
+    METRICS_PORT = None
+    METRICS_DUMP_SEC = 0
+    METRICS_DUMP_PATH = None  # None = OUTPUT_DIR/.metrics.json
+    
+    # Headless daemon (python -m spufify.daemon): control API on http://127.0.0.1:<port> (0 = any free port)
+    CONTROL_PORT = 8766
+    # Several accounts/devices in one daemon: [{"name", "device_id", "samplerate", "token_cache"}, ...]
+    # (empty = one session using AUDIO_DEVICE_ID and the usual token cache)
+    SESSIONS = []
+    
+    # Startup: show the window first and bring up audio/Spotify behind it (False = everything before the window)
+    FAST_START = True
     
     # Logic
     SILENCE_THRESHOLD_DB = -50
-    MIN_SILENCE_DURATION_SEC = 2.0
+    MIN_SILENCE_DURATION_SEC = 2.0  # Longer silences inside a track are cut down to this (writer idles)
+    TRIM_SILENCE = True  # Drop leading/trailing silence of each track and cap long gaps
+    
+    # Local ad detection: flag ad starts from the audio, Spotify confirms
+    LOCAL_AD_DETECTION = True
+    AD_LOUDNESS_JUMP_DB = 6.0  # Level rise over the preceding music that makes a transition suspicious
+    AD_CONFIRM_TIMEOUT_SEC = 3.0  # Writer waits this long at a suspected ad start for Spotify to answer
+    AD_BACKDATE_SEC = 3.0  # An ad Spotify reports is cut back to a transition this recent
     
     # Audio Device ID (full string name from soundcard)
     AUDIO_DEVICE_ID = None 
+    # Rates each device accepts are remembered so engine starts skip the probe (cleared when devices change)
+    DEVICE_CACHE = True
+    DEVICE_CACHE_PATH = None  # None = OUTPUT_DIR/.device_cache.json
 
     @classmethod
     def load_settings(cls):
@@ -45,10 +130,27 @@ class Config:
                 cls.SAMPLE_RATE = data.get("SAMPLE_RATE", cls.SAMPLE_RATE)
                 cls.CHANNELS = data.get("CHANNELS", cls.CHANNELS)
                 cls.BLOCK_SIZE = data.get("BLOCK_SIZE", cls.BLOCK_SIZE)
+                cls.ADAPTIVE_BLOCK_SIZE = data.get("ADAPTIVE_BLOCK_SIZE", cls.ADAPTIVE_BLOCK_SIZE)
                 cls.OUTPUT_FORMAT = data.get("OUTPUT_FORMAT", cls.OUTPUT_FORMAT)
+                cls.OUTPUT_PROFILES = data.get("OUTPUT_PROFILES", cls.OUTPUT_PROFILES)
+                cls.ENCODE_WORKERS = data.get("ENCODE_WORKERS", cls.ENCODE_WORKERS)
+                cls.STREAMING_ENCODE = data.get("STREAMING_ENCODE", cls.STREAMING_ENCODE)
+                cls.NATIVE_ENCODE = data.get("NATIVE_ENCODE", cls.NATIVE_ENCODE)
+                cls.OUTPUT_BIT_DEPTH = data.get("OUTPUT_BIT_DEPTH", cls.OUTPUT_BIT_DEPTH)
+                cls.DITHER = data.get("DITHER", cls.DITHER)
+                cls.REPLAYGAIN = data.get("REPLAYGAIN", cls.REPLAYGAIN)
+                cls.ADAPTIVE_POLLING = data.get("ADAPTIVE_POLLING", cls.ADAPTIVE_POLLING)
+                cls.METRICS_PORT = data.get("METRICS_PORT", cls.METRICS_PORT)
+                cls.METRICS_DUMP_SEC = data.get("METRICS_DUMP_SEC", cls.METRICS_DUMP_SEC)
+                cls.CONTROL_PORT = data.get("CONTROL_PORT", cls.CONTROL_PORT)
+                cls.SESSIONS = data.get("SESSIONS", cls.SESSIONS)
+                cls.FAST_START = data.get("FAST_START", cls.FAST_START)
                 cls.OUTPUT_DIR = data.get("OUTPUT_DIR", cls.OUTPUT_DIR)
                 cls.SILENCE_THRESHOLD_DB = data.get("SILENCE_THRESHOLD_DB", cls.SILENCE_THRESHOLD_DB)
                 cls.MIN_SILENCE_DURATION_SEC = data.get("MIN_SILENCE_DURATION_SEC", cls.MIN_SILENCE_DURATION_SEC)
+                cls.TRIM_SILENCE = data.get("TRIM_SILENCE", cls.TRIM_SILENCE)
+                cls.LOCAL_AD_DETECTION = data.get("LOCAL_AD_DETECTION", cls.LOCAL_AD_DETECTION)
+                cls.LIBRARY_SKIP_KNOWN = data.get("LIBRARY_SKIP_KNOWN", cls.LIBRARY_SKIP_KNOWN)
                 cls.AUDIO_DEVICE_ID = data.get("AUDIO_DEVICE_ID", cls.AUDIO_DEVICE_ID)
                 
                 # Ensure directories if output dir changed
@@ -65,10 +167,27 @@ class Config:
                 "SAMPLE_RATE": cls.SAMPLE_RATE,
                 "CHANNELS": cls.CHANNELS,
                 "BLOCK_SIZE": cls.BLOCK_SIZE,
+                "ADAPTIVE_BLOCK_SIZE": cls.ADAPTIVE_BLOCK_SIZE,
                 "OUTPUT_FORMAT": cls.OUTPUT_FORMAT,
+                "OUTPUT_PROFILES": cls.OUTPUT_PROFILES,
+                "ENCODE_WORKERS": cls.ENCODE_WORKERS,
+                "STREAMING_ENCODE": cls.STREAMING_ENCODE,
+                "NATIVE_ENCODE": cls.NATIVE_ENCODE,
+                "OUTPUT_BIT_DEPTH": cls.OUTPUT_BIT_DEPTH,
+                "DITHER": cls.DITHER,
+                "REPLAYGAIN": cls.REPLAYGAIN,
+                "ADAPTIVE_POLLING": cls.ADAPTIVE_POLLING,
+                "METRICS_PORT": cls.METRICS_PORT,
+                "METRICS_DUMP_SEC": cls.METRICS_DUMP_SEC,
+                "CONTROL_PORT": cls.CONTROL_PORT,
+                "SESSIONS": cls.SESSIONS,
+                "FAST_START": cls.FAST_START,
                 "OUTPUT_DIR": cls.OUTPUT_DIR,
                 "SILENCE_THRESHOLD_DB": cls.SILENCE_THRESHOLD_DB,
                 "MIN_SILENCE_DURATION_SEC": cls.MIN_SILENCE_DURATION_SEC,
+                "TRIM_SILENCE": cls.TRIM_SILENCE,
+                "LOCAL_AD_DETECTION": cls.LOCAL_AD_DETECTION,
+                "LIBRARY_SKIP_KNOWN": cls.LIBRARY_SKIP_KNOWN,
                 "AUDIO_DEVICE_ID": cls.AUDIO_DEVICE_ID
             }
             with open(settings_path, 'w') as f:
@@ -81,6 +200,3 @@ class Config:
     def ensure_directories():
         if not os.path.exists(Config.OUTPUT_DIR):
             os.makedirs(Config.OUTPUT_DIR)
-
-# Load settings on module import (after definition)
-Config.load_settings()
@@ -0,0 +1,254 @@
+import math
+import logging
+from collections import deque
+import numpy as np
+from spufify.core.silence import window_levels, silent_windows
+
+logger = logging.getLogger(__name__)
+
+# 17 log-spaced bands give 16 fingerprint bits per hop (Haitsma/Kalker-style energy differences)
+BANDS = 17
+BAND_LOW_HZ = 300.0
+BAND_HIGH_HZ = 5000.0
+
+
+class AdDetector:
+    """
+    Flags likely ad/segment transitions in captured audio, without waiting for Spotify.
+
+    Runs incrementally on the newest captured audio in hops of `hop_ms`. A candidate
+    transition is the end of a silence gap or a sharp level onset. A candidate becomes
+    a suspicion when the next second is markedly louder than the music before it
+    (ads are mastered hot), or when its first seconds match the spectral fingerprint
+    of an ad seen before (learn() is called once Spotify confirms one).
+    """
+    # Hop-to-hop level rise treated as a transition even without a gap
+    ONSET_DB = 12.0
+    # Seconds of music before / audio after a candidate compared for the loudness jump
+    BEFORE_SEC = 3.0
+    AFTER_SEC = 1.0
+    # Fingerprints are compared at offsets up to this many hops either way
+    MAX_SHIFT_HOPS = 2
+
+    def __init__(self, samplerate, silence_db=-50.0, loudness_jump_db=6.0, hop_ms=50, min_gap_ms=100,
+                 fingerprint_sec=1.5, match_ber=0.25, max_known=50, history_sec=20.0):
+        self.silence_db = silence_db
+        self.loudness_jump_db = loudness_jump_db
+        self.match_ber = match_ber
+        self.max_known = max_known
+        self.hop_ms = hop_ms
+        self.min_gap_hops = max(1, math.ceil(min_gap_ms / hop_ms))
+        self.before_hops = int(self.BEFORE_SEC * 1000 / hop_ms)
+        self.after_hops = int(self.AFTER_SEC * 1000 / hop_ms)
+        self.fp_hops = int(fingerprint_sec * 1000 / hop_ms)
+        self.history_hops = int(history_sec * 1000 / hop_ms)
+
+        # Learned ads: band-energy bits per hop, so they stay valid across sample rates
+        self.known = np.empty((0, self.fp_hops, BANDS - 1), dtype=bool)
+        self._to_learn = deque()  # Filled by learn() on the controller thread, drained by _evaluate()
+
+        # Measurements
+        self.hops = 0
+        self.transitions = 0
+        self.suspicions = 0
+        self.fingerprint_matches = 0
+
+        self.set_samplerate(samplerate)
+
+    def set_samplerate(self, samplerate):
+        """
+        Re-rates the analysis (hop, FFT bands) and starts it over; learned ads and
+        counters are kept. Also called at the same rate when capture restarts.
+        """
+        self.samplerate = int(samplerate)
+        self.hop = max(1, self.samplerate * self.hop_ms // 1000)
+
+        # Spectral bands as contiguous FFT bin ranges
+        self.fft_size = 1 << (self.hop - 1).bit_length()
+        freqs = np.fft.rfftfreq(self.fft_size, 1.0 / self.samplerate)
+        edges = np.geomspace(BAND_LOW_HZ, min(BAND_HIGH_HZ, self.samplerate * 0.45), BANDS + 1)
+        self._band_starts = np.searchsorted(freqs, edges)
+        self._window = np.hanning(self.hop).astype(np.float32)
+
+        # Incremental state (positions are ring frames, which restart with capture)
+        self._carry = None
+        self._next_pos = None
+        self._prev_diff = None
+        self._silent_run = 0
+        self._last_level = None
+        self._last_candidate = None
+        self._positions = np.empty(0, dtype=np.int64)
+        self._energy = np.empty(0, dtype=np.float64)
+        self._silent = np.empty(0, dtype=bool)
+        self._bits = np.empty((0, BANDS - 1), dtype=bool)
+        self._pending = []  # Candidates awaiting enough audio: [position, jump_checked, fingerprint_checked, flagged]
+        self._to_learn.clear()
+        self.candidates = deque(maxlen=20)
+
+    def process(self, audio, start_pos):
+        """
+        Feeds newly captured frames starting at absolute position `start_pos`.
+        Returns a list of (position, reason) suspicions, reason being 'loudness' or 'fingerprint'.
+        """
+        if self._next_pos is None or self._carry is None or start_pos != self._next_pos + len(self._carry):
+            # First call or a gap in the feed: start over from here
+            self._carry = audio[:0]
+            self._next_pos = start_pos
+            self._prev_diff = None
+            self._last_level = None
+        data = np.concatenate([self._carry, audio]) if len(self._carry) else audio
+        count = len(data) // self.hop
+        self._carry = data[count * self.hop:].copy()
+        if count == 0:
+            return []
+        frames = data[:count * self.hop]
+        positions = self._next_pos + np.arange(count, dtype=np.int64) * self.hop
+        self._next_pos += count * self.hop
+        self.hops += count
+
+        rms, peak = window_levels(frames, self.hop)
+        silent = silent_windows(rms, peak, self.silence_db)
+        energy = np.square(rms)
+        bits = self._fingerprint_bits(frames, count)
+
+        self._find_candidates(positions, energy, silent)
+        self._append_history(positions, energy, silent, bits)
+        return self._evaluate()
+
+    def _fingerprint_bits(self, frames, count):
+        mono = frames.reshape(count, self.hop, -1).mean(axis=2) * self._window
+        power = np.square(np.abs(np.fft.rfft(mono, n=self.fft_size, axis=1)))
+        lo, hi = self._band_starts[0], self._band_starts[-1]
+        bands = np.add.reduceat(power[:, lo:hi], self._band_starts[:-1] - lo, axis=1)
+        log_bands = np.log(bands + 1e-12)
+        diff = log_bands[:, :-1] - log_bands[:, 1:]
+        prev = np.vstack([diff[:1] if self._prev_diff is None else self._prev_diff[None], diff[:-1]])
+        self._prev_diff = diff[-1]
+        return (diff - prev) > 0
+
+    def _find_candidates(self, positions, energy, silent):
+        level_db = 10.0 * np.log10(np.maximum(energy, 1e-20))
+        first = level_db[0] if self._last_level is None else self._last_level
+        prev_level = np.concatenate([[first], level_db[:-1]])
+        self._last_level = level_db[-1]
+        for i in range(len(positions)):
+            if silent[i]:
+                self._silent_run += 1
+                continue
+            gap_end = self._silent_run >= self.min_gap_hops
+            onset = self._silent_run == 0 and level_db[i] - prev_level[i] >= self.ONSET_DB
+            self._silent_run = 0
+            if not (gap_end or onset):
+                continue
+            position = int(positions[i])
+            # One transition per second at most (multi-part gaps, stutters)
+            if self._last_candidate is not None and position - self._last_candidate < self.samplerate:
+                continue
+            self._last_candidate = position
+            self.transitions += 1
+            self.candidates.append(position)
+            self._pending.append([position, False, False, False])
+
+    def _append_history(self, positions, energy, silent, bits):
+        self._positions = np.concatenate([self._positions, positions])[-self.history_hops:]
+        self._energy = np.concatenate([self._energy, energy])[-self.history_hops:]
+        self._silent = np.concatenate([self._silent, silent])[-self.history_hops:]
+        self._bits = np.concatenate([self._bits, bits])[-self.history_hops:]
+
+    def _index(self, position):
+        if not len(self._positions) or position < self._positions[0]:
+            return None
+        return int(np.searchsorted(self._positions, position))
+
+    def _evaluate(self):
+        flagged = []
+        available = len(self._positions)
+        still_pending = []
+        for entry in self._pending:
+            position, jump_checked, fp_checked, was_flagged = entry
+            idx = self._index(position)
+            if idx is None:
+                continue  # Fell out of the history
+            if not jump_checked and idx + self.after_hops <= available:
+                entry[1] = jump_checked = True
+                if self._loudness_jump(idx) >= self.loudness_jump_db and not was_flagged:
+                    entry[3] = was_flagged = True
+                    flagged.append((position, 'loudness'))
+            if not fp_checked and idx + self.fp_hops <= available:
+                entry[2] = fp_checked = True
+                if len(self.known) and self._matches(self._bits[idx:idx + self.fp_hops]):
+                    self.fingerprint_matches += 1
+                    if not was_flagged:
+                        entry[3] = was_flagged = True
+                        flagged.append((position, 'fingerprint'))
+            if not (jump_checked and fp_checked):
+                still_pending.append(entry)
+        self._pending = still_pending
+
+        # popleft/append only: a position learn() adds meanwhile is never overwritten
+        waiting = []
+        while self._to_learn:
+            position = self._to_learn.popleft()
+            idx = self._index(position)
+            if idx is None:
+                continue
+            if idx + self.fp_hops <= available:
+                self._remember(self._bits[idx:idx + self.fp_hops])
+            else:
+                waiting.append(position)
+        self._to_learn.extend(waiting)
+
+        self.suspicions += len(flagged)
+        return flagged
+
+    def _loudness_jump(self, idx):
+        """dB difference between the audio after a candidate and the music before it (silence excluded)."""
+        before = slice(max(0, idx - self.before_hops), idx)
+        after = slice(idx, idx + self.after_hops)
+        e_before = self._energy[before][~self._silent[before]]
+        e_after = self._energy[after][~self._silent[after]]
+        if not len(e_before) or not len(e_after):
+            return 0.0
+        return 10.0 * math.log10(max(e_after.mean(), 1e-20) / max(e_before.mean(), 1e-20))
+
+    def _bit_error_rate(self, fingerprint):
+        """Lowest bit error rate of `fingerprint` against each known ad, over small alignment shifts."""
+        best = np.ones(len(self.known))
+        hops = self.fp_hops
+        for shift in range(-self.MAX_SHIFT_HOPS, self.MAX_SHIFT_HOPS + 1):
+            a = slice(max(0, shift), hops + min(0, shift))
+            b = slice(max(0, -shift), hops - max(0, shift))
+            errors = np.mean(self.known[:, a] != fingerprint[None, b], axis=(1, 2))
+            best = np.minimum(best, errors)
+        return best
+
+    def _matches(self, fingerprint):
+        return bool(np.min(self._bit_error_rate(fingerprint)) < self.match_ber)
+
+    def _remember(self, fingerprint):
+        if len(self.known) and self._matches(fingerprint):
+            return  # Already known
+        self.known = np.concatenate([self.known, fingerprint[None]])[-self.max_known:]
+        logger.info(f"Learned ad fingerprint ({len(self.known)} known)")
+
+    def learn(self, position):
+        """
+        Stores the fingerprint of the ad starting at `position` (now or once enough
+        audio has arrived). Safe to call from another thread than process().
+        """
+        self._to_learn.append(int(position))
+
+    def latest_candidate(self, since_pos):
+        """Most recent transition at or after `since_pos`, or None."""
+        if self.candidates and self.candidates[-1] >= since_pos:
+            return self.candidates[-1]
+        return None
+
+    def stats(self):
+        return {
+            'hops': self.hops,
+            'transitions': self.transitions,
+            'suspicions': self.suspicions,
+            'fingerprint_matches': self.fingerprint_matches,
+            'known_ads': len(self.known),
+        }
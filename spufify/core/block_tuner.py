@@ -0,0 +1,109 @@
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class BlockSizeTuner:
+    """
+    Picks the capture read size (numframes) at runtime.
+
+    Grows the block when reads produce discontinuities or when the capture loop
+    spends too much of each block period outside of record(), and moves it back
+    towards the latency target after a stretch of clean reads.
+    """
+    # Loop overhead (time not spent waiting in record()) above this share of the block period grows the block
+    OVERHEAD_RATIO = 0.5
+    # Seconds of clean capture required before stepping back towards the target size
+    STABLE_SECONDS = 30.0
+
+    def __init__(self, samplerate, initial, minimum, maximum, target_latency_ms=20, adaptive=True, history_size=50):
+        self.samplerate = int(samplerate)
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.adaptive = adaptive
+        self.preferred = self._clamp(self._pow2(self.samplerate * target_latency_ms / 1000))
+        self.block_size = self._clamp(int(initial)) if adaptive else max(1, int(initial))
+        self.history = deque(maxlen=history_size)
+
+        # Measurements
+        self.reads = 0
+        self.discontinuities = 0
+        self.total_read_time = 0.0
+        self.max_read_time = 0.0
+        self._clean_frames = 0
+
+        self._record_change(self.block_size, "initial")
+
+    def _pow2(self, frames):
+        return 1 << max(0, int(round(frames)) - 1).bit_length()
+
+    def _clamp(self, frames):
+        return max(self.minimum, min(self.maximum, frames))
+
+    def _record_change(self, new_size, reason):
+        self.history.append({'time': time.time(), 'block_size': new_size, 'reason': reason})
+        if reason != "initial":
+            logger.info(f"Capture block size {self.block_size} -> {new_size} frames ({reason})")
+        self.block_size = new_size
+
+    def observe(self, frames, read_seconds, loop_seconds, discontinuity=False):
+        """
+        Feed one capture iteration.
+
+        Args:
+            frames: Frames returned by the read
+            read_seconds: Time spent inside the read call
+            loop_seconds: Total time of the loop iteration (read + handoff)
+            discontinuity: True if the backend reported a gap during this read
+        Returns:
+            The block size to use for the next read.
+        """
+        self.reads += 1
+        self.total_read_time += read_seconds
+        if read_seconds > self.max_read_time:
+            self.max_read_time = read_seconds
+        if discontinuity:
+            self.discontinuities += 1
+
+        if not self.adaptive or frames <= 0:
+            return self.block_size
+
+        period = frames / self.samplerate
+        overhead = loop_seconds - read_seconds
+
+        if discontinuity:
+            self._grow("discontinuity")
+        elif overhead > period * self.OVERHEAD_RATIO:
+            self._grow(f"overhead {overhead * 1000:.2f} ms per {period * 1000:.2f} ms block")
+        else:
+            self._clean_frames += frames
+            if self._clean_frames >= self.samplerate * self.STABLE_SECONDS and self.block_size != self.preferred:
+                # Settle back towards the latency target one step at a time
+                self._clean_frames = 0
+                if self.block_size > self.preferred:
+                    self._record_change(max(self.preferred, self.block_size // 2), "stable")
+                else:
+                    self._record_change(min(self.preferred, self.block_size * 2), "stable")
+        return self.block_size
+
+    def _grow(self, reason):
+        self._clean_frames = 0
+        new_size = self._clamp(self.block_size * 2)
+        if new_size != self.block_size:
+            self._record_change(new_size, reason)
+
+    def stats(self):
+        return {
+            'block_size': self.block_size,
+            'adaptive': self.adaptive,
+            'min_block_size': self.minimum,
+            'max_block_size': self.maximum,
+            'preferred_block_size': self.preferred,
+            'reads': self.reads,
+            'discontinuities': self.discontinuities,
+            'avg_read_ms': (self.total_read_time / self.reads * 1000) if self.reads else 0.0,
+            'max_read_ms': self.max_read_time * 1000,
+            'history': list(self.history),
+        }
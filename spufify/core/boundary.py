@@ -0,0 +1,74 @@
+import numpy as np
+from spufify.core.silence import window_levels, levels_db, silent_windows
+
+# Level rise (dB between consecutive analysis hops) that counts as the onset of a new track
+ONSET_RISE_DB = 6.0
+HOP_MS = 10
+# Shorter quiet stretches are dips inside the music, not gaps between tracks
+MIN_GAP_MS = 50
+
+
+def _nearest_zero_crossing(mono, index, radius):
+    lo = max(1, index - radius)
+    hi = min(len(mono), index + radius + 1)
+    if hi <= lo:
+        return index
+    signs = np.signbit(mono[lo - 1:hi])
+    crossings = np.flatnonzero(signs[1:] != signs[:-1]) + lo
+    if crossings.size == 0:
+        return index
+    return int(crossings[np.argmin(np.abs(crossings - index))])
+
+
+def find_cut(audio, estimate, samplerate, silence_db=-50.0, onset_db=ONSET_RISE_DB, hop_ms=HOP_MS,
+             min_gap_ms=MIN_GAP_MS):
+    """
+    Refines a track boundary inside `audio` (frames, channels) around frame `estimate`.
+
+    Picks, in order of preference: the end of the gap (silence of at least
+    `min_gap_ms`) closest to the estimate, i.e. the first sample of the new track;
+    any point inside a gap that runs past the window; the strongest level onset;
+    or the estimate itself (moved to the nearest zero crossing to avoid a click).
+    Returns a frame index into `audio`.
+    """
+    estimate = int(min(max(estimate, 0), len(audio)))
+    hop = max(1, samplerate * hop_ms // 1000)
+    if len(audio) < 2 * hop:
+        return estimate
+    mono = audio.mean(axis=1) if audio.ndim > 1 else audio
+    hops = len(audio) // hop
+    rms, peak = window_levels(audio[:hops * hop], hop)
+    est_hop = min(estimate // hop, hops - 1)
+
+    silent = silent_windows(rms, peak, silence_db).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], silent, [0])))
+    gap_starts = np.flatnonzero(edges == 1)
+    gap_ends = np.flatnonzero(edges == -1)
+    keep = (gap_ends - gap_starts) * hop_ms >= min_gap_ms
+    gap_starts, gap_ends = gap_starts[keep], gap_ends[keep]
+    if gap_starts.size:
+        closed = gap_ends < hops
+        if closed.any():
+            ends = gap_ends[closed]
+            end_hop = int(ends[np.argmin(np.abs(ends - est_hop))])
+            # Sample-accurate: first sample of the hop after the gap above the silence threshold
+            threshold = 10.0 ** (silence_db / 20.0)
+            chunk = np.abs(mono[end_hop * hop:(end_hop + 1) * hop])
+            loud = np.flatnonzero(chunk > threshold)
+            return end_hop * hop + (int(loud[0]) if loud.size else 0)
+        # Gap continues past the window: anywhere inside it is a clean cut
+        start_hop = int(gap_starts[-1])
+        if est_hop >= start_hop:
+            return estimate
+        return start_hop * hop + hop // 2
+
+    levels = levels_db(rms)
+    rises = np.diff(levels)
+    best = int(np.argmax(rises))
+    if rises[best] >= onset_db:
+        # Sample-accurate: first sample clearly above the peak of the hop before the rise
+        before = np.abs(mono[best * hop:(best + 1) * hop]).max()
+        region = np.abs(mono[best * hop:(best + 2) * hop])
+        loud = np.flatnonzero(region > before * 10.0 ** (onset_db / 20.0))
+        return best * hop + int(loud[0]) if loud.size else (best + 1) * hop
+    return _nearest_zero_crossing(mono, estimate, hop // 2)
@@ -1,8 +1,12 @@
 import time
 import threading
 import logging
-from spufify.api.spotify import SpotifyClient
+from spufify.api.spotify import SpotifyClient, RateLimitError
 from spufify.config import Config
+from spufify.core.poll_scheduler import PollScheduler
+from spufify.core.library import get_library_index, expected_take
+from spufify.utils.cover_cache import get_cover_cache
+from spufify.utils.metrics import get_metrics
 # from spufify.core.recorder import Recorder # formatting circular dependency, will handle with signals or injection
 
 logger = logging.getLogger(__name__)
@@ -13,29 +17,71 @@ class Controller:
     Manages the state of the application based on Spotify status.
     """
     
-    STATES = ["WAITING", "RECORDING", "PAUSED", "PROCESSING"]
+    STATES = ["WAITING", "RECORDING", "PAUSED", "SKIPPING", "PROCESSING"]
 
-    def __init__(self, recorder_ref=None, ui_callback_ref=None):
-        self.spotify_client = SpotifyClient(auto_authenticate=False)  # Don't auto-auth on startup
+    def __init__(self, recorder_ref=None, ui_callback_ref=None, spotify_client=None, clock=time.monotonic, library=None,
+                 wake=None, name=None):
+        # Don't auto-auth on startup; a ready-made client can be injected (benchmarks, headless runs)
+        self.spotify_client = spotify_client or SpotifyClient(auto_authenticate=False)
+        self.clock = clock
+        self.library = library  # None = the process-wide library index
         self.recorder = recorder_ref
         self.ui_callback = ui_callback_ref
+        self.name = name  # Session name (multi-session runs): labels its metrics
         
         self.state = "WAITING"
         self.current_track = None
+        self.last_track_info = None
         self.last_poll_time = 0
         self.running = False
         self.thread = None
         self.user_paused = False  # Manual override flag
+        # Cuts the current poll wait short (stop, manual resume). A SessionManager polling several
+        # controllers from one loop passes its own event and checks poll_requested to see whose turn it is.
+        self._wake = wake or threading.Event()
+        self.poll_requested = False
+        metrics = get_metrics()
+        labels = {'session': name} if name else None
+        self._tick_time = metrics.histogram(
+            'spufify_controller_tick_seconds', "Controller tick time (poll included)", labels=labels
+        )
+        self._tick_errors = metrics.counter(
+            'spufify_controller_tick_errors_total', "Controller ticks that raised", labels=labels
+        )
+        self._state_changes = metrics.counter(
+            'spufify_controller_state_changes_total', "Controller state changes", labels=labels
+        )
+
+        if self.recorder is not None:
+            # Audio that looks like an ad start gets checked with Spotify straight away
+            self.recorder.on_ad_suspected = self.poll_now
+
+        self.poll_scheduler = PollScheduler(
+            idle_interval=Config.POLL_IDLE_SEC,
+            playing_interval=Config.POLL_PLAYING_MAX_SEC,
+            boundary_interval=Config.POLL_BOUNDARY_SEC,
+            boundary_window=Config.POLL_BOUNDARY_WINDOW_SEC,
+            fixed_interval=Config.POLL_INTERVAL_SEC,
+            max_backoff=Config.POLL_MAX_BACKOFF_SEC,
+            adaptive=Config.ADAPTIVE_POLLING,
+            clock=clock
+        )
 
     def start(self):
+        if Config.LIBRARY_INDEX:
+            (self.library or get_library_index()).preload()
         self.running = True
         self.thread = threading.Thread(target=self._ev_loop, daemon=True)
         self.thread.start()
-        logger.info("Controller started, polling Spotify API every 1 second.")
+        if self.poll_scheduler.adaptive:
+            logger.info("Controller started, polling Spotify API adaptively.")
+        else:
+            logger.info(f"Controller started, polling Spotify API every {self.poll_scheduler.fixed_interval} seconds.")
 
     def stop(self):
         logger.info("Stopping controller...")
         self.running = False
+        self._wake.set()
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=2.0)
             if self.thread.is_alive():
@@ -52,27 +98,83 @@ class Controller:
         """User-initiated resume - re-enables auto-tracking"""
         self.user_paused = False
         logger.info("User manually resumed recording")
-        # Will auto-resume on next tick if track is playing
+        # Auto-resumes on the next tick if a track is playing; poll right away
+        self.poll_now()
 
     def _ev_loop(self):
         while self.running:
             self.tick()
-            time.sleep(1) # Poll interval
-            
+            deadline = self.clock() + self.next_poll_interval()
+            # Between polls the UI gets progress extrapolated locally, once a second
+            while self.running:
+                remaining = deadline - self.clock()
+                if remaining <= 0 or self._wake.wait(min(remaining, 1.0)):
+                    break
+                if remaining > 1.0:
+                    self._notify_ui(self.extrapolated_track())
+            self._wake.clear()
+
+    def poll_now(self):
+        """Cuts the current wait short (e.g. the recorder heard what sounds like an ad)."""
+        self.poll_requested = True
+        self._wake.set()
+
+    def next_poll_interval(self):
+        """Seconds until the next Spotify poll, from the playback state seen by the last one."""
+        return self.poll_scheduler.next_interval()
+
+    def get_stats(self):
+        return self.poll_scheduler.stats()
+
+    def extrapolated_track(self):
+        """The last polled track with progress_ms advanced to now (no API call)."""
+        track_info = self.last_track_info
+        if not track_info or not track_info.get('is_playing') or track_info.get('progress_ms') is None:
+            return track_info
+        track_info = dict(track_info)
+        elapsed_ms = int((self.clock() - self.last_poll_time) * 1000)
+        progress_ms = track_info['progress_ms'] + elapsed_ms
+        if track_info.get('duration_ms'):
+            progress_ms = min(progress_ms, track_info['duration_ms'])
+        track_info['progress_ms'] = progress_ms
+        return track_info
+
+    def _notify_ui(self, track_info):
+        if self.ui_callback:
+            status_pkg = {
+                'state': self.state,
+                'track': track_info
+            }
+            try:
+                self.ui_callback(status_pkg)
+            except Exception as e:
+                logger.error(f"Error in UI callback: {e}")
+
     def tick(self):
+        """One poll of Spotify and the state changes it leads to (timed for the metrics)."""
+        started = time.perf_counter()
+        self.poll_requested = False
         try:
-            track_info = self.spotify_client.get_current_track()
+            self._tick()
+        finally:
+            self._tick_time.observe(time.perf_counter() - started)
+
+    def _tick(self):
+        try:
+            polled_at = self.clock()
+            try:
+                track_info = self.spotify_client.get_current_track()
+            except RateLimitError as e:
+                self.poll_scheduler.on_rate_limited(e.retry_after)
+                return
+            self.last_track_info = track_info
+            self.last_poll_time = polled_at
+            self.poll_scheduler.observe(track_info, polled_at, user_paused=self.user_paused)
+            if self.recorder and self._explains_transition(track_info):
+                self.recorder.dismiss_ad_suspicion()
             
             # Send info to UI if callback exists
-            if self.ui_callback:
-                status_pkg = {
-                    'state': self.state,
-                    'track': track_info
-                }
-                try:
-                    self.ui_callback(status_pkg)
-                except Exception as e:
-                    logger.error(f"Error in UI callback: {e}")
+            self._notify_ui(track_info)
 
             if not track_info:
                 self._handle_no_music()
@@ -81,16 +183,48 @@ class Controller:
             if track_info['is_ad']:
                 self._handle_ad()
             elif not track_info['is_playing']:
-                self._handle_paused_playback()
+                self._handle_paused_playback(track_info)
             else:
                 self._handle_playing_track(track_info)
 
         except Exception as e:
+            self._tick_errors.inc()
+            self.poll_scheduler.on_error()
             logger.error(f"Controller tick error: {e}", exc_info=True)
 
+    def _explains_transition(self, track_info):
+        """
+        True if this poll rules out an ad at a transition the recorder heard: nothing
+        playing, or a different song. The same song still playing is inconclusive (the
+        API lags the audio), so the recorder keeps holding until its confirm timeout.
+        """
+        if not track_info:
+            return True
+        if track_info['is_ad']:
+            return False
+        if not track_info['is_playing']:
+            return True
+        return not self.current_track or track_info['track_id'] != self.current_track['track_id']
+
+    def _in_library(self, track_info):
+        """True if the library already has a take of this song as good as recording it now would give."""
+        if not (Config.LIBRARY_INDEX and Config.LIBRARY_SKIP_KNOWN) or not track_info.get('track_id'):
+            return False
+        sample_rate = getattr(self.recorder, 'actual_sample_rate', None) or Config.SAMPLE_RATE
+        try:
+            library = self.library or get_library_index()
+            known = library.has_take_as_good_as(track_info['track_id'], expected_take(track_info, sample_rate))
+        except Exception as e:
+            logger.error(f"Library lookup failed: {e}")
+            return False
+        if known:
+            logger.info(f"Already in library, not recording: {track_info['title']} - {track_info['artist']}")
+        return known
+
     def _set_state(self, new_state):
         if self.state != new_state:
             logger.info(f"State Change: {self.state} -> {new_state}")
+            self._state_changes.inc()
             self.state = new_state
             
             # Notify Recorder
@@ -105,16 +239,32 @@ class Controller:
                 except Exception as e:
                     logger.error(f"Error notifying recorder of state change: {e}")
 
+    def _prefetch_cover(self, track_info):
+        """Warm the cover cache now so tagging doesn't wait on a download when the track ends."""
+        try:
+            get_cover_cache().prefetch(track_info.get('cover_url'))
+        except Exception as e:
+            logger.debug(f"Cover prefetch failed: {e}")
+
     def _handle_no_music(self):
         if self.state != "WAITING":
             self._set_state("WAITING")
 
     def _handle_ad(self):
         if self.state == "RECORDING":
+            if self.recorder:
+                # Cut at the ad's start in the audio, not at this poll
+                try:
+                    self.recorder.confirm_ad()
+                except Exception as e:
+                    logger.error(f"Error confirming ad: {e}")
             self._set_state("PAUSED")
             
-    def _handle_paused_playback(self):
-         if self.state == "RECORDING":
+    def _handle_paused_playback(self, track_info):
+        if self.state == "RECORDING":
+            if self.recorder:
+                # Where playback stopped: a resume of this track is back-dated to where it picked up
+                self.recorder.set_current_metadata(track_info)
             self._set_state("PAUSED")
 
     def _handle_playing_track(self, track_info):
@@ -122,34 +272,45 @@ class Controller:
         if self.user_paused:
             return
         
+        # Already skipping this song (it is in the library): nothing to do until the next one
+        if self.state == "SKIPPING" and self.current_track and track_info['track_id'] == self.current_track['track_id']:
+            return
+        
         # If we were waiting or paused, start recording
-        if self.state in ["WAITING", "PAUSED"]:
+        if self.state in ["WAITING", "PAUSED", "SKIPPING"]:
             self.current_track = track_info
-            # If we were WAITING, we might need to initialize a new session
-            # For now, simple transition
-            self._set_state("RECORDING")
+            if self._in_library(track_info):
+                self._set_state("SKIPPING")
+                return
+            self._prefetch_cover(track_info)
             if self.recorder:
-                # Provide metadata for tagging
+                # Metadata first: the recorder back-dates the start from its progress_ms
                 self.recorder.set_current_metadata(track_info)
+            self._set_state("RECORDING")
 
         # If currently recording, check if track changed
         elif self.state == "RECORDING":
             if self.current_track and track_info['track_id'] != self.current_track['track_id']:
                 logger.info(f"Track Changed: {self.current_track['title']} -> {track_info['title']}")
-                # Finish previous
+                self.current_track = track_info
+                if self._in_library(track_info):
+                    # End the finished track at the boundary, but don't record this one again
+                    if self.recorder:
+                        try:
+                            self.recorder.skip_track(track_info)
+                        except Exception as e:
+                            logger.error(f"Error skipping track: {e}", exc_info=True)
+                    self._set_state("SKIPPING")
+                    return
+                
+                # Cut where the new track started (not where we noticed) and keep recording into a new file
                 if self.recorder:
                     try:
-                        logger.debug("Calling recorder.finish_track()...")
-                        self.recorder.finish_track() # Saves the file
-                        logger.debug("finish_track() completed")
+                        self.recorder.split_track(track_info)
                     except Exception as e:
-                        logger.error(f"Error finishing track: {e}", exc_info=True)
+                        logger.error(f"Error splitting track: {e}", exc_info=True)
                 
-                # Start new
-                self.current_track = track_info
-                if self.recorder:
-                    self.recorder.set_current_metadata(track_info)
-                    self.recorder.resume_recording() # Ensure we are recording
+                self._prefetch_cover(track_info)
             else:
                 # Same track still playing - this is normal
                 pass
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from spufify.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def device_set_signature(devices):
+    """Fingerprint of the capture devices present (name, channel count, loopback or not)."""
+    described = sorted(
+        f"{device.name}|{getattr(device, 'channels', '')}|{int(bool(getattr(device, 'isloopback', False)))}"
+        for device in devices
+    )
+    return hashlib.sha1("\n".join(described).encode('utf-8')).hexdigest()
+
+
+class DeviceCapabilityCache:
+    """
+    What the sample-rate probe learned about each capture device: rates that
+    open, rates that don't, the channel count used and how long an open took.
+    Kept on disk so an engine start opens the device once at a known-good rate
+    instead of probing. Everything is dropped when the set of devices changes
+    (one plugged in or removed, a driver update renaming one).
+    """
+    def __init__(self, path):
+        self.path = path
+        self._devices = None  # Device name -> entry; loaded on first use
+        self._device_set = None
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _load(self):
+        if self._devices is not None:
+            return
+        self._devices = {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self._device_set = data.get('device_set')
+            self._devices = data.get('devices') or {}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Device cache unreadable, probing again: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'device_set': self._device_set, 'devices': self._devices}, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write device cache: {e}")
+
+    def check_device_set(self, signature):
+        """Drops every entry if the devices present differ from the ones the cache was built with."""
+        with self._lock:
+            self._load()
+            if self._device_set == signature:
+                return
+            if self._devices:
+                self.invalidations += 1
+                logger.info("Audio devices changed, device capability cache cleared")
+            self._devices = {}
+            self._device_set = signature
+            self._save()
+
+    def lookup(self, name, preferred_rate):
+        """
+        (samplerate, channels) known to open on this device: the preferred rate
+        if it does, another known-good one if the preferred rate is known not to.
+        None if the preferred rate was never tried (probe it).
+        """
+        with self._lock:
+            self._load()
+            entry = self._devices.get(name)
+            if not entry or not entry['rates']:
+                self.misses += 1
+                return None
+            if preferred_rate in entry['rates']:
+                rate = preferred_rate
+            elif preferred_rate in entry['unsupported']:
+                rate = entry['rates'][0]
+            else:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return rate, entry['channels']
+
+    def unsupported_rates(self, name):
+        """Rates this device is known to refuse (the probe skips them)."""
+        with self._lock:
+            self._load()
+            entry = self._devices.get(name)
+            return set(entry['unsupported']) if entry else set()
+
+    def record(self, name, channels, rate=None, failed=(), open_ms=None):
+        """Merges what a probe or an open found out: the rate that opened (and how long it took) and those that failed."""
+        with self._lock:
+            self._load()
+            entry = self._devices.setdefault(name, {'rates': [], 'unsupported': [], 'channels': channels})
+            entry['channels'] = channels
+            for failed_rate in failed:
+                if failed_rate not in entry['unsupported'] and failed_rate not in entry['rates']:
+                    entry['unsupported'].append(failed_rate)
+            if rate is not None:
+                if rate in entry['unsupported']:
+                    entry['unsupported'].remove(rate)
+                if rate not in entry['rates']:
+                    entry['rates'].append(rate)
+                entry['open_ms'] = open_ms
+                entry['probed_at'] = time.time()
+            self._save()
+
+    def forget(self, name, rate):
+        """A cached rate failed to open: stop trusting it (not marked unsupported, the device may just have been busy)."""
+        with self._lock:
+            self._load()
+            entry = self._devices.get(name)
+            if entry and rate in entry['rates']:
+                entry['rates'].remove(rate)
+                self._save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'devices': len(self._devices or {}),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+_device_cache = None
+_device_cache_lock = threading.Lock()
+
+
+def get_device_cache():
+    """Process-wide device capability cache (follows the output folder if it changes in Settings)."""
+    global _device_cache
+    path = Config.DEVICE_CACHE_PATH or os.path.join(Config.OUTPUT_DIR, ".device_cache.json")
+    with _device_cache_lock:
+        if _device_cache is None or _device_cache.path != path:
+            _device_cache = DeviceCapabilityCache(path)
+        return _device_cache
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_count():
+    """All cores but one, which is left for the capture thread."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def low_priority(cmd):
+    """
+    (cmd, subprocess keyword arguments) that start the child below normal OS
+    priority: a creation flag on Windows, a `nice` prefix elsewhere (a
+    preexec_fn is not safe to run in a multithreaded process).
+    """
+    if sys.platform == 'win32':
+        return cmd, {'creationflags': subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+    nice = shutil.which('nice')
+    return ([nice, '-n', '10'] + list(cmd) if nice else cmd), {}
+
+
+class EncodePool:
+    """
+    Fixed set of worker threads draining a job queue.
+
+    submit() blocks while `max_queue` jobs are waiting (backpressure), so a
+    burst of recovered or batch jobs queues up instead of spawning one encoder
+    per track. The capture writer hands tracks off with block=False: it must
+    never wait, and a job is only a file path (the audio is already on disk),
+    so the queue just grows past max_queue for a while.
+    """
+    def __init__(self, workers=None, max_queue=16, name="encode", history_size=100):
+        self.workers = workers or default_worker_count()
+        self.name = name
+        self.max_queue = max_queue
+        self.jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)  # Notified when a worker takes a job
+        self._threads = []
+        self._closed = False
+
+        # Stats
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.max_depth = 0
+        self.over_capacity = 0  # Non-blocking submits that went past max_queue
+        self.history = deque(maxlen=history_size)
+
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"Encode pool started with {self.workers} worker(s), queue size {max_queue}")
+
+    def submit(self, fn, *args, label=None, block=True):
+        """Queues fn(*args). With block=True, waits while the queue is full; block=False never waits."""
+        if self._closed:
+            raise RuntimeError("Encode pool is shut down")
+        job = (fn, args, label or getattr(fn, '__name__', 'job'), time.monotonic())
+        with self._space:
+            if self.jobs.qsize() >= self.max_queue:
+                if block:
+                    logger.warning(f"Encode queue full ({self.jobs.qsize()} jobs), waiting for a free slot...")
+                    while self.jobs.qsize() >= self.max_queue and not self._closed:
+                        self._space.wait()
+                else:
+                    self.over_capacity += 1
+                    logger.warning(f"Encode queue over capacity ({self.jobs.qsize()} jobs), queued anyway")
+            self.jobs.put(job)
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.jobs.qsize())
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            fn, args, label, queued_at = job
+            started = time.monotonic()
+            with self._space:
+                self.active += 1
+                self._space.notify()
+            ok = True
+            try:
+                fn(*args)
+            except Exception as e:
+                ok = False
+                logger.error(f"Encode job '{label}' failed: {e}", exc_info=True)
+            finished = time.monotonic()
+            with self._lock:
+                self.active -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.history.append({
+                    'label': label,
+                    'wait_s': started - queued_at,
+                    'run_s': finished - started,
+                    'ok': ok,
+                })
+            self.jobs.task_done()
+
+    def queue_depth(self):
+        return self.jobs.qsize()
+
+    def shutdown(self, wait=True):
+        """Stops accepting jobs; with wait=True, blocks until queued jobs have finished."""
+        if self._closed:
+            return
+        with self._space:
+            self._closed = True
+            self._space.notify_all()  # Blocked submitters give up waiting
+        pending = self.jobs.qsize() + self.active
+        if pending and wait:
+            logger.info(f"Waiting for {pending} pending encode job(s)...")
+        if not wait:
+            return  # Daemon workers finish what they can before the interpreter exits
+        for _ in self._threads:
+            self.jobs.put(None)
+        for t in self._threads:
+            t.join()
+
+    def stats(self):
+        with self._lock:
+            history = list(self.history)
+            stats = {
+                'workers': self.workers,
+                'queue_depth': self.jobs.qsize(),
+                'max_queue_depth': self.max_depth,
+                'over_capacity': self.over_capacity,
+                'active': self.active,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+        run_times = [job['run_s'] for job in history]
+        stats['avg_job_s'] = sum(run_times) / len(run_times) if run_times else 0.0
+        stats['max_job_s'] = max(run_times) if run_times else 0.0
+        stats['recent_jobs'] = history[-10:]
+        return stats
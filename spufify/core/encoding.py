@@ -0,0 +1,305 @@
+import os
+import logging
+import subprocess
+import tempfile
+import numpy as np
+import soundfile as sf
+from spufify.config import Config
+from spufify.core.encode_pool import low_priority
+from spufify.core.segment_store import map_float_wav
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ['mp3', 'flac', 'wav']
+NATIVE_FORMATS = ['flac', 'wav']  # Formats libsndfile can write without ffmpeg
+
+
+def output_extension(fmt=None):
+    """Normalized output extension for a format name (defaults to Config.OUTPUT_FORMAT)."""
+    ext = (fmt or Config.OUTPUT_FORMAT).lower()
+    if ext not in SUPPORTED_FORMATS:
+        ext = 'flac' # Default to lossless if unknown
+    return ext
+
+
+def output_profiles():
+    """
+    Every format a track is saved in: OUTPUT_FORMAT first (the primary take,
+    in OUTPUT_DIR), then the extra OUTPUT_PROFILES (each in OUTPUT_DIR/<format>).
+    """
+    profiles = [output_extension()]
+    for fmt in Config.OUTPUT_PROFILES or []:
+        ext = output_extension(fmt)
+        if ext not in profiles:
+            profiles.append(ext)
+    return profiles
+
+
+def ffmpeg_output_args(ext, sample_rate):
+    """FFmpeg codec arguments for an output format, preserving the source sample rate."""
+    if ext == 'mp3':
+        # Use CBR 320kbps with high-quality encoding
+        return [
+            '-codec:a', 'libmp3lame',
+            '-b:a', '320k',
+            '-q:a', '0',  # Highest quality (0-9, lower is better)
+            '-ar', str(sample_rate),  # Preserve source sample rate
+        ]
+    elif ext == 'flac':
+        # Use compression level 8 (best compression, lossless)
+        return [
+            '-compression_level', '8',
+            '-ar', str(sample_rate),  # Preserve source sample rate
+        ]
+    else: # wav
+        # PCM 16-bit (standard CD quality)
+        return [
+            '-codec:a', 'pcm_s16le',
+            '-ar', str(sample_rate),  # Preserve source sample rate
+        ]
+
+
+def output_bit_depth(ext):
+    """Integer bit depth for lossless output: Config.OUTPUT_BIT_DEPTH or the format default."""
+    if Config.OUTPUT_BIT_DEPTH in (16, 24):
+        return Config.OUTPUT_BIT_DEPTH
+    return 24 if ext == 'flac' else 16
+
+
+def use_native_encoder(ext):
+    return Config.NATIVE_ENCODE and ext in NATIVE_FORMATS
+
+
+class NativeEncoder:
+    """
+    Writes FLAC or PCM WAV in-process through libsndfile.
+    Float input is converted to 16/24-bit integers with optional TPDF dither.
+    Same write()/close()/abort() interface as StreamingEncoder.
+    """
+    SUBTYPES = {16: 'PCM_16', 24: 'PCM_24'}
+
+    def __init__(self, path, samplerate, channels, ext, bit_depth=24, dither=True, seed=None):
+        if bit_depth not in self.SUBTYPES:
+            raise ValueError(f"Unsupported bit depth: {bit_depth}")
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.ext = ext
+        self.bit_depth = bit_depth
+        self.dither = dither
+        self.frames = 0
+        self.closed = False
+        self._scale = float(2 ** (bit_depth - 1))
+        self._rng = np.random.default_rng(seed)
+        self._file = sf.SoundFile(
+            path, mode='w', samplerate=samplerate, channels=channels,
+            subtype=self.SUBTYPES[bit_depth], format='FLAC' if ext == 'flac' else 'WAV',
+            compression_level=1.0 if ext == 'flac' else None  # Same as ffmpeg -compression_level 8
+        )
+
+    def _quantize(self, block):
+        scaled = block.astype(np.float64) * self._scale
+        if self.dither:
+            # TPDF: difference of two uniform variables, +-1 LSB triangular noise
+            scaled += self._rng.random(scaled.shape)
+            scaled -= self._rng.random(scaled.shape)
+        np.rint(scaled, out=scaled)
+        np.clip(scaled, -self._scale, self._scale - 1, out=scaled)
+        if self.bit_depth == 16:
+            return scaled.astype(np.int16)
+        # libsndfile takes full-scale int32 and keeps the top 24 bits
+        return scaled.astype(np.int32) << 8
+
+    def write(self, data):
+        self._file.write(self._quantize(np.asarray(data, dtype=np.float32)))
+        self.frames += len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._file.close()
+
+    def abort(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _feeding(blocks, analyzer):
+    """Passes the decoded blocks through, feeding each to `analyzer` (a LoudnessAnalyzer) on the way."""
+    if analyzer is None:
+        return blocks
+    return _fed_blocks(blocks, analyzer)
+
+
+def _fed_blocks(blocks, analyzer):
+    for block in blocks:
+        analyzer.feed(block)
+        yield block
+
+
+def transcode_native(src_path, dst_path, ext, bit_depth=24, dither=True, chunk_frames=65536, analyzer=None):
+    """
+    Re-encodes an audio file to FLAC/WAV in-process, in fixed-size chunks. Returns frames written.
+    `analyzer` (a LoudnessAnalyzer) is fed the same decoded chunks.
+    """
+    mapped = map_float_wav(src_path)
+    if mapped is not None:
+        # Float WAV capture: chunks are views into the page cache, nothing is decoded or copied
+        audio, samplerate = mapped
+        blocks = (audio[start:start + chunk_frames] for start in range(0, len(audio), chunk_frames))
+        return _encode_blocks(_feeding(blocks, analyzer), dst_path, samplerate, audio.shape[1], ext, bit_depth, dither)
+    with sf.SoundFile(src_path, mode='r') as src:
+        blocks = src.blocks(blocksize=chunk_frames, dtype='float32', always_2d=True)
+        return _encode_blocks(_feeding(blocks, analyzer), dst_path, src.samplerate, src.channels, ext, bit_depth,
+                              dither)
+
+
+def transcode_fanout(src_path, targets, sample_rate, dither=True, chunk_frames=65536, analyzer=None):
+    """
+    Encodes one source to several (ext, dst_path) targets from a single decode.
+    Native formats get a NativeEncoder each; the rest share one ffmpeg process
+    with an output per target, fed the same PCM. With no native target and no
+    `analyzer` to feed (or a source libsndfile can't read) ffmpeg decodes the
+    file itself, still once, and the analyzer gets nothing.
+    """
+    native = [(ext, path) for ext, path in targets if use_native_encoder(ext)]
+    piped = [(ext, path) for ext, path in targets if not use_native_encoder(ext)]
+    decode = bool(native) or analyzer is not None
+    mapped = map_float_wav(src_path) if decode else None
+    if mapped is not None:
+        audio, samplerate = mapped
+        blocks = (audio[start:start + chunk_frames] for start in range(0, len(audio), chunk_frames))
+        _fanout_blocks(_feeding(blocks, analyzer), native, piped, samplerate, audio.shape[1], dither)
+        return
+    try:
+        src = sf.SoundFile(src_path, mode='r') if decode else None
+    except (RuntimeError, sf.LibsndfileError):
+        src = None  # e.g. an MP3 on an older libsndfile
+    if src is None:
+        _ffmpeg_fanout(src_path, targets, sample_rate)
+        return
+    with src:
+        blocks = src.blocks(blocksize=chunk_frames, dtype='float32', always_2d=True)
+        _fanout_blocks(_feeding(blocks, analyzer), native, piped, src.samplerate, src.channels, dither)
+
+
+def _fanout_blocks(blocks, native, piped, samplerate, channels, dither):
+    encoders = []
+    try:
+        for ext, path in native:
+            encoders.append(
+                NativeEncoder(path, samplerate, channels, ext, bit_depth=output_bit_depth(ext), dither=dither)
+            )
+        if piped:
+            (ext, path), extra = piped[0], piped[1:]
+            encoders.append(StreamingEncoder(path, samplerate, channels, ext, extra_outputs=extra))
+        for block in blocks:
+            for encoder in encoders:
+                encoder.write(block)
+        for encoder in encoders:
+            encoder.close()
+    except Exception:
+        for encoder in encoders:
+            try:
+                encoder.abort()
+            except Exception as e:
+                logger.debug(f"Error aborting {encoder.path}: {e}")
+        raise
+
+
+def _ffmpeg_fanout(src_path, targets, sample_rate):
+    """One ffmpeg run decoding `src_path` once into every target."""
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-i', src_path]
+    for ext, path in targets:
+        cmd += ['-map', '0:a'] + ffmpeg_output_args(ext, sample_rate) + [path]  # Audio only (no cover stream)
+    cmd, popen_kwargs = low_priority(cmd) if Config.ENCODE_LOW_PRIORITY else (cmd, {})
+    result = subprocess.run(cmd, capture_output=True, text=True, **popen_kwargs)
+    if result.returncode != 0:
+        for _, path in targets:
+            if os.path.exists(path):
+                os.remove(path)
+        raise RuntimeError(f"FFmpeg conversion failed: {result.stderr.strip()[-500:]}")
+
+
+def _encode_blocks(blocks, dst_path, samplerate, channels, ext, bit_depth, dither):
+    encoder = NativeEncoder(dst_path, samplerate, channels, ext, bit_depth=bit_depth, dither=dither)
+    try:
+        for block in blocks:
+            encoder.write(block)
+    except Exception:
+        encoder.abort()
+        raise
+    encoder.close()
+    return encoder.frames
+
+
+class StreamingEncoder:
+    """
+    Long-lived ffmpeg process fed with raw float32 PCM through stdin,
+    so the track is encoded while it plays instead of after it ends.
+    `extra_outputs` are more (ext, path) outputs of the same process.
+    """
+    def __init__(self, path, samplerate, channels, ext, extra_outputs=()):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.ext = ext
+        self.frames = 0
+        self.closed = False
+
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'f32le', '-ar', str(samplerate), '-ac', str(channels), '-i', 'pipe:0',
+        ] + ffmpeg_output_args(ext, samplerate) + [path]
+        self.extra_outputs = list(extra_outputs)
+        for extra_ext, extra_path in self.extra_outputs:
+            cmd += ffmpeg_output_args(extra_ext, samplerate) + [extra_path]
+
+        # stderr goes to a temp file: an unread pipe could fill up and stall ffmpeg
+        self._stderr = tempfile.TemporaryFile()
+        cmd, popen_kwargs = low_priority(cmd) if Config.ENCODE_LOW_PRIORITY else (cmd, {})
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr, **popen_kwargs
+        )
+
+    def write(self, data):
+        # Ring buffer slices are already C-contiguous float32, so this is a zero-copy view
+        block = np.ascontiguousarray(data, dtype=np.float32)
+        self.process.stdin.write(block.data)
+        self.frames += len(block)
+
+    def close(self, timeout=30):
+        """Flushes and waits for ffmpeg. Raises RuntimeError if the encode failed."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass  # ffmpeg already exited; returncode tells us why
+        try:
+            returncode = self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            returncode = self.process.wait()
+        self._stderr.seek(0)
+        errors = self._stderr.read().decode(errors='replace').strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"FFmpeg streaming encode failed ({returncode}): {errors}")
+        if errors:
+            logger.debug(f"FFmpeg stream warnings: {errors}")
+
+    def abort(self):
+        """Kills ffmpeg and removes the partial output."""
+        self.closed = True
+        try:
+            self.process.kill()
+            self.process.wait()
+        finally:
+            self._stderr.close()
+            for path in [self.path] + [path for _, path in self.extra_outputs]:
+                if os.path.exists(path):
+                    os.remove(path)
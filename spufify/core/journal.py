@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import struct
+import logging
+import uuid
+import threading
+import numpy as np
+from spufify.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Job states in the manifest, in the order a track moves through them
+RECORDING = 'recording'
+QUEUED = 'queued'
+ENCODED = 'encoded'
+TAGGED = 'tagged'
+DONE = 'done'
+DISCARDED = 'discarded'
+FINISHED_STATES = (DONE, DISCARDED)
+
+# Jobs written by this process are never "recovered" by it
+SESSION_ID = uuid.uuid4().hex
+_STILL_ACTIVE = 259  # GetExitCodeProcess() of a process that has not exited
+
+_WAV_HEADER_BYTES = 44
+_WAVE_FORMAT_IEEE_FLOAT = 3
+
+
+def _wav_header(samplerate, channels, data_bytes):
+    """44-byte RIFF header for 32-bit float PCM."""
+    block_align = channels * 4
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_bytes, b'WAVE',
+        b'fmt ', 16, _WAVE_FORMAT_IEEE_FLOAT, channels, samplerate, samplerate * block_align, block_align, 32,
+        b'data', data_bytes
+    )
+
+
+class JournalWavWriter:
+    """
+    In-flight track capture as a 32-bit float WAV that is valid on disk at every
+    sync point: samples are appended, and every `sync_interval` seconds the RIFF
+    sizes are patched and the file is fsynced. A crash loses at most the audio
+    since the last sync; the rest is repaired on the next start. sync_interval=None
+    only fixes the header on close.
+    """
+    def __init__(self, path, samplerate, channels, sync_interval=1.0):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.sync_interval = sync_interval
+        self.frames = 0
+        self.closed = False
+        self.syncs = 0
+        self.sync_s = 0.0
+        self._file = open(path, 'wb')
+        self._file.write(_wav_header(samplerate, channels, 0))
+        self._synced_frames = 0
+        self._last_sync = time.monotonic()
+
+    def write(self, data):
+        block = np.ascontiguousarray(data, dtype=np.float32)
+        self._file.write(block.data)
+        self.frames += len(block)
+        if self.sync_interval is not None and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Patches the header to the frames written so far and forces everything to disk."""
+        if self.closed or self.frames == self._synced_frames:
+            return
+        started = time.perf_counter()
+        data_bytes = self.frames * self.channels * 4
+        self._file.flush()
+        self._file.seek(0)
+        self._file.write(_wav_header(self.samplerate, self.channels, data_bytes))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_frames = self.frames
+        self._last_sync = time.monotonic()
+        self.syncs += 1
+        self.sync_s += time.perf_counter() - started
+
+    def close(self):
+        if self.closed:
+            return
+        self.sync()
+        self.closed = True
+        self._file.close()
+
+    def abort(self):
+        """Closes and removes the file (a dropped take)."""
+        if not self.closed:
+            self.closed = True
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _process_alive(pid):
+    """Whether another process with this pid is running (our own pid counts as gone: its jobs are an earlier run's)."""
+    if not pid or pid == os.getpid():
+        return False
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == _STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True  # Exists, owned by another user
+    except OSError:
+        return False
+    return True
+
+
+def _last_written_frame(f, frames, block_align, chunk_frames=65536):
+    """Number of frames up to and including the last non-silent one, scanning back from `frames`."""
+    end = frames
+    while end > 0:
+        start = max(0, end - chunk_frames)
+        f.seek(_WAV_HEADER_BYTES + start * block_align)
+        block = np.frombuffer(f.read((end - start) * block_align), dtype=np.uint32)
+        nonzero = np.flatnonzero(block)
+        if len(nonzero):
+            return start + int(nonzero[-1]) * 4 // block_align + 1
+        end = start
+    return 0
+
+
+def repair_wav(path, channels=None):
+    """
+    Rewrites the header of a float WAV left behind by a crash so its sizes match
+    the whole frames actually on disk. Returns the number of frames recovered.
+    """
+    with open(path, 'r+b') as f:
+        header = f.read(_WAV_HEADER_BYTES)
+        if len(header) < _WAV_HEADER_BYTES or header[:4] != b'RIFF' or header[36:40] != b'data':
+            raise ValueError(f"Not a journal WAV: {path}")
+        fields = struct.unpack('<4sI4s4sIHHIIHH4sI', header)
+        samplerate, file_channels = fields[7], fields[6]
+        block_align = (channels or file_channels) * 4
+        size = os.fstat(f.fileno()).st_size
+        frames = max(0, size - _WAV_HEADER_BYTES) // block_align
+        if frames > fields[12] // block_align:
+            # Preallocated (memory-mapped) capture: the tail past the last sync may be unwritten zeros
+            frames = max(fields[12] // block_align, _last_written_frame(f, frames, block_align))
+        data_bytes = frames * block_align
+        f.truncate(_WAV_HEADER_BYTES + data_bytes)  # Drop a torn partial frame
+        f.seek(0)
+        f.write(_wav_header(samplerate, file_channels, data_bytes))
+        f.flush()
+        os.fsync(f.fileno())
+    return frames
+
+
+class JobJournal:
+    """
+    Persistent manifest of in-flight tracks: capture files being written and
+    encode/tag jobs waiting or running. An append-only JSON-lines log (last line
+    per job wins), fsynced on every state change and compacted once finished
+    jobs dominate it. recover() picks up whatever a crash left unfinished.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "jobs.jsonl")
+        self._jobs = None  # Loaded on first use
+        self._log_lines = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.updates = 0
+        self.recovered = 0
+
+    def _ensure_loaded(self):
+        if self._jobs is not None:
+            return
+        jobs = {}
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        job = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line after a crash
+                    if job.get('id'):
+                        jobs[job['id']] = dict(jobs.get(job['id'], {}), **job)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not read job journal: {e}")
+        self._jobs = jobs
+        self._log_lines = lines
+
+    def capture_path(self, ext='wav', tag=None):
+        """A fresh file name for an in-flight track, inside the journal directory (`tag`: the recording session)."""
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = f"capture_{tag}" if tag else "capture"
+        return os.path.join(self.directory, f"{prefix}_{int(time.time() * 1000)}_{os.getpid()}.{ext}")
+
+    def job_id(self, path):
+        return os.path.basename(path)
+
+    def update(self, path, state, **fields):
+        """Records that the job for `path` reached `state` (with any extra fields, e.g. metadata)."""
+        change = dict(fields, id=self.job_id(path), path=path, state=state, session=SESSION_ID, pid=os.getpid(), updated_at=time.time())
+        with self._lock:
+            self._ensure_loaded()
+            job = self._jobs[change['id']] = dict(self._jobs.get(change['id'], {}), **change)
+            self._append(change)
+            self.updates += 1
+            finished = sum(1 for j in self._jobs.values() if j['state'] in FINISHED_STATES)
+            if finished > 100 and self._log_lines > 4 * (len(self._jobs) - finished) + 100:
+                self._compact()
+        return job
+
+    def get(self, path):
+        with self._lock:
+            self._ensure_loaded()
+            job = self._jobs.get(self.job_id(path))
+            return dict(job) if job else None
+
+    def unfinished(self):
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(job) for job in self._jobs.values() if job['state'] not in FINISHED_STATES]
+
+    def _append(self, change):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(change) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_lines += 1
+        except OSError as e:
+            logger.error(f"Could not write job journal: {e}")
+
+    def _compact(self):
+        """Rewrites the log with only unfinished jobs (atomically)."""
+        self._jobs = {key: job for key, job in self._jobs.items() if job['state'] not in FINISHED_STATES}
+        temp = self.path + ".tmp"
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                for job in self._jobs.values():
+                    f.write(json.dumps(job) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.path)
+            self._log_lines = len(self._jobs)
+        except OSError as e:
+            logger.error(f"Could not compact job journal: {e}")
+
+    def recover(self, processor):
+        """
+        Resumes what the last run left unfinished: repairs interrupted captures and
+        re-queues them, and resumes encode/tag jobs from the last completed step.
+        Jobs still owned by another running instance (daemon, GUI, batch run) are
+        left alone. Returns the number of jobs resumed.
+        """
+        resumed = 0
+        for job in self.unfinished():
+            if job.get('session') == SESSION_ID:
+                continue  # In flight in this session
+            if _process_alive(job.get('pid')):
+                logger.debug(f"Skipping {os.path.basename(job['path'])}: still owned by running process {job['pid']}")
+                continue
+            path, state = job['path'], job['state']
+            metadata = job.get('metadata')
+            if job.get('attempts', 0) >= Config.JOURNAL_MAX_ATTEMPTS:
+                logger.warning(f"Giving up on {os.path.basename(path)} after {job['attempts']} attempts")
+                self.update(path, DISCARDED)
+                continue
+            try:
+                if state in (RECORDING, QUEUED):
+                    if not metadata or not os.path.exists(path):
+                        logger.info(f"Nothing to recover for {os.path.basename(path)}")
+                        self.update(path, DISCARDED)
+                        continue
+                    if job.get('kind') == 'stream':
+                        processor.finish_stream(path, metadata)
+                    else:
+                        if state == RECORDING:
+                            frames = repair_wav(path)
+                            if frames < job.get('sample_rate', Config.SAMPLE_RATE):
+                                logger.info(f"Interrupted capture too short to keep: {os.path.basename(path)}")
+                                os.remove(path)
+                                self.update(path, DISCARDED)
+                                continue
+                            logger.info(f"Recovered interrupted capture: {metadata.get('title')} ({frames} frames)")
+                        processor.process_track(path, metadata, job.get('sample_rate'))
+                else:
+                    # Encoded or tagged already: only the remaining steps run
+                    processor.resume_job(job)
+                resumed += 1
+            except Exception as e:
+                logger.error(f"Could not recover {path}: {e}", exc_info=True)
+                self.update(path, state, attempts=job.get('attempts', 0) + 1, error=str(e)[:500])
+        self.recovered += resumed
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished track(s) from the last session")
+        return resumed
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values()) if self._jobs is not None else []
+        states = {}
+        for job in jobs:
+            states[job['state']] = states.get(job['state'], 0) + 1
+        return {'log_lines': self._log_lines, 'updates': self.updates, 'recovered': self.recovered, 'states': states}
+
+
+_job_journal = None
+_job_journal_lock = threading.Lock()
+
+
+def get_job_journal():
+    """Process-wide job journal shared by the recorder and the processor."""
+    global _job_journal
+    directory = Config.JOURNAL_DIR or os.path.join(Config.OUTPUT_DIR, ".journal")
+    with _job_journal_lock:
+        # Follows the output folder if it changes in Settings
+        if _job_journal is None or _job_journal.directory != directory:
+            _job_journal = JobJournal(directory)
+        return _job_journal
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+from spufify.config import Config
+from spufify.core.encoding import output_extension, output_bit_depth
+
+logger = logging.getLogger(__name__)
+
+LOSSLESS_FORMATS = ('flac', 'wav')
+
+# Chroma fingerprint: one 12-bit pitch-class vector per second of audio
+FINGERPRINT_HOP_SEC = 1.0
+FINGERPRINT_WINDOW = 4096
+CHROMA_LOW_HZ = 55.0
+CHROMA_HIGH_HZ = 2000.0
+
+
+def _chroma_bits(window, samplerate):
+    """12-bit chroma vector of one mono window: bit k set if pitch class k is above the mean."""
+    spectrum = np.abs(np.fft.rfft(window * np.hanning(len(window))))
+    freqs = np.fft.rfftfreq(len(window), 1.0 / samplerate)
+    band = (freqs >= CHROMA_LOW_HZ) & (freqs <= CHROMA_HIGH_HZ)
+    pitch_class = np.round(12 * np.log2(freqs[band] / 440.0)).astype(np.int64) % 12
+    chroma = np.bincount(pitch_class, weights=np.square(spectrum[band]), minlength=12)
+    if not chroma.any():
+        return 0
+    bits = chroma > chroma.mean()
+    return int(np.dot(bits, 1 << np.arange(12)))
+
+
+def chroma_fingerprint(path):
+    """
+    Compact fingerprint of an audio file: a hex string of 3 hex digits (12 bits)
+    per second. Survives re-encoding and level changes; None if the file can't be decoded.
+    """
+    import soundfile as sf
+    try:
+        with sf.SoundFile(path) as f:
+            samplerate = f.samplerate
+            hop = int(samplerate * FINGERPRINT_HOP_SEC)
+            values = []
+            for block in f.blocks(blocksize=hop, dtype='float32', always_2d=True):
+                if len(block) < FINGERPRINT_WINDOW:
+                    break
+                values.append(_chroma_bits(block[:FINGERPRINT_WINDOW].mean(axis=1), samplerate))
+    except Exception as e:
+        logger.debug(f"Could not fingerprint {path}: {e}")
+        return None
+    return "".join(f"{value:03x}" for value in values)
+
+
+def fingerprint_similarity(a, b, max_shift=3):
+    """
+    Fraction of matching chroma bits between two fingerprints (0..1), at the best
+    alignment within +/- `max_shift` seconds (trimmed silence shifts a take).
+    """
+    if not a or not b:
+        return None
+    x = np.array([int(a[i:i + 3], 16) for i in range(0, len(a), 3)], dtype=np.int64)
+    y = np.array([int(b[i:i + 3], 16) for i in range(0, len(b), 3)], dtype=np.int64)
+    best = 0.0
+    for shift in range(-max_shift, max_shift + 1):
+        xs = x[max(0, shift):]
+        ys = y[max(0, -shift):]
+        n = min(len(xs), len(ys))
+        if n == 0:
+            continue
+        diff = np.bitwise_xor(xs[:n], ys[:n])
+        errors = sum(int(np.count_nonzero(diff & (1 << bit))) for bit in range(12))
+        best = max(best, 1.0 - errors / (12 * n))
+    return best
+
+
+def take_quality(take):
+    """
+    Sort key for takes of the same track: complete before partial, then lossless
+    before lossy, sample rate, bit depth and how much of the track was captured.
+    """
+    duration = (take.get('duration_ms') or 0) / 1000.0
+    coverage = min(1.0, take['seconds'] / duration) if duration else 1.0
+    return (
+        coverage >= Config.LIBRARY_COMPLETE_RATIO,
+        take['format'] in LOSSLESS_FORMATS,
+        take.get('sample_rate') or 0,
+        take.get('bit_depth') or 0,
+        round(coverage, 3),
+    )
+
+
+def describe_take(path, metadata, ext, sample_rate, seconds, fingerprint=None):
+    """The library's record of one take of a track."""
+    return {
+        'path': path,
+        'title': metadata.get('title'),
+        'artist': metadata.get('artist'),
+        'album': metadata.get('album'),
+        'cover_url': metadata.get('cover_url'),
+        'format': ext,
+        'sample_rate': sample_rate,
+        'bit_depth': output_bit_depth(ext) if ext in LOSSLESS_FORMATS else None,
+        'seconds': seconds,
+        'duration_ms': metadata.get('duration_ms'),
+        'fingerprint': fingerprint,
+    }
+
+
+def expected_take(metadata, sample_rate):
+    """The take recording `metadata` from the start would produce with the current settings."""
+    ext = output_extension()
+    seconds = (metadata.get('duration_ms') or 0) / 1000.0
+    return describe_take(None, metadata, ext, sample_rate, seconds)
+
+
+def _best_first(takes):
+    """Takes of one track, best first (the most recent first among equals)."""
+    return sorted(takes, key=lambda take: (take_quality(take), take.get('recorded_at') or 0), reverse=True)
+
+
+class LibraryIndex:
+    """
+    Persistent index of recorded tracks keyed by Spotify track_id.
+
+    Each track maps to its takes on disk, best first (path, format, sample
+    rate, bit depth, captured length and a chroma fingerprint); usually there
+    is one, but takes that don't supersede each other are all kept. Lookups
+    are dict hits; the file is an append-only JSON-lines log, read on first
+    use and compacted when superseded entries pile up.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._entries = None  # Track id -> takes, best first; loaded on first use
+        self._takes = 0
+        self._log_lines = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.replaced = 0
+        self.discarded = 0
+        self.load_s = None
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        started = time.perf_counter()
+        entries = {}
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line after a crash
+                    track_id = entry.get('track_id')
+                    if not track_id:
+                        continue
+                    if entry.get('removed') and entry.get('path') is None:
+                        entries.pop(track_id, None)  # Every take (logs from before several takes per track)
+                        continue
+                    # A take line replaces an earlier take at the same path; a removal line drops it
+                    takes = [take for take in entries.get(track_id, ()) if take['path'] != entry['path']]
+                    if not entry.get('removed'):
+                        takes.append(entry)
+                    if takes:
+                        entries[track_id] = takes
+                    else:
+                        entries.pop(track_id, None)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not read library index: {e}")
+        for track_id, takes in entries.items():
+            if len(takes) > 1:
+                entries[track_id] = _best_first(takes)
+        self._entries = entries
+        self._takes = sum(len(takes) for takes in entries.values())
+        self._log_lines = lines
+        self.load_s = time.perf_counter() - started
+        logger.info(f"Library index loaded: {len(entries)} track(s) in {self.load_s * 1000:.1f} ms")
+
+    def preload(self):
+        """Loads the index in the background so the first lookup doesn't wait on disk."""
+        threading.Thread(target=self.get, args=(None,), daemon=True).start()
+
+    def _forget(self, track_id, take):
+        """Drops one take from the index (lock held)."""
+        takes = [other for other in self._entries.get(track_id, ()) if other is not take]
+        if takes:
+            self._entries[track_id] = takes
+        else:
+            self._entries.pop(track_id, None)
+        self._takes -= 1
+        self._append({'track_id': track_id, 'path': take['path'], 'removed': True})
+
+    def get(self, track_id):
+        """The best stored take of `track_id`, or None. Takes whose file is gone are forgotten."""
+        with self._lock:
+            self._ensure_loaded()
+            takes = self._entries.get(track_id) if track_id else None
+            while takes and not os.path.exists(takes[0]['path']):
+                logger.info(f"Library file missing, forgetting: {takes[0]['path']}")
+                self._forget(track_id, takes[0])
+                takes = self._entries.get(track_id)
+        return takes[0] if takes else None
+
+    def takes(self, track_id):
+        """Every stored take of `track_id` (copies), best first."""
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(take) for take in self._entries.get(track_id, ())]
+
+    def has_take_as_good_as(self, track_id, take):
+        """True if the library already holds a take of `track_id` at least as good as `take`."""
+        entry = self.get(track_id)
+        known = entry is not None and take_quality(entry) >= take_quality(take)
+        with self._lock:
+            if known:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return known
+
+    def should_keep(self, track_id, take):
+        """True if `take` improves on what the library holds (or the track is new)."""
+        entry = self.get(track_id)
+        if entry is None or take_quality(take) > take_quality(entry):
+            return True
+        with self._lock:
+            self.discarded += 1
+        return False
+
+    def record(self, track_id, take):
+        """
+        Adds `take` (a dict with path, format, sample_rate, bit_depth, seconds,
+        duration_ms and fingerprint) to the track's takes. Returns the paths of
+        the takes it supersedes (same audio, lower quality): they leave the index
+        and their files should be removed. Every other take stays indexed.
+        """
+        if not track_id:
+            return []
+        entry = dict(take, track_id=track_id, recorded_at=time.time())
+        superseded = []
+        different = []
+        with self._lock:
+            self._ensure_loaded()
+            for previous in list(self._entries.get(track_id, ())):
+                if os.path.abspath(previous['path']) == os.path.abspath(take['path']):
+                    self._entries[track_id].remove(previous)  # Rewritten in place; the new line replaces it
+                    self._takes -= 1
+                    continue
+                if take_quality(previous) >= take_quality(entry):
+                    continue
+                similarity = fingerprint_similarity(previous.get('fingerprint'), take.get('fingerprint'))
+                if similarity is not None and similarity < Config.LIBRARY_MATCH_SIMILARITY:
+                    different.append(similarity)
+                    continue
+                self._forget(track_id, previous)
+                superseded.append(previous['path'])
+            self._entries[track_id] = _best_first(self._entries.get(track_id, []) + [entry])
+            self._takes += 1
+            self._append(entry)
+            self.replaced += len(superseded)
+            if self._log_lines > 2 * self._takes + 100:
+                self._compact()
+        for similarity in different:
+            logger.warning(
+                f"New take of {take.get('title', track_id)} does not sound like the stored one "
+                f"(similarity {similarity:.2f}), keeping both"
+            )
+        return superseded
+
+    def _append(self, entry):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+            self._log_lines += 1
+        except OSError as e:
+            logger.error(f"Could not write library index: {e}")
+
+    def _compact(self):
+        """Rewrites the log with one line per take (atomically)."""
+        temp = self.path + ".tmp"
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                for takes in self._entries.values():
+                    for entry in takes:
+                        f.write(json.dumps(entry) + "\n")
+            os.replace(temp, self.path)
+            self._log_lines = self._takes
+            logger.debug(f"Library index compacted to {self._log_lines} entries")
+        except OSError as e:
+            logger.error(f"Could not compact library index: {e}")
+
+    def entries(self):
+        """All stored takes (copies), e.g. for tools that walk the library."""
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(entry) for takes in self._entries.values() for entry in takes]
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._entries is not None,
+                'tracks': len(self._entries) if self._entries is not None else None,
+                'takes': self._takes if self._entries is not None else None,
+                'log_lines': self._log_lines,
+                'load_ms': self.load_s * 1000 if self.load_s is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'replaced': self.replaced,
+                'discarded': self.discarded,
+            }
+
+
+_library_index = None
+_library_index_lock = threading.Lock()
+
+
+def get_library_index():
+    """Process-wide library index (created on first use; the file itself loads on first lookup)."""
+    global _library_index
+    path = Config.LIBRARY_INDEX_PATH or os.path.join(Config.OUTPUT_DIR, ".library_index.jsonl")
+    with _library_index_lock:
+        # Follows the output folder if it changes in Settings
+        if _library_index is None or _library_index.path != path:
+            _library_index = LibraryIndex(path)
+        return _library_index
@@ -0,0 +1,252 @@
+import numpy as np
+
+# ITU-R BS.1770-4 / EBU R128
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+LRA_RELATIVE_GATE_LU = -20.0
+BLOCK_SEC = 0.4  # Momentary (gating) block: 4 sub-blocks, 75% overlap
+SHORT_TERM_SEC = 3.0  # Short-term window for the loudness range
+SUB_BLOCK_SEC = 0.1
+# Channel weights by position for up to 5.1 (L, R, C, LFE, Ls, Rs); LFE is not measured
+CHANNEL_WEIGHTS = (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)
+
+REPLAYGAIN_REFERENCE_LUFS = -18.0  # ReplayGain 2.0
+
+_TRUE_PEAK_TAPS_PER_PHASE = 12
+
+
+def k_weighting_coefficients(samplerate):
+    """
+    The two K-weighting biquads (high shelf, then high-pass) as (b, a) pairs for
+    `samplerate`, from the analog prototypes of BS.1770 (exact at 48 kHz).
+    """
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / samplerate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = (
+        np.array([(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]),
+        np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]),
+    )
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / samplerate)
+    a0 = 1.0 + k / q + k * k
+    highpass = (
+        np.array([1.0, -2.0, 1.0]),
+        np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]),
+    )
+    return shelf, highpass
+
+
+def k_weighting_fir(samplerate, tolerance=1e-10):
+    """
+    K-weighting as an FIR: the biquads' impulse response, computed from their
+    frequency response and cut where the remaining energy drops below `tolerance`.
+    """
+    n = 1 << 18
+    z = np.exp(-1j * np.linspace(0.0, np.pi, n // 2 + 1))
+    response = np.ones_like(z)
+    for b, a in k_weighting_coefficients(samplerate):
+        response *= np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+    impulse = np.fft.irfft(response, n)
+    tail = np.cumsum(np.square(impulse[::-1]))[::-1]
+    taps = int(np.argmax(tail < tolerance * tail[0]))
+    return impulse[:max(taps, 1)]
+
+
+def true_peak_filter(oversample):
+    """Polyphase interpolation filter for true-peak measurement: shape (oversample, taps per phase)."""
+    taps = _TRUE_PEAK_TAPS_PER_PHASE * oversample
+    t = (np.arange(taps) - taps // 2) / oversample  # Phase 0 lands on the original samples
+    h = np.sinc(t) * np.kaiser(taps, 8.0)
+    h = h.reshape(-1, oversample).T  # Phase p holds h[p], h[p + L], ...
+    return h / h.sum(axis=1, keepdims=True)
+
+
+def _lufs(power):
+    return -0.691 + 10.0 * np.log10(np.maximum(power, 1e-20))
+
+
+class LoudnessAnalyzer:
+    """
+    Incremental EBU R128 / BS.1770-4 loudness meter for one track.
+
+    feed() takes the blocks as they are written (any size, (frames, channels)
+    float). K-weighting runs as FFT overlap-add over fixed chunks, and only the
+    power of each 100 ms sub-block is kept, so result() is cheap at any point:
+    integrated loudness (gated), loudness range (LRA), true peak (4x oversampled
+    below 96 kHz) and the ReplayGain 2.0 track gain.
+    """
+    def __init__(self, samplerate, channels):
+        self.samplerate = int(samplerate)
+        self.channels = int(channels)
+        weights = list(CHANNEL_WEIGHTS[:self.channels]) + [1.0] * max(0, self.channels - len(CHANNEL_WEIGHTS))
+        self.weights = np.array(weights)
+        self.sub_block = int(round(self.samplerate * SUB_BLOCK_SEC))
+
+        self.fir = k_weighting_fir(self.samplerate)
+        taps = len(self.fir)
+        self._fft_size = 1 << max(15, int(np.ceil(np.log2(4 * taps))))
+        self._chunk = self._fft_size - taps + 1
+        self._fir_spectrum = np.fft.rfft(self.fir, self._fft_size)
+
+        self.oversample = 4 if self.samplerate < 96000 else 2 if self.samplerate < 192000 else 1
+        self._tp_filter = true_peak_filter(self.oversample) if self.oversample > 1 else None
+        self.reset()
+
+    def reset(self):
+        """Starts a new track."""
+        self.frames = 0
+        self._pending = []
+        self._pending_frames = 0
+        self._overlap = np.zeros((len(self.fir) - 1, self.channels))
+        self._partial_power = 0.0  # Weighted sum of squares of the unfinished sub-block
+        self._partial_frames = 0
+        self._sub_blocks = []  # Weighted sum of squares per complete 100 ms sub-block
+        self._tp_history = np.zeros((_TRUE_PEAK_TAPS_PER_PHASE - 1, self.channels))
+        self.sample_peak = 0.0
+        self.true_peak = 0.0
+
+    def feed(self, data):
+        data = np.array(data, dtype=np.float32)  # Copy: the caller's buffer (a ring slot) is reused
+        if data.ndim == 1:
+            data = data[:, None]
+        if not len(data):
+            return
+        self.frames += len(data)
+        self._pending.append(data)
+        self._pending_frames += len(data)
+        if self._pending_frames >= self._chunk:
+            buffered = np.concatenate(self._pending)
+            full = len(buffered) // self._chunk * self._chunk
+            for start in range(0, full, self._chunk):
+                self._filter(buffered[start:start + self._chunk])
+            self._pending = [buffered[full:]] if full < len(buffered) else []
+            self._pending_frames = len(buffered) - full
+
+    def _measure_peaks(self, chunk):
+        """Sample peak, and the interpolated (true) peak between samples via the polyphase filter."""
+        peak = float(np.abs(chunk).max())
+        self.sample_peak = max(self.sample_peak, peak)
+        if self._tp_filter is not None:
+            signal = np.concatenate([self._tp_history, chunk])
+            self._tp_history = signal[-(_TRUE_PEAK_TAPS_PER_PHASE - 1):]
+            for channel in range(self.channels):
+                windows = np.lib.stride_tricks.sliding_window_view(signal[:, channel], _TRUE_PEAK_TAPS_PER_PHASE)
+                peak = max(peak, float(np.abs(windows @ self._tp_filter.T).max()))
+        self.true_peak = max(self.true_peak, peak)
+
+    def _filter(self, chunk):
+        """K-weights one chunk (overlap-add) and accumulates sub-block powers and peaks."""
+        self._measure_peaks(chunk)
+        spectrum = np.fft.rfft(chunk, self._fft_size, axis=0)
+        out = np.fft.irfft(spectrum * self._fir_spectrum[:, None], self._fft_size, axis=0)
+        n, tail = len(chunk), len(self._overlap)
+        out[:tail] += self._overlap
+        self._overlap = out[n:n + tail].copy()
+        self._accumulate(out[:n])
+
+    def _accumulate(self, weighted):
+        power = np.square(weighted) @ self.weights  # Channel-weighted power per frame
+        if self._partial_frames:
+            need = self.sub_block - self._partial_frames
+            head, power = power[:need], power[need:]
+            self._partial_power += float(head.sum())
+            self._partial_frames += len(head)
+            if self._partial_frames < self.sub_block:
+                return
+            self._sub_blocks.append(self._partial_power)
+            self._partial_power, self._partial_frames = 0.0, 0
+        full = len(power) // self.sub_block
+        if full:
+            self._sub_blocks.extend(power[:full * self.sub_block].reshape(full, self.sub_block).sum(axis=1).tolist())
+        rest = power[full * self.sub_block:]
+        self._partial_power, self._partial_frames = float(rest.sum()), len(rest)
+
+    def _flush(self):
+        """Filters what is still pending (a final partial chunk) without ending the track."""
+        if not self._pending_frames:
+            return self._sub_blocks, self._overlap
+        state = (list(self._sub_blocks), self._overlap, self._partial_power, self._partial_frames, self._tp_history)
+        self._filter(np.concatenate(self._pending))
+        sub_blocks = self._sub_blocks
+        # Peaks only grow, so measuring the pending frames again later is harmless
+        self._sub_blocks, self._overlap, self._partial_power, self._partial_frames, self._tp_history = state
+        return sub_blocks, self._overlap
+
+    def _window_loudness(self, sub_blocks, length):
+        """Mean-square loudness of every `length`-sub-block window, hopping one sub-block."""
+        powers = np.asarray(sub_blocks, dtype=np.float64)
+        if len(powers) < length:
+            return np.empty(0)
+        sums = np.convolve(powers, np.ones(length), mode='valid')
+        return sums / (length * self.sub_block)
+
+    def integrated(self, sub_blocks=None):
+        """Gated integrated loudness in LUFS (None if less than one 400 ms block)."""
+        sub_blocks = self._flush()[0] if sub_blocks is None else sub_blocks
+        power = self._window_loudness(sub_blocks, int(round(BLOCK_SEC / SUB_BLOCK_SEC)))
+        power = power[_lufs(power) > ABSOLUTE_GATE_LUFS]
+        if not len(power):
+            return None
+        gate = _lufs(power.mean()) + RELATIVE_GATE_LU
+        power = power[_lufs(power) > gate]
+        return float(_lufs(power.mean()))
+
+    def loudness_range(self, sub_blocks=None):
+        """EBU Tech 3342 loudness range in LU (None if shorter than one 3 s window)."""
+        sub_blocks = self._flush()[0] if sub_blocks is None else sub_blocks
+        power = self._window_loudness(sub_blocks, int(round(SHORT_TERM_SEC / SUB_BLOCK_SEC)))
+        power = power[_lufs(power) > ABSOLUTE_GATE_LUFS]
+        if not len(power):
+            return None
+        gate = _lufs(power.mean()) + LRA_RELATIVE_GATE_LU
+        levels = _lufs(power[_lufs(power) > gate])
+        low, high = np.percentile(levels, [10, 95])
+        return float(high - low)
+
+    def result(self, reference_lufs=REPLAYGAIN_REFERENCE_LUFS):
+        """Measurements so far, as a JSON-friendly dict (None values when too short to measure)."""
+        sub_blocks = self._flush()[0]
+        integrated = self.integrated(sub_blocks)
+        true_peak = self.true_peak
+        return {
+            'integrated_lufs': integrated,
+            'loudness_range_lu': self.loudness_range(sub_blocks),
+            'true_peak': true_peak,
+            'true_peak_dbtp': float(20.0 * np.log10(true_peak)) if true_peak > 0 else None,
+            'sample_peak': self.sample_peak,
+            'track_gain_db': reference_lufs - integrated if integrated is not None else None,
+            'reference_lufs': reference_lufs,
+            'seconds': self.frames / self.samplerate,
+        }
+
+
+def analyze_file(path, reference_lufs=REPLAYGAIN_REFERENCE_LUFS, chunk_frames=65536):
+    """Loudness of a whole audio file (a separate decode pass; captures are measured while written)."""
+    import soundfile as sf
+    from spufify.core.segment_store import map_float_wav
+    mapped = map_float_wav(path)
+    if mapped is not None:
+        audio, samplerate = mapped
+        analyzer = LoudnessAnalyzer(samplerate, audio.shape[1])
+        for start in range(0, len(audio), chunk_frames):
+            analyzer.feed(audio[start:start + chunk_frames])
+        return analyzer.result(reference_lufs)
+    with sf.SoundFile(path) as f:
+        analyzer = LoudnessAnalyzer(f.samplerate, f.channels)
+        for block in f.blocks(blocksize=chunk_frames, dtype='float32', always_2d=True):
+            analyzer.feed(block)
+    return analyzer.result(reference_lufs)
+
+
+def replaygain_tags(loudness):
+    """ReplayGain 2.0 tag values for a LoudnessAnalyzer result ({} if it could not be measured)."""
+    if not loudness or loudness.get('track_gain_db') is None:
+        return {}
+    return {
+        'REPLAYGAIN_TRACK_GAIN': f"{loudness['track_gain_db']:+.2f} dB",
+        'REPLAYGAIN_TRACK_PEAK': f"{loudness['true_peak']:.6f}",
+        'REPLAYGAIN_REFERENCE_LOUDNESS': f"{loudness['reference_lufs']:.2f} LUFS",
+    }
@@ -0,0 +1,128 @@
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """
+    Decides when the Controller next asks Spotify for the playback state.
+
+    Nothing playing, paused playback and manual pause are polled rarely. While a
+    track plays, its end is predicted from progress_ms/duration_ms and polls
+    tighten just before it so the change is seen promptly. Rate limiting (429)
+    backs off exponentially, never sooner than Retry-After.
+    """
+    # Keep polling tightly this long past the predicted boundary before trusting the estimate less
+    BOUNDARY_GRACE_SEC = 5.0
+
+    def __init__(self, idle_interval=5.0, playing_interval=5.0, boundary_interval=0.25, boundary_window=2.0,
+                 fixed_interval=1.0, max_backoff=60.0, adaptive=True, clock=time.monotonic, history_size=50):
+        self.idle_interval = idle_interval
+        self.playing_interval = playing_interval
+        self.boundary_interval = boundary_interval
+        self.boundary_window = boundary_window
+        self.fixed_interval = fixed_interval
+        self.max_backoff = max_backoff
+        self.adaptive = adaptive
+        self.clock = clock
+
+        self.mode = "idle"  # idle | playing | ad
+        self.track_id = None
+        self.predicted_boundary = None  # clock() time the current track should end
+        self.last_interval = None
+        self._not_before = 0.0
+        self._backoff_level = 0
+
+        # Measurements
+        self.polls = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.boundary_latencies = deque(maxlen=history_size)
+
+    def observe(self, track_info, polled_at=None, user_paused=False):
+        """
+        Feed one successful poll.
+
+        Args:
+            track_info: Result of SpotifyClient.get_current_track()
+            polled_at: clock() time the request was sent (progress_ms refers to about then)
+            user_paused: Recording is manually paused; nothing to track closely
+        """
+        polled_at = self.clock() if polled_at is None else polled_at
+        self.polls += 1
+        self._backoff_level = 0
+
+        track_id = track_info.get('track_id') if track_info else None
+        if track_id != self.track_id:
+            # A change seen at or after the predicted end is a natural boundary; earlier means a skip
+            if (self.track_id and track_id and self.predicted_boundary is not None
+                    and polled_at >= self.predicted_boundary - self.boundary_window):
+                self.boundary_latencies.append(max(0.0, polled_at - self.predicted_boundary))
+            self.track_id = track_id
+
+        if not track_info or not track_info.get('is_playing') or user_paused:
+            self.mode = "idle"
+            self.predicted_boundary = None
+        elif track_info.get('is_ad'):
+            self.mode = "ad"
+            self.predicted_boundary = None
+        else:
+            self.mode = "playing"
+            duration_ms = track_info.get('duration_ms')
+            progress_ms = track_info.get('progress_ms')
+            if duration_ms and progress_ms is not None:
+                self.predicted_boundary = polled_at + max(0, duration_ms - progress_ms) / 1000.0
+            else:
+                self.predicted_boundary = None
+
+    def on_rate_limited(self, retry_after=None):
+        """Spotify answered 429; hold off for Retry-After or the next backoff step, whichever is longer."""
+        self.polls += 1
+        self.rate_limited += 1
+        backoff = min(self.max_backoff, self.fixed_interval * (2 ** self._backoff_level))
+        self._backoff_level += 1
+        delay = max(backoff, retry_after or 0.0)
+        self._not_before = self.clock() + delay
+        logger.warning(f"Spotify rate limit hit, backing off {delay:.1f}s")
+
+    def on_error(self):
+        self.polls += 1
+        self.errors += 1
+
+    def next_interval(self, now=None):
+        """Seconds to wait before the next poll."""
+        now = self.clock() if now is None else now
+        if not self.adaptive:
+            interval = self.fixed_interval
+        elif self.mode == "idle":
+            interval = self.idle_interval
+        elif self.mode == "ad" or self.predicted_boundary is None:
+            # Ads report no useful duration; keep the old cadence so the next song is caught
+            interval = self.fixed_interval
+        else:
+            remaining = self.predicted_boundary - now
+            if remaining > self.boundary_window:
+                interval = min(self.playing_interval, remaining - self.boundary_window)
+            elif remaining > -self.BOUNDARY_GRACE_SEC:
+                interval = self.boundary_interval
+            else:
+                interval = self.fixed_interval
+        interval = max(interval, self._not_before - now, self.boundary_interval)
+        self.last_interval = interval
+        return interval
+
+    def stats(self):
+        latencies = list(self.boundary_latencies)
+        return {
+            'adaptive': self.adaptive,
+            'mode': self.mode,
+            'polls': self.polls,
+            'rate_limited': self.rate_limited,
+            'errors': self.errors,
+            'last_interval_s': self.last_interval,
+            'boundaries_detected': len(latencies),
+            'avg_boundary_latency_ms': sum(latencies) / len(latencies) * 1000 if latencies else None,
+            'max_boundary_latency_ms': max(latencies) * 1000 if latencies else None,
+        }
@@ -1,14 +1,25 @@
 import os
+import time
+import weakref
 import threading
+import contextlib
 import subprocess
 import logging
+import soundfile as sf
 from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC, TYER
-import requests
-from io import BytesIO
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC, TYER, TXXX
 from spufify.config import Config
+from spufify.utils.cover_cache import get_cover_cache
+from spufify.utils.metrics import get_metrics, DURATION_BUCKETS
+from spufify.core.encode_pool import EncodePool, low_priority
+from spufify.core.encoding import (
+    output_profiles, ffmpeg_output_args, use_native_encoder, output_bit_depth,
+    transcode_native, transcode_fanout
+)
+from spufify.core.library import get_library_index, describe_take, chroma_fingerprint
+from spufify.core.loudness import analyze_file, replaygain_tags
+from spufify.core.journal import get_job_journal, QUEUED, ENCODED, TAGGED, DONE, DISCARDED
 from mutagen.flac import FLAC, Picture
-import time
 
 logger = logging.getLogger(__name__)
 
@@ -17,31 +28,62 @@ class Processor:
     Module C: Audio Processor
     Handles encoding (WAV -> MP3/FLAC) and Tagging.
     Output is saved to the configured output directory.
+    Jobs run on a bounded EncodePool (can be shared between processors).
+    `name` labels its metrics when it belongs to one session; a processor
+    shared by every session reports unlabeled.
     """
-    def __init__(self):
-        self.queue = []
-        self.max_retries = 3
-        # In a real app we might use a dedicated worker thread checking the queue
+    def __init__(self, pool=None, name=None):
+        self.name = name
+        self.pool = pool or EncodePool(workers=Config.ENCODE_WORKERS or None, max_queue=Config.ENCODE_QUEUE_SIZE)
+        # Output path -> [lock, users]: jobs for the same file run one after the other
+        self._output_locks = {}
+        self._output_locks_lock = threading.Lock()
+        metrics = get_metrics()
+        labels = {'session': name} if name else None
+        self._tracks_saved = metrics.counter(
+            'spufify_tracks_saved_total', "Tracks encoded, tagged and saved", labels=labels
+        )
+        self._errors = metrics.counter('spufify_processing_errors_total', "Encode/tag jobs that failed", labels=labels)
+        pool_ref = weakref.ref(self.pool)
+        metrics.gauge(
+            'spufify_encode_queue_depth', "Tracks waiting for an encode worker",
+            fn=lambda: pool_ref().jobs.qsize() if pool_ref() else None, labels=labels
+        )
+        metrics.gauge(
+            'spufify_encode_active_jobs', "Encode jobs running",
+            fn=lambda: pool_ref().active if pool_ref() else None, labels=labels
+        )
+
+    def _observe(self, name, help, fmt, seconds):
+        """Per-format duration histogram (encode, tag)."""
+        get_metrics().histogram(name, help, labels={'format': fmt}, buckets=DURATION_BUCKETS).observe(seconds)
     
     def _download_cover_with_retry(self, url):
-        """Download cover art with retry logic"""
-        for attempt in range(self.max_retries):
-            try:
-                resp = requests.get(url, timeout=10)
-                if resp.status_code == 200:
-                    return resp.content
-                else:
-                    logger.warning(f"Cover download returned status {resp.status_code} (attempt {attempt + 1})")
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Cover download error (attempt {attempt + 1}/{self.max_retries}): {e}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(1 * (attempt + 1))
-        logger.error(f"Failed to download cover after {self.max_retries} attempts")
+        """Cover art bytes from the shared cache (downloaded with retry on a miss)"""
+        return get_cover_cache().get(url)
+
+    def _cover_data(self, metadata):
+        """Cover art for a track: bytes carried in the metadata (batch re-tag) or fetched from its URL."""
+        if metadata.get('cover_data'):
+            return metadata['cover_data']
+        if metadata.get('cover_url'):
+            return self._download_cover_with_retry(metadata['cover_url'])
         return None
         
+    def _with_loudness(self, metadata, path):
+        """Adds the track's loudness if the recorder did not measure it (e.g. a job recovered after a crash)."""
+        if not Config.REPLAYGAIN or metadata.get('loudness'):
+            return metadata
+        try:
+            return dict(metadata, loudness=analyze_file(path, reference_lufs=Config.REPLAYGAIN_REFERENCE_LUFS))
+        except Exception as e:
+            logger.warning(f"Could not measure loudness of {os.path.basename(path)}: {e}")
+            return metadata
+
     def process_track(self, wav_path, metadata, source_sample_rate=None):
         """
-        Starts processing in a background thread to avoid blocking UI/Recorder.
+        Queues processing on the encode pool to avoid blocking UI/Recorder.
+        Never waits, even with the pool's queue full (the capture writer calls this).
         
         Args:
             wav_path: Path to the source WAV file
@@ -50,82 +92,266 @@ class Processor:
         """
         if source_sample_rate is None:
             source_sample_rate = Config.SAMPLE_RATE
-        t = threading.Thread(target=self._process_task, args=(wav_path, metadata, source_sample_rate))
-        t.start()
+        self._journal(wav_path, QUEUED, kind='wav', metadata=metadata, sample_rate=source_sample_rate)
+        self.pool.submit(
+            self._process_task, wav_path, metadata, source_sample_rate, label=metadata.get('title'), block=False
+        )
+
+    def get_stats(self):
+        """Encode queue depth and per-job timings."""
+        return self.pool.stats()
+
+    def shutdown(self, wait=True):
+        """Stops the encode pool; with wait=True, pending tracks are encoded first."""
+        self.pool.shutdown(wait=wait)
+        
+    def finish_stream(self, encoded_path, metadata):
+        """
+        Finalizes a track that was encoded while recording (streaming mode):
+        moves it to its final name and tags it on the encode pool.
+        """
+        self._journal(encoded_path, QUEUED, kind='stream', metadata=metadata)
+        self.pool.submit(self._finish_stream_task, encoded_path, metadata, label=metadata.get('title'), block=False)
+
+    def _output_path(self, metadata, ext):
+        artist = metadata.get('artist', 'Unknown')
+        title = metadata.get('title', 'Untitled')
         
+        safe_artist = self._sanitize(artist)
+        safe_title = self._sanitize(title)
+        
+        filename = f"{safe_artist} - {safe_title}.{ext}"
+        return filename, os.path.join(Config.OUTPUT_DIR, filename)
+
+    @contextlib.contextmanager
+    def _output_lock(self, output_path):
+        """
+        Held from the library check to registering the take, so two jobs for the same
+        file (e.g. two sessions recording the same song at once) can't both pass
+        _keep_take and write it together; the second sees the first's take.
+        """
+        with self._output_locks_lock:
+            entry = self._output_locks.setdefault(output_path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._output_locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._output_locks[output_path]
+
+    def _extra_outputs(self, metadata, exts):
+        """(ext, path) of the extra output profiles of a track, each in its own OUTPUT_DIR/<ext> folder."""
+        outputs = []
+        for ext in exts:
+            filename, _ = self._output_path(metadata, ext)
+            folder = os.path.join(Config.OUTPUT_DIR, ext)
+            os.makedirs(folder, exist_ok=True)
+            outputs.append((ext, os.path.join(folder, filename)))
+        return outputs
+
+    def _apply_tags(self, ext, output_path, metadata):
+        started = time.perf_counter()
+        if ext == 'mp3':
+            self._apply_tags_mp3(output_path, metadata)
+        elif ext == 'flac':
+            self._apply_tags_flac(output_path, metadata)
+        else:
+            return
+        self._observe('spufify_tag_seconds', "Tagging time per output file (cover fetch included)", ext,
+                      time.perf_counter() - started)
+
+    def _audio_seconds(self, path):
+        try:
+            return sf.info(path).duration
+        except Exception as e:
+            logger.debug(f"Could not read length of {path}: {e}")
+            return 0.0
+
+    def _keep_take(self, metadata, take):
+        """False if the library already holds an equal or better take of this track."""
+        if not Config.LIBRARY_INDEX or not metadata.get('track_id'):
+            return True
+        if get_library_index().should_keep(metadata['track_id'], take):
+            return True
+        logger.info(f"Library already has an equal or better take, discarding: {metadata['title']}")
+        return False
+
+    def _register_take(self, metadata, take):
+        """Records the saved take in the library; removes the takes it supersedes."""
+        if not Config.LIBRARY_INDEX or not metadata.get('track_id'):
+            return
+        try:
+            for superseded in get_library_index().record(metadata['track_id'], take):
+                if os.path.exists(superseded):
+                    os.remove(superseded)
+                    logger.info(f"Replaced lower quality take: {os.path.basename(superseded)}")
+        except Exception as e:
+            logger.error(f"Error updating library index: {e}", exc_info=True)
+
+    def _journal(self, path, state, **fields):
+        """Records a job's progress in the crash journal (so a restart resumes from this step)."""
+        if not Config.CRASH_JOURNAL:
+            return
+        try:
+            get_job_journal().update(path, state, **fields)
+        except Exception as e:
+            logger.error(f"Error updating job journal: {e}")
+
+    def _journal_failure(self, path, error):
+        """Counts a failed attempt; the job stays at its last completed step and is retried on restart."""
+        self._errors.inc()
+        if not Config.CRASH_JOURNAL:
+            return
+        journal = get_job_journal()
+        job = journal.get(path)
+        if job:
+            journal.update(path, job['state'], attempts=job.get('attempts', 0) + 1, error=str(error)[:500])
+
+    def resume_job(self, job):
+        """Queues the remaining steps of a job interrupted by a crash (see JobJournal.recover)."""
+        self.pool.submit(self._resume_task, job, label=(job.get('metadata') or {}).get('title'))
+
+    def _resume_task(self, job):
+        source_path, metadata = job['path'], job['metadata']
+        output_path, take = job.get('output_path'), job.get('take')
+        if job.get('loudness'):
+            metadata = dict(metadata, loudness=job['loudness'])
+        try:
+            if output_path and job['state'] == ENCODED and os.path.exists(output_path):
+                with self._output_lock(output_path):
+                    ext = os.path.splitext(output_path)[1].lstrip('.').lower()
+                    extra = [tuple(output) for output in job.get('extra_outputs') or [] if os.path.exists(output[1])]
+                    logger.info(f"Resuming tagging: {os.path.basename(output_path)}")
+                    self._tag_and_register(source_path, ext, output_path, metadata, take, extra)
+                return
+            if job['state'] == ENCODED:  # Output missing
+                if job.get('kind') != 'stream' and os.path.exists(source_path):
+                    self._process_task(source_path, metadata, job.get('sample_rate'))  # Encode again
+                else:
+                    self._journal(source_path, DISCARDED)
+            else:  # TAGGED: only the cleanup was left
+                self._cleanup_source(source_path, output_path)
+        except Exception as e:
+            logger.error(f"Error resuming job {source_path}: {e}", exc_info=True)
+            self._journal_failure(source_path, e)
+
     def _process_task(self, wav_path, metadata, source_sample_rate):
         try:
             logger.info(f"Processing: {metadata['title']} - {metadata['artist']}")
             
-            # 1. Conversion logic using FFmpeg directly
-            artist = metadata.get('artist', 'Unknown')
-            title = metadata.get('title', 'Untitled')
+            profiles = output_profiles()
+            ext = profiles[0]
+            filename, output_path = self._output_path(metadata, ext)
+            logger.debug(f"Source sample rate: {source_sample_rate} Hz")
             
-            safe_artist = self._sanitize(artist)
-            safe_title = self._sanitize(title)
+            with self._output_lock(output_path):
+                take = describe_take(output_path, metadata, ext, source_sample_rate, self._audio_seconds(wav_path))
+                if not self._keep_take(metadata, take):
+                    os.remove(wav_path)
+                    self._journal(wav_path, DISCARDED)
+                    return
+                if Config.LIBRARY_INDEX:
+                    take['fingerprint'] = chroma_fingerprint(wav_path)
+                metadata = self._with_loudness(metadata, wav_path)
             
-            ext = Config.OUTPUT_FORMAT.lower()
-            if ext not in ['mp3', 'flac', 'wav']:
-                ext = 'flac' # Default to lossless if unknown
+                extra = self._extra_outputs(metadata, profiles[1:])
+                encode_started = time.perf_counter()
+                if extra:
+                    # 1. Every output profile from one read of the capture
+                    transcode_fanout(wav_path, [(ext, output_path)] + extra, source_sample_rate, dither=Config.DITHER)
+                    logger.debug(f"Fan-out encode: {', '.join(profile.upper() for profile in profiles)}")
+                elif use_native_encoder(ext):
+                    # 1. Lossless conversion in-process (no ffmpeg spawn)
+                    bit_depth = output_bit_depth(ext)
+                    transcode_native(wav_path, output_path, ext, bit_depth=bit_depth, dither=Config.DITHER)
+                    logger.debug(f"Native {ext.upper()} encode: {bit_depth}-bit{' dithered' if Config.DITHER else ''}")
+                else:
+                    # 1. Conversion logic using FFmpeg directly
+                    # Build ffmpeg command with high-quality settings using detected sample rate
+                    cmd = ['ffmpeg', '-y', '-i', wav_path] + ffmpeg_output_args(ext, source_sample_rate) + [output_path]
                 
-            filename = f"{safe_artist} - {safe_title}.{ext}"
-            output_path = os.path.join(Config.OUTPUT_DIR, filename)
+                    # Run FFmpeg with better error handling (below normal priority so capture isn't starved)
+                    cmd, popen_kwargs = low_priority(cmd) if Config.ENCODE_LOW_PRIORITY else (cmd, {})
+                    result = subprocess.run(cmd, capture_output=True, text=True, **popen_kwargs)
+                    if result.returncode != 0:
+                        logger.error(f"FFmpeg conversion failed: {result.stderr}")
+                        self._journal_failure(wav_path, result.stderr)
+                        return
             
-            # Build ffmpeg command with high-quality settings using detected sample rate
-            cmd = ['ffmpeg', '-y', '-i', wav_path]
+                self._observe('spufify_encode_seconds', "Encode time per track", '+'.join(profiles) if extra else ext,
+                              time.perf_counter() - encode_started)
+                logger.info(f"Conversion complete: {filename}")
+                self._journal(
+                    wav_path, ENCODED, output_path=output_path, take=take, extra_outputs=extra,
+                    loudness=metadata.get('loudness')
+                )
             
-            logger.debug(f"Source sample rate: {source_sample_rate} Hz")
+                # 3. Tagging, 4. Clean up WAV
+                self._tag_and_register(wav_path, ext, output_path, metadata, take, extra)
             
-            if ext == 'mp3':
-                # Use CBR 320kbps with high-quality encoding
-                cmd.extend([
-                    '-codec:a', 'libmp3lame',
-                    '-b:a', '320k',
-                    '-q:a', '0',  # Highest quality (0-9, lower is better)
-                    '-ar', str(source_sample_rate),  # Preserve source sample rate
-                    output_path
-                ])
-            elif ext == 'flac':
-                # Use compression level 8 (best compression, lossless)
-                cmd.extend([
-                    '-compression_level', '8',
-                    '-ar', str(source_sample_rate),  # Preserve source sample rate
-                    output_path
-                ])
-            else: # wav
-                # PCM 16-bit (standard CD quality)
-                cmd.extend([
-                    '-codec:a', 'pcm_s16le',
-                    '-ar', str(source_sample_rate),  # Preserve source sample rate
-                    output_path
-                ])
+        except Exception as e:
+            logger.error(f"Error processing {wav_path}: {e}", exc_info=True)
+            self._journal_failure(wav_path, e)
 
-            
-            # Run FFmpeg with better error handling
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                logger.error(f"FFmpeg conversion failed: {result.stderr}")
-                return
-            
-            logger.info(f"Conversion complete: {filename}")
-            
-            # 3. Tagging
-            if ext == 'mp3':
-                self._apply_tags_mp3(output_path, metadata)
-            elif ext == 'flac':
-                self._apply_tags_flac(output_path, metadata)
-                
-            logger.info(f"Successfully saved: {filename}")
-            
-            # 4. Clean up WAV
+    def _tag_and_register(self, source_path, ext, output_path, metadata, take, extra_outputs=()):
+        """Tagging and bookkeeping once the outputs exist. Safe to repeat after a crash."""
+        if extra_outputs:
+            # One cover fetch shared by every profile
+            metadata = dict(metadata, cover_data=self._cover_data(metadata))
+        self._apply_tags(ext, output_path, metadata)
+        for extra_ext, extra_path in extra_outputs:
+            self._apply_tags(extra_ext, extra_path, metadata)
+        logger.info(f"Successfully saved: {os.path.basename(output_path)}")
+        self._tracks_saved.inc()
+        if take:
+            self._register_take(metadata, take)
+        self._journal(source_path, TAGGED, output_path=output_path)
+        self._cleanup_source(source_path, output_path)
+
+    def _cleanup_source(self, source_path, output_path):
+        if source_path != output_path and os.path.exists(source_path):
             try:
-                os.remove(wav_path)
-                logger.debug(f"Cleaned up temporary WAV: {wav_path}")
+                os.remove(source_path)
+                logger.debug(f"Cleaned up temporary WAV: {source_path}")
             except Exception as e:
                 logger.warning(f"Failed to delete temporary WAV: {e}")
-            
+                return
+        self._journal(source_path, DONE)
+
+    def _finish_stream_task(self, encoded_path, metadata):
+        try:
+            ext = os.path.splitext(encoded_path)[1].lstrip('.').lower()
+            filename, output_path = self._output_path(metadata, ext)
+            with self._output_lock(output_path):
+                take = describe_take(
+                    output_path, metadata, ext, sf.info(encoded_path).samplerate, self._audio_seconds(encoded_path)
+                )
+                if not self._keep_take(metadata, take):
+                    os.remove(encoded_path)
+                    self._journal(encoded_path, DISCARDED)
+                    return
+                if Config.LIBRARY_INDEX:
+                    take['fingerprint'] = chroma_fingerprint(encoded_path)
+                os.replace(encoded_path, output_path)
+                metadata = self._with_loudness(metadata, output_path)
+                # Extra profiles from the streamed take, all in one pass
+                extra = self._extra_outputs(metadata, [profile for profile in output_profiles() if profile != ext])
+                if extra:
+                    encode_started = time.perf_counter()
+                    transcode_fanout(output_path, extra, take['sample_rate'], dither=Config.DITHER)
+                    self._observe('spufify_encode_seconds', "Encode time per track", '+'.join(e for e, _ in extra),
+                                  time.perf_counter() - encode_started)
+                self._journal(
+                    encoded_path, ENCODED, output_path=output_path, take=take, extra_outputs=extra,
+                    loudness=metadata.get('loudness')
+                )
+                self._tag_and_register(encoded_path, ext, output_path, metadata, take, extra)
         except Exception as e:
-            logger.error(f"Error processing {wav_path}: {e}", exc_info=True)
+            logger.error(f"Error finalizing streamed track {encoded_path}: {e}", exc_info=True)
+            self._journal_failure(encoded_path, e)
 
     def _apply_tags_mp3(self, file_path, metadata):
         try:
@@ -140,23 +366,25 @@ class Processor:
             audio.tags.add(TIT2(encoding=3, text=metadata['title']))
             audio.tags.add(TPE1(encoding=3, text=metadata['artist']))
             audio.tags.add(TALB(encoding=3, text=metadata['album']))
+            if Config.REPLAYGAIN:
+                for key, value in replaygain_tags(metadata.get('loudness')).items():
+                    audio.tags.add(TXXX(encoding=3, desc=key, text=value))
             
             # Cover Art
-            if metadata.get('cover_url'):
-                cover_data = self._download_cover_with_retry(metadata['cover_url'])
-                if cover_data:
-                    try:
-                        audio.tags.add(
-                            APIC(
-                                encoding=3, # 3 is for utf-8
-                                mime='image/jpeg', # or image/png
-                                type=3, # 3 is for the cover image
-                                desc=u'Cover',
-                                data=cover_data
-                            )
+            cover_data = self._cover_data(metadata)
+            if cover_data:
+                try:
+                    audio.tags.add(
+                        APIC(
+                            encoding=3, # 3 is for utf-8
+                            mime='image/jpeg', # or image/png
+                            type=3, # 3 is for the cover image
+                            desc=u'Cover',
+                            data=cover_data
                         )
-                    except Exception as e:
-                        logger.error(f"Error adding cover to MP3: {e}")
+                    )
+                except Exception as e:
+                    logger.error(f"Error adding cover to MP3: {e}")
 
             audio.save()
             logger.debug(f"MP3 tags applied successfully")
@@ -172,20 +400,22 @@ class Processor:
             audio['title'] = metadata['title']
             audio['artist'] = metadata['artist']
             audio['album'] = metadata['album']
+            if Config.REPLAYGAIN:
+                audio.update(replaygain_tags(metadata.get('loudness')))
             
             # Cover Art
-            if metadata.get('cover_url'):
-                cover_data = self._download_cover_with_retry(metadata['cover_url'])
-                if cover_data:
-                    try:
-                        image = Picture()
-                        image.type = 3
-                        image.mime = "image/jpeg"
-                        image.desc = "Cover"
-                        image.data = cover_data
-                        audio.add_picture(image)
-                    except Exception as e:
-                        logger.error(f"Error adding cover to FLAC: {e}")
+            cover_data = self._cover_data(metadata)
+            if cover_data:
+                try:
+                    image = Picture()
+                    image.type = 3
+                    image.mime = "image/jpeg"
+                    image.desc = "Cover"
+                    image.data = cover_data
+                    audio.clear_pictures()  # Re-tagging (e.g. a resumed job) must not stack covers
+                    audio.add_picture(image)
+                except Exception as e:
+                    logger.error(f"Error adding cover to FLAC: {e}")
 
             audio.save()
             logger.debug(f"FLAC tags applied successfully")
@@ -1,43 +1,189 @@
-import soundcard as sc
 import numpy as np
 import threading
 import time
-import queue
-import soundfile as sf
 import os
+import shutil
 import logging
-import warnings
+import weakref
+from collections import deque, namedtuple
 from spufify.config import Config
 from spufify.core.processor import Processor
-
-# Suppress soundcard discontinuity warnings (cosmetic, doesn't affect recording quality)
-warnings.filterwarnings('ignore', category=sc.SoundcardRuntimeWarning, message='data discontinuity in recording')
+from spufify.core.encoding import StreamingEncoder, NativeEncoder, output_extension, use_native_encoder, output_bit_depth
+from spufify.core.ring_buffer import RingBuffer
+from spufify.core.block_tuner import BlockSizeTuner
+from spufify.core.sources import LoopbackSource
+from spufify.core.boundary import find_cut
+from spufify.core.silence import SilenceAnalyzer
+from spufify.core.ad_detector import AdDetector
+from spufify.core.loudness import LoudnessAnalyzer
+from spufify.core.resample import StreamResampler
+from spufify.core.journal import JournalWavWriter, get_job_journal, RECORDING, DISCARDED
+from spufify.core.segment_store import MappedWavWriter
+from spufify.utils.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
+# Writer instruction applied when the writer reaches absolute ring frame `position`.
+# `window` > 0 lets the writer move a split to the best cut within +/- window frames.
+_Event = namedtuple('_Event', 'position action metadata window')
+
+
+class _Reconfigure:
+    """A pending reconfigure(): picked up by the capture thread between two reads."""
+    def __init__(self, source, block_size):
+        self.source = source
+        self.block_size = block_size
+        self.requested_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
 
 class Recorder:
     """
     Module A: Audio Capture
-    Captures loopback audio and manages buffers.
+    Captures audio from a CaptureSource (system loopback by default) and manages buffers.
+
+    Capture never stops: every frame goes through the ring buffer, and the writer
+    trails the capture position by SPLIT_LOOKBACK_SEC. Start/pause/split requests
+    are queued as events at absolute frame positions (back-dated from Spotify's
+    progress_ms), so a track change noticed late still cuts in the right place
+    and no captured audio is thrown away.
     """
-    def __init__(self):
+    # Writer drains the ring buffer in slices of at least this much audio
+    DRAIN_MIN_MS = 50
+
+    def __init__(self, source=None, processor=None, name=None):
         self.recording = False
+        self.source = source  # CaptureSource; None = system loopback (re-resolved on every engine start)
+        self.name = name  # Session name (multi-session runs): labels its metrics and temp files
         self.paused = False
-        self.buffer_queue = queue.Queue()
+        self.ring = None  # Allocated by the capture thread once the device format is known
+        self.block_tuner = None
+        self._ring_ready = threading.Event()
         self.capture_thread = None
         self.processing_thread = None
         self.current_metadata = None
-        self.processor = Processor()
+        self.processor = processor or Processor(name=name)  # Sessions share one (and its encode pool)
         
-        # We'll use a temp file to store the raw WAV while recording a track
-        self.current_temp_file = os.path.join(Config.OUTPUT_DIR, "temp_recording.wav")
-        self._sf_file = None
+        # Each track is captured to its own float WAV (in the crash journal when enabled)
+        self._wav_file = None  # MappedWavWriter / JournalWavWriter
+        self._stream = None  # StreamingEncoder when STREAMING_ENCODE is on
         self._file_lock = threading.RLock()  # Reentrant lock for nested calls
         
         # Auto-detected audio parameters (will be set in _capture_loop)
         self.actual_sample_rate = Config.SAMPLE_RATE
         self.actual_channels = Config.CHANNELS
+        
+        # Hot reconfiguration (see reconfigure): the capture thread swaps source/block size between reads
+        self._capture_source = None  # Source the capture thread has open
+        self._reconfigure_request = None
+        self.reconfigurations = 0
+        self.last_reconfigure = None
+        
+        # Writer events and the state they drive (owned by the writer thread)
+        self._events = deque()
+        self._events_lock = threading.Lock()
+        self._last_event_pos = 0
+        self._queued_track_id = None  # Track of the last queued start/split
+        self._paused_progress_ms = None  # Where playback of the open track stopped (Spotify paused it)
+        self._writing = False
+        self._segment_metadata = None  # Track being written to the open output
+        self._write_rate = None  # Sample rate of the ring audio at the writer's position (lags capture after a switch)
+        self._output_rate = None  # Sample rate of the open output
+        self._resampler = None  # Set while the open output continues across a capture rate change
+        self._capture_done = threading.Event()
+        
+        # (monotonic time, ring write position) after the latest capture block, to map times to frames
+        self._clock_anchor = None
+        self._frames_per_sec = None
+        
+        # Silence handling (writer thread): silent runs are held back until sound follows,
+        # so leading/trailing silence can be trimmed and long gaps capped
+        self.silence = None  # SilenceAnalyzer, created once the capture format is known
+        self._pending_silence = []
+        self._pending_silence_frames = 0
+        self._segment_has_sound = False
+        self.silence_trimmed_frames = 0
+        self.silence_skipped_frames = 0
+        
+        # ReplayGain: loudness of the open track, measured from the blocks as they are written
+        self.loudness = None  # LoudnessAnalyzer, created once the capture format is known
+        
+        # Local ad detection: runs on the newest captured audio, ahead of the writer
+        self.ad_detector = None
+        self.on_ad_suspected = None  # Called (no args) when the audio looks like an ad; Controller polls right away
+        self._ad_suspect = None  # Unconfirmed suspicion the writer may not pass: {'position', 'reason', 'held_since'}
+        self._ad_scan_pos = 0
+        self.ads_suspected = 0
+        self.ads_confirmed = 0
+        self.ads_dismissed = 0
+        self.ads_unconfirmed = 0
+        self.ads_backdated = 0
+        
+        # Split accuracy measurements
+        self.splits = 0
+        self.late_splits = 0
+        self.split_adjust_ms = deque(maxlen=50)
+        
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """
+        The capture loop only observes read latency and the writer counts bytes;
+        buffer level, overruns and splits are read from their owners when scraped.
+        """
+        metrics = get_metrics()
+        labels = {'session': self.name} if self.name else None
+        self._read_latency = metrics.histogram(
+            'spufify_capture_read_seconds', "Time blocked in source.read() per capture block", labels=labels
+        )
+        self._bytes_written = metrics.counter(
+            'spufify_capture_bytes_written_total', "Audio bytes written to track outputs", labels=labels
+        )
+        self._stream_fallbacks = metrics.counter(
+            'spufify_stream_fallbacks_total', "Streaming encodes that failed mid-track and continued as WAV",
+            labels=labels
+        )
+        self._tracks_handed_off = metrics.counter(
+            'spufify_tracks_handed_off_total', "Recorded tracks handed to the processor", labels=labels
+        )
+        recorder = weakref.ref(self)  # The registry must not keep a replaced recorder alive
+
+        def read(getter):
+            def value():
+                owner = recorder()
+                return getter(owner) if owner is not None else None
+            return value
+
+        def ring_stat(key):
+            return read(lambda owner: owner.ring.stats()[key] if owner.ring else 0)
+
+        metrics.gauge(
+            'spufify_capture_buffer_frames', "Frames captured but not yet written (writer queue depth)",
+            fn=ring_stat('fill_frames'), labels=labels
+        )
+        metrics.gauge(
+            'spufify_capture_buffer_max_frames', "High-water mark of the capture buffer",
+            fn=ring_stat('max_fill_frames'), labels=labels
+        )
+        metrics.counter(
+            'spufify_capture_overruns_total', "Capture blocks that did not fit in the buffer",
+            fn=ring_stat('overruns'), labels=labels
+        )
+        metrics.counter(
+            'spufify_capture_dropped_frames_total', "Frames lost to buffer overruns", fn=ring_stat('dropped_frames'),
+            labels=labels
+        )
+        metrics.gauge(
+            'spufify_capture_block_frames', "Current capture block size",
+            fn=read(lambda owner: owner.block_tuner.block_size if owner.block_tuner else None), labels=labels
+        )
+        metrics.counter(
+            'spufify_splits_total', "Track splits applied", fn=read(lambda owner: owner.splits), labels=labels
+        )
+        metrics.counter(
+            'spufify_late_splits_total', "Splits whose cut point was already written",
+            fn=read(lambda owner: owner.late_splits), labels=labels
+        )
 
     def start_capture_thread(self):
         """Starts the background thread that reads from soundcard."""
@@ -46,6 +192,9 @@ class Recorder:
         
         self.recording = True # Keep thread alive
         self.paused = True # Start paused until Controller says resume
+        self._ring_ready.clear()
+        self._capture_done.clear()
+        self._reconfigure_request = None
         self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.capture_thread.start()
         
@@ -54,261 +203,870 @@ class Recorder:
         self.processing_thread.start()
         logger.info("Capture threads started.")
 
+    def wait_until_capturing(self, timeout=None):
+        """Blocks until the device is probed and open (True), or capture failed / timed out (False)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ring_ready.wait(0.05):
+            if self._capture_done.is_set() or (deadline is not None and time.monotonic() > deadline):
+                return False
+        return True
+
     def resume_recording(self):
-        # Always try to open a new file when resuming
-        self._open_wav_file()
+        """
+        Starts writing the current track. A track already open (resume after a
+        pause) continues in the same file from where playback picked up again; a
+        new one is back-dated to where it started playing. Both as far as the
+        buffered audio allows, and never before the pause.
+        """
+        metadata = self.current_metadata
+        track_id = metadata.get('track_id') if metadata else None
+        if track_id is not None and track_id == self._queued_track_id:
+            position = self._resume_position(metadata)
+        else:
+            position = self._track_start_position(metadata)
+        self._queue_event(position, 'start', metadata)
+        self._queued_track_id = track_id
+        self._paused_progress_ms = None
         self.paused = False
         logger.info("Recording resumed.")
 
     def pause_recording(self):
+        # Playback paused in Spotify (not just here): its progress_ms marks where a resume picks up
+        metadata = self.current_metadata
+        paused_playback = metadata and metadata.get('is_playing') is False
+        self._paused_progress_ms = metadata.get('progress_ms') if paused_playback else None
+        self._queue_event(self._capture_position(), 'pause')
         self.paused = True
         logger.info("Recording paused.")
 
     def stop_recording(self):
+        # Capture keeps running so the next start can be back-dated; only the writer pauses
+        self._queue_event(self._capture_position(), 'pause')
         self.paused = True
-        # Don't kill thread, just wait in paused state usually, 
-        # but for full stop we can set recording=False
-        pass
+
+    def split_track(self, metadata):
+        """
+        Ends the current track where `metadata` (the new track) started playing and
+        continues into a new output. The cut is placed from progress_ms and refined
+        against the audio around it.
+        """
+        self.current_metadata = metadata
+        self._queue_event(self._track_start_position(metadata), 'split', metadata, self._split_window())
+        self._queued_track_id = metadata.get('track_id') if metadata else None
+        self.paused = False
+
+    def skip_track(self, metadata):
+        """
+        Ends the current track where `metadata` (the new track) started playing, like
+        split_track, but records nothing of the new one (e.g. it is already in the library).
+        """
+        self.current_metadata = metadata
+        self._queue_event(self._track_start_position(metadata), 'finish', None, self._split_window())
+        self._queued_track_id = None
+        self.paused = True
+
+    def _split_window(self):
+        if not Config.SPLIT_REFINE:
+            return 0
+        return int(self.actual_sample_rate * Config.SPLIT_SEARCH_MS / 1000)
+
+    def confirm_ad(self):
+        """
+        Spotify reports an ad: the current track ended where the ad started - the
+        locally suspected transition if there is one, else the latest transition
+        seen in the last AD_BACKDATE_SEC. Finishes the track there and remembers
+        the ad's fingerprint. Without a transition the caller's pause applies as before.
+        """
+        with self._events_lock:
+            suspect, self._ad_suspect = self._ad_suspect, None
+        position = None
+        if suspect:
+            position = suspect['position']
+            self.ads_confirmed += 1
+        elif self.ad_detector:
+            since = self._capture_position() - int(Config.AD_BACKDATE_SEC * self.actual_sample_rate)
+            position = self.ad_detector.latest_candidate(since)
+            if position is not None:
+                self.ads_backdated += 1
+        if position is None:
+            return
+        self._queue_event(position, 'finish')
+        if self.ad_detector:
+            self.ad_detector.learn(position)
+
+    def dismiss_ad_suspicion(self):
+        """Spotify reports music (or nothing): an unconfirmed ad suspicion was a false alarm."""
+        if self._ad_suspect is None:
+            return
+        with self._events_lock:
+            suspect, self._ad_suspect = self._ad_suspect, None
+        if suspect:
+            self.ads_dismissed += 1
+            logger.debug(f"Ad suspicion ({suspect['reason']}) dismissed by Spotify")
+
+    def _suspect_ad(self, position, reason):
+        if self.paused or self._ad_suspect is not None:
+            return
+        with self._events_lock:
+            self._ad_suspect = {'position': position, 'reason': reason, 'held_since': None}
+        self.ads_suspected += 1
+        logger.info(f"Possible ad ({reason}), holding the writer until Spotify confirms")
+        callback = self.on_ad_suspected
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in ad suspicion callback: {e}")
+
+    def _scan_for_ads(self, ring):
+        """Feeds audio captured since the last pass to the ad detector."""
+        start = max(self._ad_scan_pos, ring.read_pos)
+        end = ring.write_pos
+        if end - start < self.ad_detector.hop:
+            return
+        for position, reason in self.ad_detector.process(ring.copy(start, end - start), start):
+            self._suspect_ad(position, reason)
+        self._ad_scan_pos = end
+
+    def _ad_gate(self, ring, horizon):
+        """Limits the writer to the suspected ad start until Spotify answers (or AD_CONFIRM_TIMEOUT_SEC passes)."""
+        suspect = self._ad_suspect
+        if suspect is None or horizon <= suspect['position']:
+            return horizon
+        if ring.read_pos < suspect['position']:
+            return suspect['position']
+        if suspect['held_since'] is None:
+            suspect['held_since'] = time.monotonic()
+        elif time.monotonic() - suspect['held_since'] > Config.AD_CONFIRM_TIMEOUT_SEC:
+            with self._events_lock:
+                if self._ad_suspect is suspect:
+                    self._ad_suspect = None
+            self.ads_unconfirmed += 1
+            logger.info("No ad confirmation from Spotify, releasing the writer")
+            return horizon
+        return suspect['position']
 
     def restart_audio_engine(self):
+        """Applies changed settings (Device, Sample Rate, Block Size) without stopping the writer (see reconfigure)."""
+        return self.reconfigure()
+
+    def reconfigure(self, source=None, block_size=None, timeout=2.0):
         """
-        Restarts the capture and processing threads to apply new settings (Device, Sample Rate, etc.)
+        Switches device, sample rate or block size at a block boundary. The
+        capture thread opens the new source between two reads, closes the old
+        one and keeps filling the same ring buffer; the writer never stops. A
+        track being recorded carries on in the same output: if the rate changed,
+        the writer switches at that frame and resamples the rest of the track to
+        the rate it started at (flagged as `resampled_from` in its metadata).
+
+        `source` replaces the capture source. None re-resolves the system
+        loopback from Config (reopened only if the device or sample rate setting
+        changed; an injected source is kept). `block_size` None = Config.BLOCK_SIZE.
+        Returns a dict describing the switch ('applied', 'switch_ms', ...).
         """
+        capturing = self.capture_thread and self.capture_thread.is_alive() and self.wait_until_capturing(timeout)
+        if not capturing or self._capture_done.is_set():
+            # Nothing running to switch (not started, or capture stopped): start over
+            if source is not None:
+                self.source = source
+            self._restart_threads()
+            return {'applied': True, 'restarted': True}
+        
+        request = _Reconfigure(source, block_size)
+        self._reconfigure_request = request
+        if not request.done.wait(timeout):
+            logger.warning("Audio engine reconfiguration still pending (capture thread busy)")
+            return {'applied': False, 'error': 'timeout'}
+        return request.result
+
+    def _restart_threads(self):
+        """Stops the capture and processing threads and starts them again (the source is reopened)."""
         logger.info("Restarting audio engine...")
+        self.stop_threads()
+            
+        # Restart
+        self.start_capture_thread()
+        logger.info("Audio engine restarted successfully.")
+
+    def stop_threads(self, timeout=2.0, finish=False):
+        """
+        Stops capture and the writer. The writer first writes out what is still
+        buffered and applies queued events (a finished track reaches the processor).
+        With `finish` (shutdown), the track being recorded is finished here too,
+        so it is handed off before the processor drains; otherwise (engine
+        restart) it stays open.
+        """
+        if finish and self.processing_thread and self.processing_thread.is_alive():
+            self.finish_track()
         self.recording = False
         self.paused = True
         
         # Wait for threads to finish
         if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join(timeout=2.0)
+            self.capture_thread.join(timeout=timeout)
             if self.capture_thread.is_alive():
                 logger.warning("Capture thread did not terminate cleanly")
             
         if self.processing_thread and self.processing_thread.is_alive():
-            self.processing_thread.join(timeout=2.0)
+            self.processing_thread.join(timeout=timeout)
             if self.processing_thread.is_alive():
                 logger.warning("Processing thread did not terminate cleanly")
-            
-        # Restart
-        self.start_capture_thread()
-        logger.info("Audio engine restarted successfully.")
+        
+        # Without `finish`, the open track (if any) stays open but is not written to until the next start
+        self._writing = False
+
+    def get_stats(self):
+        """Capture buffer counters (overruns/underruns/fill level)."""
+        stats = {
+            'sample_rate': self.actual_sample_rate,
+            'channels': self.actual_channels,
+        }
+        if self.ring:
+            stats.update(self.ring.stats())
+        if self.block_tuner:
+            stats['block'] = self.block_tuner.stats()
+        adjust = list(self.split_adjust_ms)
+        stats['splits'] = {
+            'count': self.splits,
+            'late': self.late_splits,
+            'pending_events': len(self._events),
+            'avg_adjust_ms': sum(adjust) / len(adjust) if adjust else None,
+        }
+        if self.ad_detector:
+            stats['ads'] = self.ad_detector.stats()
+            stats['ads'].update({
+                'suspected': self.ads_suspected,
+                'confirmed': self.ads_confirmed,
+                'dismissed': self.ads_dismissed,
+                'unconfirmed': self.ads_unconfirmed,
+                'backdated': self.ads_backdated,
+            })
+        stats['reconfigure'] = {
+            'count': self.reconfigurations,
+            'last': self.last_reconfigure,
+            'resampling': self._resampler is not None,
+        }
+        if self.silence:
+            stats['silence'] = self.silence.stats()
+            stats['silence']['trimmed_frames'] = self.silence_trimmed_frames
+            stats['silence']['skipped_frames'] = self.silence_skipped_frames
+        return stats
 
     def set_current_metadata(self, metadata):
         self.current_metadata = metadata
 
     def finish_track(self):
         """
-        Closes current WAV, triggers processing (Module C), and prepares for next.
+        Ends the current track at the present capture position and hands it to the
+        processor once the writer gets there. Nothing buffered is discarded.
+        """
+        logger.debug("finish_track() called")
+        self._queue_event(self._capture_position(), 'finish')
+        self._queued_track_id = None
+        self.paused = True
+
+    def _capture_position(self, at=None):
+        """Absolute ring frame captured at monotonic time `at` (default: now)."""
+        ring = self.ring
+        if ring is None:
+            return 0
+        anchor = self._clock_anchor
+        if anchor is None or at is None or not self._frames_per_sec:
+            return ring.write_pos
+        anchor_time, anchor_pos = anchor
+        return min(ring.write_pos, max(0, int(anchor_pos + (at - anchor_time) * self._frames_per_sec)))
+
+    def _track_start_position(self, metadata):
+        """Frame where the track in `metadata` started playing, from its progress_ms."""
+        if not metadata or metadata.get('progress_ms') is None:
+            return self._capture_position()
+        fetched_at = metadata.get('fetched_at')
+        position = self._capture_position(fetched_at if fetched_at is not None else time.monotonic())
+        return position - int(metadata['progress_ms'] * self.actual_sample_rate / 1000)
+
+    def _resume_position(self, metadata):
         """
-        logger.debug("finish_track() called - starting cleanup")
-        self.pause_recording()
+        Frame where playback of the paused track picked up again: the progress made
+        since the pause, counted back from when `metadata` was fetched. Paused
+        polls are slow, so the resume is usually noticed seconds late.
+        """
+        if self._paused_progress_ms is None or not metadata or metadata.get('progress_ms') is None:
+            return self._capture_position()
+        fetched_at = metadata.get('fetched_at')
+        position = self._capture_position(fetched_at if fetched_at is not None else time.monotonic())
+        played_ms = max(0, metadata['progress_ms'] - self._paused_progress_ms)
+        return position - int(played_ms * self.actual_sample_rate / 1000)  # _queue_event keeps it after the pause
+
+    def _queue_event(self, position, action, metadata=None, window=0):
+        with self._events_lock:
+            # Events apply in order; nothing can be placed before one already queued
+            position = max(int(position), self._last_event_pos)
+            self._last_event_pos = position
+            self._events.append(_Event(position, action, dict(metadata) if metadata else None, window))
+
+    def _apply_event(self, event):
+        """Runs on the writer thread once it has written everything before `event.position`."""
+        if event.action == 'pause':
+            self._writing = False
+        elif event.action == 'start':
+            track_id = event.metadata.get('track_id') if event.metadata else None
+            current = self._segment_metadata.get('track_id') if self._segment_metadata else None
+            has_output = self._stream is not None or self._wav_file is not None
+            self._segment_metadata = event.metadata
+            if not (has_output and track_id is not None and track_id == current):
+                # A different track: the interrupted one is dropped, as a partial take
+                self._reset_silence()
+                self._open_track_output()
+            self._writing = True
+        elif event.action == 'split':
+            self._finish_output()
+            self._segment_metadata = event.metadata
+            self._open_track_output()
+            self._writing = True
+        elif event.action == 'finish':
+            self._finish_output()
+            self._writing = False
+        elif event.action == 'format':
+            self._switch_write_rate(event.metadata['samplerate'])
+
+    def _finish_output(self):
+        """Closes the open output and hands it off for encoding/tagging."""
+        # Whatever silence is still held back is the track's tail: trimmed
+        has_sound = self._segment_has_sound or not Config.TRIM_SILENCE
+        self._reset_silence()
+        self._flush_resampler()
+        stream = self._close_stream()
+        wav = self._close_wav_file()
+        metadata, self._segment_metadata = self._segment_metadata, None
+        output = stream or wav
+        if output is None:
+            return
         
-        # Give a moment for _process_loop to finish any pending writes
-        time.sleep(0.15)
+        if not has_sound or not metadata:
+            if metadata:
+                logger.warning(f"Track contained only silence, discarded: {metadata['title']}")
+            self._discard_output(output.path)
+            return
+        if self.loudness:
+            # Measured while writing: the encoder side does not decode the track again
+            metadata = dict(metadata, loudness=self.loudness.result(Config.REPLAYGAIN_REFERENCE_LUFS))
         
-        # Clear the queue (don't try to write, too risky for deadlock)
-        cleared = 0
-        while not self.buffer_queue.empty():
+        if stream:
+            # Already encoded while recording - only rename + tag remain
+            self.processor.finish_stream(stream.path, metadata)
+            self._tracks_handed_off.inc()
+            logger.info(f"Streamed track handed off to processor: {metadata['title']} ({stream.frames} frames)")
+        elif wav.frames == 0:
+            logger.warning("File is empty, discarded.")
+            self._discard_output(wav.path)
+        else:
+            # Every track has its own capture file, so the next track can start right away
             try:
-                self.buffer_queue.get_nowait()
-                cleared += 1
-            except:
-                break
-        if cleared > 0:
-            logger.debug(f"Cleared {cleared} pending chunks from queue")
-        
-        self._close_wav_file()
-        logger.debug("finish_track() - file closed, processing...")
-        
-        if self.current_metadata:
-            # TRIGGER MODULE C (Processor)
-            # We rename temp to a specific temp name for this track to avoid collisions if next track starts fast
-            
-            temp_track_path = os.path.join(Config.OUTPUT_DIR, f"temp_{int(time.time())}.wav")
+                self.processor.process_track(wav.path, metadata, self._output_rate)
+                self._tracks_handed_off.inc()
+                logger.info(f"Track handed off to processor: {metadata['title']} ({wav.frames} frames)")
+            except Exception as e:
+                logger.error(f"Error handing off file: {e}", exc_info=True)
+
+    def _discard_output(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self._journal(path, DISCARDED)
+
+    def _journal(self, path, state, **fields):
+        if not Config.CRASH_JOURNAL:
+            return
+        try:
+            get_job_journal().update(path, state, **fields)
+        except Exception as e:
+            logger.error(f"Error updating job journal: {e}")
+
+    def _temp_name(self, prefix, ext):
+        """Output file name for a track being recorded; sessions recording side by side get their own."""
+        tag = f"{prefix}_{self.name}" if self.name else prefix
+        return f"{tag}_{int(time.time() * 1000)}.{ext}"
+
+    def _open_track_output(self):
+        """Opens the output for a new track: streaming encoder if enabled, WAV otherwise (and as fallback)."""
+        self._resampler = None
+        self._output_rate = self._write_rate
+        if self.loudness and self.loudness.samplerate != self._output_rate:
+            self.loudness = LoudnessAnalyzer(self._output_rate, self.actual_channels)
+        elif self.loudness:
+            self.loudness.reset()
+        if Config.STREAMING_ENCODE and self._open_stream():
+            return
+        self._open_wav_file()
+
+    def _open_stream(self):
+        with self._file_lock:
+            # A resumed track starts over, same as the WAV path
+            self._abort_stream()
+            self._abort_wav_file()
             
-            if os.path.exists(self.current_temp_file):
-                # Process all files regardless of size
-                try:
-                    file_size = os.path.getsize(self.current_temp_file)
-                    
-                    # Only skip completely empty files (0 bytes)
-                    if file_size > 0:
-                        try:
-                            # Must verify file is closed before renaming
-                            if self._sf_file and not self._sf_file.closed:
-                                self._sf_file.close()
-                                
-                            os.rename(self.current_temp_file, temp_track_path)
-                            # Offload to processor with actual sample rate
-                            self.processor.process_track(temp_track_path, self.current_metadata, self.actual_sample_rate)
-                            logger.info(f"Track handed off to processor: {self.current_metadata['title']} ({file_size/1024:.1f} KB)")
-                        except Exception as e:
-                            logger.error(f"Error handing off file: {e}", exc_info=True)
-                    else:
-                        logger.warning("File is empty (0 bytes), discarded.")
-                except Exception as e:
-                     logger.error(f"File check error: {e}", exc_info=True)
+            ext = output_extension()
+            native = use_native_encoder(ext)
+            if not native and not shutil.which('ffmpeg'):
+                logger.warning("Streaming encode needs FFmpeg in PATH, falling back to WAV")
+                return False
             
-        # Ready for next
-        pass
+            path = os.path.join(Config.OUTPUT_DIR, self._temp_name('temp_stream', ext))
+            try:
+                if native:
+                    self._stream = NativeEncoder(
+                        path, self._output_rate, self.actual_channels, ext,
+                        bit_depth=output_bit_depth(ext), dither=Config.DITHER
+                    )
+                else:
+                    self._stream = StreamingEncoder(path, self._output_rate, self.actual_channels, ext)
+                self._journal(path, RECORDING, kind='stream', metadata=self._segment_metadata)
+                logger.info(f"✓ Streaming {'native' if native else 'ffmpeg'} encoder started: {ext.upper()} {self._output_rate}Hz, {self.actual_channels}ch")
+                return True
+            except Exception as e:
+                logger.error(f"Could not start streaming encoder, falling back to WAV: {e}", exc_info=True)
+                return False
+
+    def _close_stream(self):
+        """Closes the streaming encoder. Returns it if it produced a usable file, None otherwise."""
+        with self._file_lock:
+            stream, self._stream = self._stream, None
+        if not stream:
+            return None
+        try:
+            stream.close()
+        except Exception as e:
+            logger.error(f"Streaming encode failed: {e}")
+            self._discard_output(stream.path)
+            return None
+        if stream.frames == 0:
+            logger.warning("Stream is empty, discarded.")
+            self._discard_output(stream.path)
+            return None
+        return stream
+
+    def _abort_stream(self):
+        with self._file_lock:
+            stream, self._stream = self._stream, None
+        if stream:
+            logger.debug("Aborting unfinished streaming encode")
+            try:
+                stream.abort()
+            except Exception as e:
+                logger.warning(f"Error aborting stream: {e}")
+            self._journal(stream.path, DISCARDED)
 
     def _open_wav_file(self):
         with self._file_lock:
-            # Close any existing file first
-            if self._sf_file:
-                logger.debug("Closing existing file before opening new one")
-                self._close_wav_file()
+            # Close any existing file first (an unfinished take is dropped)
+            self._abort_stream()
+            self._abort_wav_file()
             
+            if Config.CRASH_JOURNAL:
+                path = get_job_journal().capture_path(tag=self.name)
+                sync_interval = Config.JOURNAL_SYNC_SEC
+            else:
+                path = os.path.join(Config.OUTPUT_DIR, self._temp_name('temp_recording', 'wav'))
+                sync_interval = None
             try:
-                # Use SoundFile to write 32-bit FLOAT WAV with auto-detected parameters
-                self._sf_file = sf.SoundFile(
-                    self.current_temp_file, 
-                    mode='w', 
-                    samplerate=self.actual_sample_rate,  # Use detected, not config
-                    channels=self.actual_channels,        # Use detected, not config
-                    subtype='FLOAT'
+                # 32-bit FLOAT WAV with auto-detected parameters, valid on disk at every sync point
+                if Config.MMAP_CAPTURE:
+                    self._wav_file = MappedWavWriter(
+                        path, self._output_rate, self.actual_channels, sync_interval=sync_interval,
+                        segment_frames=int(self._output_rate * Config.MMAP_SEGMENT_SEC)
+                    )
+                else:
+                    self._wav_file = JournalWavWriter(
+                        path,
+                        self._output_rate,  # Use detected, not config
+                        self.actual_channels,     # Use detected, not config
+                        sync_interval=sync_interval
+                    )
+                self._journal(
+                    path, RECORDING, kind='wav', metadata=self._segment_metadata,
+                    sample_rate=self._output_rate, channels=self.actual_channels
                 )
-                logger.info(f"✓ New WAV file opened: {self.actual_sample_rate}Hz, {self.actual_channels}ch")
+                logger.info(f"✓ New WAV file opened: {self._output_rate}Hz, {self.actual_channels}ch")
             except Exception as e:
                 logger.error(f"Error opening WAV: {e}", exc_info=True)
 
     def _close_wav_file(self):
+        """Closes the capture WAV. Returns the writer (for its path and frame count), or None."""
+        with self._file_lock:
+            wav, self._wav_file = self._wav_file, None
+        if not wav:
+            return None
+        try:
+            wav.close()
+            logger.debug("WAV file closed successfully")
+        except Exception as e:
+            logger.warning(f"Error closing WAV file: {e}")
+        return wav
+
+    def _abort_wav_file(self):
         with self._file_lock:
-            if self._sf_file:
+            wav, self._wav_file = self._wav_file, None
+        if wav:
+            logger.debug("Dropping unfinished WAV capture")
+            try:
+                wav.abort()
+            except Exception as e:
+                logger.warning(f"Error removing WAV capture: {e}")
+            self._journal(wav.path, DISCARDED)
+
+    def _capture_loop(self):
+        try:
+            # Default to system loopback; benchmarks/CI inject file or synthetic sources
+            source = self.source or LoopbackSource(device_id=Config.AUDIO_DEVICE_ID)
+            source.__enter__()
+            self._capture_source = source
+            self.actual_sample_rate, self.actual_channels = source.samplerate, source.channels
+            self._run_capture(source)
+        except Exception as e:
+            logger.critical(f"Capture thread crashed: {e}", exc_info=True)
+        finally:
+            # Closes whichever source is open by now (reconfigure may have swapped it)
+            source, self._capture_source = self._capture_source, None
+            if source is not None:
                 try:
-                    self._sf_file.close()
-                    logger.debug("WAV file closed successfully")
+                    source.__exit__(None, None, None)
                 except Exception as e:
-                    logger.warning(f"Error closing WAV file: {e}")
-                finally:
-                    self._sf_file = None
+                    logger.warning(f"Error closing capture source: {e}")
+            self._capture_done.set()
+            request, self._reconfigure_request = self._reconfigure_request, None
+            if request is not None:
+                request.result = {'applied': False, 'error': 'capture stopped'}
+                request.done.set()
+
+    def _new_block_tuner(self, samplerate, initial=None):
+        return BlockSizeTuner(
+            samplerate,
+            initial=initial or Config.BLOCK_SIZE,
+            minimum=Config.BLOCK_SIZE_MIN,
+            maximum=Config.BLOCK_SIZE_MAX,
+            target_latency_ms=Config.BLOCK_TARGET_LATENCY_MS,
+            adaptive=Config.ADAPTIVE_BLOCK_SIZE
+        )
+
+    def _resolve_source(self, request, current):
+        """The source a reconfigure asks for (the current one if nothing about it changes)."""
+        if request.source is not None:
+            return request.source
+        if self.source is not None:
+            return current  # Injected source: only the block size changes
+        if (isinstance(current, LoopbackSource) and current.device_id == Config.AUDIO_DEVICE_ID
+                and current.preferred_rate == Config.SAMPLE_RATE):
+            return current
+        return LoopbackSource(device_id=Config.AUDIO_DEVICE_ID)
 
-    def _detect_optimal_settings(self, device):
+    def _switch_capture(self, request, source, ring):
         """
-        Auto-detect the optimal sample rate and channels for the device.
-        Tests multiple configurations and returns the best working one.
+        Capture thread, between two reads: opens the requested source before
+        closing the old one, and tells the writer where the sample rate changes.
+        Returns (source, tuner) to carry on with.
         """
-        # Priority order for sample rates (most common to least)
-        test_rates = [48000, 44100, 96000, 192000, 32000, 22050, 16000]
-        
-        logger.info(f"Auto-detecting optimal settings for: {device.name}")
-        
-        # Get device channels (usually 2 for stereo)
-        optimal_channels = min(device.channels, 2)  # Use 2 max, even if device supports more
-        
-        # Test sample rates
-        for rate in test_rates:
+        result = {'applied': True, 'position': ring.write_pos, 'previous_rate': self.actual_sample_rate}
+        new_source = self._resolve_source(request, source)
+        if new_source is not source:
             try:
-                # Try to create a recorder with this sample rate
-                with device.recorder(samplerate=rate, channels=optimal_channels) as rec:
-                    # If we get here, this configuration works
-                    logger.info(f"✓ Detected working configuration: {rate} Hz, {optimal_channels} channels")
-                    return rate, optimal_channels
+                new_source.__enter__()
             except Exception as e:
-                logger.debug(f"✗ {rate} Hz not supported: {e}")
-                continue
+                logger.error(f"Could not open {new_source.name}, keeping {source.name}: {e}")
+                result.update(applied=False, error=str(e))
+                new_source = source
+            else:
+                try:
+                    source.__exit__(None, None, None)
+                except Exception as e:
+                    logger.warning(f"Error closing capture source: {e}")
+                self._capture_source = new_source
+                if request.source is not None:
+                    self.source = request.source
+                if new_source.channels != ring.channels:
+                    logger.warning(f"{new_source.name} has {new_source.channels} channels, recording {ring.channels}")
         
-        # Fallback to config values if nothing works
-        logger.warning(f"Could not auto-detect, using config defaults: {Config.SAMPLE_RATE} Hz")
-        return Config.SAMPLE_RATE, Config.CHANNELS
+        rate = new_source.samplerate
+        if rate != self.actual_sample_rate:
+            # Everything before this frame was captured at the old rate; the writer switches here
+            self._queue_event(ring.write_pos, 'format', {'samplerate': rate})
+            self.actual_sample_rate = rate
+        self._frames_per_sec = rate * new_source.speed if new_source.speed else None
+        self._clock_anchor = None
+        tuner = self._new_block_tuner(rate, request.block_size)
+        self.block_tuner = tuner
+        
+        result.update(
+            samplerate=rate, block_size=tuner.block_size, source=new_source.name,
+            switch_ms=(time.perf_counter() - request.requested_at) * 1000
+        )
+        self.reconfigurations += 1
+        self.last_reconfigure = result
+        logger.info(f"Audio engine reconfigured: {new_source.name}, {rate} Hz, Block: {tuner.block_size} "
+                    f"({result['switch_ms']:.0f} ms)")
+        request.result = result
+        request.done.set()
+        return new_source, tuner
 
-    def _capture_loop(self):
-        # finding default loopback
-        # NOTE: 'sc.get_microphone' with include_loopback=True on Windows often finds loopbacks.
-        # But specifically we want the default system loopback.
-        # id usually is a complex string.
+    def _run_capture(self, source):
+        # Preallocate the capture buffer for the detected format
+        self.ring = RingBuffer(int(self.actual_sample_rate * Config.RING_BUFFER_SECONDS), self.actual_channels)
+        with self._events_lock:
+            self._last_event_pos = 0
+        self._clock_anchor = None
+        # Unpaced sources (speed=None) have no meaningful time -> frame mapping
+        self._frames_per_sec = self.actual_sample_rate * source.speed if source.speed else None
+        self._ring_ready.set()
+        ring = self.ring
         
-        try:
-            # Start recording with a block size
-            # We assume default speaker loopback is desired.
-            mic = sc.default_speaker() # This is sending audio TO speaker.
-            # To record loopback, we often need sc.get_microphone(id=..., include_loopback=True)
-            # sc.default_microphone() usually gives the physical mic.
-            
-            # For Windows Loopback via soundcard library:
-            # We need to find the loopback device corresponding to default speaker.
-            mics = sc.all_microphones(include_loopback=True)
-            loopback_mic = None
-            
-            # 1. Try Configured Device
-            if Config.AUDIO_DEVICE_ID:
-                for m in mics:
-                    if m.name == Config.AUDIO_DEVICE_ID:
-                         loopback_mic = m
-                         logger.info(f"Using configured device: {m.name}")
-                         break
-            
-            # 2. Auto-detect if not found or not configured
-            if not loopback_mic:
-                 # Simple heuristic: look for 'Loopback' or match the default speaker name
-                 try:
-                     default_spk = sc.default_speaker()
-                     logger.info(f"System Default Speaker: {default_spk.name}")
-                     
-                     for m in mics:
-                          if m.isloopback and default_spk.name in m.name: # Try to match default speaker
-                              loopback_mic = m
-                              logger.info(f"Auto-selected Loopback matching default: {m.name}")
-                              break 
-                     
-                     # Fallback to ANY loopback
-                     if not loopback_mic:
-                         for m in mics:
-                             if m.isloopback:
-                                 loopback_mic = m
-                                 logger.info(f"Using first available loopback: {m.name}")
-                                 break
-                 except Exception as e:
-                     logger.error(f"Error detecting default speaker: {e}")
-
-            if not loopback_mic:
-                logger.error("No loopback device found! Using default mic (WILL BE WRONG).")
-                loopback_mic = sc.default_microphone()
-
-            logger.info(f"Recording from: {loopback_mic.name}")
-
-            # AUTO-DETECT optimal settings for this device
-            self.actual_sample_rate, self.actual_channels = self._detect_optimal_settings(loopback_mic)
-            
-            # Use detected settings (not config values which may not match hardware)
-            with loopback_mic.recorder(samplerate=self.actual_sample_rate, channels=self.actual_channels) as recorder:
-                logger.info(f"Recording at: {self.actual_sample_rate} Hz, {self.actual_channels} channels, Block: {Config.BLOCK_SIZE}")
-                logger.info(f"📊 Audio Quality: {'Lossless' if Config.OUTPUT_FORMAT == 'flac' else f'{Config.OUTPUT_FORMAT.upper()}'}")
+        tuner = self._new_block_tuner(self.actual_sample_rate)
+        self.block_tuner = tuner
+        
+        logger.info(f"Recording at: {self.actual_sample_rate} Hz, {self.actual_channels} channels, Block: {tuner.block_size}{' (adaptive)' if tuner.adaptive else ''}")
+        logger.info(f"📊 Audio Quality: {'Lossless' if Config.OUTPUT_FORMAT == 'flac' else f'{Config.OUTPUT_FORMAT.upper()}'}")
+        
+        while self.recording:
+            try:
+                request = self._reconfigure_request
+                if request is not None:
+                    self._reconfigure_request = None
+                    source, tuner = self._switch_capture(request, source, ring)
                 
-                while self.recording:
-                    try:
-                        # Read block
-                        data = recorder.record(numframes=Config.BLOCK_SIZE)
-                        
-                        if not self.paused:
-                            self.buffer_queue.put(data)
-                    except Exception as e:
-                        logger.error(f"Error reading audio block: {e}")
-                        time.sleep(0.1)  # Prevent tight loop on error
-                        
-        except Exception as e:
-            logger.critical(f"Capture thread crashed: {e}", exc_info=True)
+                # Read block (timed so the tuner can see how long we actually waited)
+                loop_start = time.perf_counter()
+                seen_discontinuities = source.discontinuities
+                data = source.read(tuner.block_size)
+                read_time = time.perf_counter() - loop_start
+                self._read_latency.observe(read_time)
+                
+                if source.finished:
+                    logger.info(f"Capture source exhausted: {source.name}")
+                    break
+                
+                if data.shape[1] > ring.channels:
+                    data = data[:, :ring.channels]  # Switched to a source with more channels (mono broadcasts)
+                
+                # Always buffered (even while paused) so starts and splits can be back-dated
+                ring.write(data)
+                self._clock_anchor = (time.monotonic(), ring.write_pos)
+                
+                tuner.observe(
+                    len(data), read_time, time.perf_counter() - loop_start,
+                    discontinuity=source.discontinuities != seen_discontinuities
+                )
+            except Exception as e:
+                logger.error(f"Error reading audio block: {e}")
+                time.sleep(0.1)  # Prevent tight loop on error
 
     def _process_loop(self):
         logger.info("Audio processing loop started.")
+        while self.recording and not self._ring_ready.wait(timeout=0.5):
+            pass
+        ring = self.ring
+        if ring is None:
+            logger.info("Audio processing loop stopped.")
+            return
+        
+        self._write_rate = self.actual_sample_rate
+        self._create_analyzers(self._write_rate)
+        if Config.REPLAYGAIN:
+            self.loudness = LoudnessAnalyzer(self.actual_sample_rate, self.actual_channels)
+        else:
+            self.loudness = None
+        self._ad_scan_pos = 0
+        self._ad_suspect = None
+        min_frames = max(1, self.actual_sample_rate * self.DRAIN_MIN_MS // 1000)
+        max_wait = self.DRAIN_MIN_MS * 2 / 1000
+        # Audio held back so late splits can still be placed; never more than half the ring
+        lookback = min(int(self.actual_sample_rate * Config.SPLIT_LOOKBACK_SEC), ring.capacity // 2)
+        reported_overruns = 0
         while self.recording:
             try:
-                data = self.buffer_queue.get(timeout=1)
+                # Wait for a large slice instead of waking up per block (a short tail is flushed after the timeout)
+                ring.wait(lookback + min_frames, timeout=max_wait)
                 
-                # Thread-safe write with lock
-                with self._file_lock:
-                    if self._sf_file and not self._sf_file.closed:
-                        try:
-                            self._sf_file.write(data)
-                        except (AssertionError, TypeError) as e:
-                            # File closed/invalid during track change - this is normal, skip chunk
-                            logger.debug(f"Skipped write (track changing): {type(e).__name__}")
-                        except Exception as e:
-                            # Other unexpected errors
-                            logger.warning(f"Write error: {e}")
+                if self.ad_detector:
+                    self._scan_for_ads(ring)
+                
+                if self._capture_done.is_set():
+                    # Source exhausted: nothing more will arrive, write everything
+                    self._drain(ring, ring.write_pos, flush=True)
+                else:
+                    self._drain(ring, self._ad_gate(ring, ring.write_pos - lookback))
+                
+                if ring.overruns != reported_overruns:
+                    reported_overruns = ring.overruns
+                    logger.warning(f"Capture buffer overrun: {ring.dropped_frames} frames dropped so far")
                     
-            except queue.Empty:
-                continue
             except Exception as e:
                 logger.error(f"Unexpected error in write loop: {e}", exc_info=True)
+        
+        # Stopping (shutdown or engine restart): write out what was captured and apply what was asked
+        try:
+            self._drain(ring, ring.write_pos, flush=True)
+            while self._events:
+                self._apply_event(self._events.popleft())
+        except Exception as e:
+            logger.error(f"Error flushing capture buffer: {e}", exc_info=True)
         logger.info("Audio processing loop stopped.")
+
+    def _create_analyzers(self, samplerate):
+        self.silence = SilenceAnalyzer(samplerate, Config.SILENCE_THRESHOLD_DB, Config.MIN_SILENCE_DURATION_SEC)
+        if Config.LOCAL_AD_DETECTION and self.ad_detector:
+            # Restart or rate switch: ads learned through confirm_ad() stay, only the analysis starts over
+            self.ad_detector.silence_db = Config.SILENCE_THRESHOLD_DB
+            self.ad_detector.loudness_jump_db = Config.AD_LOUDNESS_JUMP_DB
+            self.ad_detector.set_samplerate(samplerate)
+        elif Config.LOCAL_AD_DETECTION:
+            self.ad_detector = AdDetector(
+                samplerate, silence_db=Config.SILENCE_THRESHOLD_DB, loudness_jump_db=Config.AD_LOUDNESS_JUMP_DB
+            )
+        else:
+            self.ad_detector = None
+
+    def _switch_write_rate(self, rate):
+        """Writer thread, at the frame where capture changed sample rate."""
+        previous, self._write_rate = self._write_rate, rate
+        # Held-back silence was captured at the old rate: it goes out as it is, before any resampling
+        if self._writing and self._pending_silence:
+            for chunk in self._pending_silence:
+                self._write_output(chunk)
+        self._pending_silence = []
+        self._pending_silence_frames = 0
+        self._create_analyzers(rate)
+        self._flush_resampler()
+        has_output = self._stream is not None or self._wav_file is not None
+        if has_output and self._output_rate != rate:
+            self._resampler = StreamResampler(rate, self._output_rate, self.actual_channels)
+            if self._segment_metadata is not None:
+                self._segment_metadata = dict(self._segment_metadata, resampled_from=rate)
+            logger.warning(f"Capture rate changed mid-track ({previous} -> {rate} Hz): "
+                           f"rest of the track resampled to {self._output_rate} Hz")
+
+    def _flush_resampler(self):
+        """Writes the tail still inside the resampler (the output continues at its own rate from here)."""
+        resampler, self._resampler = self._resampler, None
+        if resampler is not None:
+            tail = resampler.flush()
+            if len(tail):
+                self._write_output(tail)
+
+    def _drain(self, ring, horizon, flush=False):
+        """Writes (or skips, while paused) buffered audio up to `horizon`, applying events on the way."""
+        while True:
+            event = self._events[0] if self._events else None
+            if event is None:
+                self._write_until(ring, horizon)
+                return
+            
+            start = max(event.position - event.window, ring.read_pos)
+            if start > horizon:
+                self._write_until(ring, horizon)
+                return
+            self._write_until(ring, start)
+            
+            position = event.position
+            if event.window:
+                end = min(event.position + event.window, ring.write_pos)
+                if end < event.position + event.window and not flush:
+                    return  # Search window not fully captured yet
+                if end > start:
+                    cut = start + find_cut(
+                        ring.copy(start, end - start), event.position - start,
+                        self._write_rate, silence_db=Config.SILENCE_THRESHOLD_DB
+                    )
+                    self.split_adjust_ms.append((cut - event.position) * 1000 / self._write_rate)
+                    position = cut
+            
+            if event.action == 'split':
+                self.splits += 1
+                if position < ring.read_pos:
+                    # Cut point already written to the previous track (lookback too short)
+                    self.late_splits += 1
+                    logger.warning(f"Split {(ring.read_pos - position) * 1000 / self._write_rate:.0f} ms late")
+            self._write_until(ring, max(position, ring.read_pos))
+            self._events.popleft()
+            self._apply_event(event)
+
+    def _write_until(self, ring, position):
+        """Moves the read position up to absolute frame `position`, writing to the open output if recording."""
+        while ring.read_pos < position:
+            # Contiguous view into the ring (stops at the wrap point, rest comes next pass)
+            data = ring.peek(position - ring.read_pos)
+            if len(data) == 0:
+                return
+            
+            if self._writing:
+                if Config.TRIM_SILENCE and self.silence:
+                    self._write_trimmed(data)
+                else:
+                    self._write_output(data)
+            ring.consume(len(data))
+
+    def _write_trimmed(self, data):
+        """
+        Writes sound straight through and holds silence back: dropped if it turns out
+        to lead or end the track, written once sound follows, and capped at
+        MIN_SILENCE_DURATION_SEC (the writer idles through longer gaps).
+        """
+        starts, silent = self.silence.runs(data)
+        ends = np.append(starts[1:], len(data))
+        for start, end, quiet in zip(starts.tolist(), ends.tolist(), silent.tolist()):
+            if quiet:
+                if not self._segment_has_sound:
+                    self.silence_trimmed_frames += end - start
+                    continue
+                keep = min(end - start, self.silence.min_silence_frames - self._pending_silence_frames)
+                if keep > 0:
+                    # Copy: the ring slot is reused once consumed
+                    self._pending_silence.append(data[start:start + keep].copy())
+                    self._pending_silence_frames += keep
+                self.silence_skipped_frames += (end - start) - max(keep, 0)
+            else:
+                for chunk in self._pending_silence:
+                    self._write_output(chunk)
+                self._pending_silence = []
+                self._pending_silence_frames = 0
+                self._write_output(data[start:end])
+                self._segment_has_sound = True
+
+    def _write_stream(self, data):
+        """
+        Feeds the streaming encoder. If it fails, it is aborted and the track goes on
+        in a capture WAV (a partial take); returns False so the block goes there.
+        """
+        try:
+            self._stream.write(data)
+            return True
+        except Exception as e:
+            logger.error(f"Streaming encoder failed, continuing the track as WAV: {e}")
+            self._stream_fallbacks.inc()
+            self._open_wav_file()  # Aborts the stream
+            if self.loudness:
+                self.loudness.reset()
+            return False
+
+    def _reset_silence(self):
+        """Starts a new track: held-back silence is the old track's tail and is dropped."""
+        self.silence_trimmed_frames += self._pending_silence_frames
+        self._pending_silence = []
+        self._pending_silence_frames = 0
+        self._segment_has_sound = False
+        if self.silence:
+            self.silence.reset()
+
+    def _write_output(self, data):
+        # No lock: outputs are only opened, swapped and closed on the writer thread (this one)
+        if self._resampler is not None:
+            data = self._resampler.process(data)
+            if not len(data):
+                return
+        if not (self._stream and self._write_stream(data)):
+            wav = self._wav_file
+            if not wav or wav.closed:
+                return  # No output open
+            try:
+                wav.write(data)
+            except Exception as e:
+                logger.warning(f"Write error: {e}")
+        self._bytes_written.inc(data.nbytes)
+        if self.loudness:
+            self.loudness.feed(data)
@@ -0,0 +1,74 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Zero crossings of the interpolation kernel on each side (at the lower of the two rates)
+HALF_TAPS = 24
+KAISER_BETA = 8.6
+ROLLOFF = 0.94  # Passband edge as a share of the lower Nyquist frequency
+
+
+class StreamResampler:
+    """
+    Rational-ratio resampler for audio that arrives in blocks (L/M polyphase,
+    Kaiser-windowed sinc). Output sample n sits at input time n * M / L, so a
+    stream resampled block by block matches resampling it in one piece, and
+    the first output sample lines up with the first input sample.
+    """
+    def __init__(self, from_rate, to_rate, channels):
+        self.from_rate = int(from_rate)
+        self.to_rate = int(to_rate)
+        self.channels = int(channels)
+        g = math.gcd(self.from_rate, self.to_rate)
+        self.up = self.to_rate // g
+        self.down = self.from_rate // g
+        # Downsampling widens the kernel so it still spans HALF_TAPS periods of the output rate
+        self.half = int(math.ceil(HALF_TAPS * max(1.0, self.down / self.up)))
+        self.taps = 2 * self.half
+        self.filters = self._filters()
+
+        self._buffer = np.zeros((self.half - 1, self.channels), dtype=np.float32)
+        self._buffer_start = -(self.half - 1)  # Input index of _buffer[0]
+        self._in_count = 0
+        self._out_count = 0
+
+    def _filters(self):
+        """Shape (up, taps): phase p interpolates at fraction p / up past an input sample."""
+        cutoff = min(1.0, self.up / self.down) * ROLLOFF
+        frac = np.arange(self.up)[:, None] / self.up
+        d = frac + self.half - 1 - np.arange(self.taps)[None, :]  # Distance from each tap, in input samples
+        window = np.i0(KAISER_BETA * np.sqrt(np.clip(1.0 - (d / self.half) ** 2, 0.0, None))) / np.i0(KAISER_BETA)
+        h = cutoff * np.sinc(cutoff * d) * window
+        return (h / h.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    def process(self, data):
+        """Feeds (frames, channels) input; returns the output frames it completes."""
+        if len(data):
+            self._buffer = np.concatenate([self._buffer, np.asarray(data, dtype=np.float32)])
+            self._in_count += len(data)
+        return self._run(self._in_count - self.half)
+
+    def flush(self):
+        """Output for the rest of the input (as if it were followed by silence). The stream is finished after this."""
+        total = -(-self._in_count * self.up // self.down)
+        self._buffer = np.concatenate([self._buffer, np.zeros((self.half, self.channels), dtype=np.float32)])
+        out = self._run(self._in_count)
+        return out[:max(0, total - (self._out_count - len(out)))]
+
+    def _run(self, limit):
+        # Output n needs inputs up to floor(n * M / L) + half, i.e. floor(n * M / L) < limit
+        end = (limit * self.up - 1) // self.down + 1 if limit > 0 else 0
+        if end <= self._out_count:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        positions = np.arange(self._out_count, end, dtype=np.int64) * self.down
+        first = positions // self.up - self.half + 1 - self._buffer_start
+        windows = sliding_window_view(self._buffer, self.taps, axis=0)  # (frames, channels, taps)
+        out = np.einsum('nct,nt->nc', windows[first], self.filters[positions % self.up])
+        self._out_count = end
+
+        # Keep only the history the next output needs
+        drop = (end * self.down) // self.up - self.half + 1 - self._buffer_start
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+        return out
@@ -0,0 +1,137 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size, preallocated float32 ring buffer for audio frames.
+
+    Designed for one producer (capture thread) and one consumer (writer thread).
+    Positions are absolute frame counts since creation, so a frame keeps the same
+    index no matter where it currently sits in the backing array.
+    """
+    def __init__(self, capacity_frames, channels):
+        self.capacity = int(capacity_frames)
+        self.channels = int(channels)
+        self._data = np.zeros((self.capacity, self.channels), dtype=np.float32)
+        self._write_pos = 0  # Absolute frames written
+        self._read_pos = 0   # Absolute frames consumed
+        self._cond = threading.Condition(threading.Lock())
+
+        # Counters
+        self.overruns = 0        # Writes that did not fully fit (consumer too slow)
+        self.dropped_frames = 0  # Frames lost to overruns
+        self.underruns = 0       # Waits that timed out with nothing to read
+        self.max_fill = 0        # High-water mark in frames
+
+    @property
+    def write_pos(self):
+        return self._write_pos
+
+    @property
+    def read_pos(self):
+        return self._read_pos
+
+    def available(self):
+        """Frames written but not yet consumed."""
+        return self._write_pos - self._read_pos
+
+    def free(self):
+        return self.capacity - self.available()
+
+    def write(self, block):
+        """
+        Copies a (frames, channels) block into the buffer without allocating.
+        Frames that do not fit are dropped and counted as an overrun.
+        Returns the number of frames stored.
+        """
+        n = len(block)
+        free = self.free()
+        if n > free:
+            self.overruns += 1
+            self.dropped_frames += n - free
+            n = free
+        if n == 0:
+            return 0
+
+        start = self._write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        # Slice assignment copies into the preallocated array (mono broadcasts to all channels)
+        self._data[start:start + first] = block[:first]
+        if first < n:
+            self._data[:n - first] = block[first:n]
+
+        with self._cond:
+            self._write_pos += n
+            fill = self._write_pos - self._read_pos
+            if fill > self.max_fill:
+                self.max_fill = fill
+            self._cond.notify_all()
+        return n
+
+    def wait(self, min_frames=1, timeout=None):
+        """
+        Blocks until at least `min_frames` are readable or `timeout` expires.
+        Returns the number of readable frames (may be less than `min_frames` on timeout).
+        """
+        min_frames = min(int(min_frames), self.capacity)
+        with self._cond:
+            if self.available() < min_frames:
+                self._cond.wait_for(lambda: self.available() >= min_frames, timeout)
+            available = self.available()
+        if available == 0:
+            self.underruns += 1
+        return available
+
+    def peek(self, max_frames=None):
+        """
+        Returns a view of the oldest unread frames, limited to the contiguous
+        region before the wrap point. Call consume() once the view has been used.
+        """
+        available = self.available()
+        if max_frames is not None:
+            available = min(available, int(max_frames))
+        start = self._read_pos % self.capacity
+        count = min(available, self.capacity - start)
+        return self._data[start:start + count]
+
+    def copy(self, start_pos, frames):
+        """
+        Returns a copy of `frames` frames starting at absolute position `start_pos`,
+        across the wrap point if needed. The range must lie within the unread frames.
+        """
+        if start_pos < self._read_pos or start_pos + frames > self._write_pos:
+            raise ValueError("Requested range is not buffered")
+        start = start_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        if first == frames:
+            return self._data[start:start + frames].copy()
+        return np.concatenate([self._data[start:], self._data[:frames - first]])
+
+    def consume(self, frames):
+        frames = min(int(frames), self.available())
+        with self._cond:
+            self._read_pos += frames
+            self._cond.notify_all()
+        return frames
+
+    def clear(self):
+        """Discards all unread frames. Returns how many were discarded."""
+        with self._cond:
+            discarded = self._write_pos - self._read_pos
+            self._read_pos = self._write_pos
+            self._cond.notify_all()
+        return discarded
+
+    def stats(self):
+        return {
+            'capacity_frames': self.capacity,
+            'channels': self.channels,
+            'frames_written': self._write_pos,
+            'frames_read': self._read_pos,
+            'fill_frames': self.available(),
+            'max_fill_frames': self.max_fill,
+            'overruns': self.overruns,
+            'dropped_frames': self.dropped_frames,
+            'underruns': self.underruns,
+        }
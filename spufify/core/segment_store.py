@@ -0,0 +1,178 @@
+import os
+import time
+import struct
+import threading
+import numpy as np
+from spufify.core.journal import _wav_header, _WAV_HEADER_BYTES, _WAVE_FORMAT_IEEE_FLOAT
+
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+_PAGE_FLOATS = 1024  # float32 values per 4 KiB page
+_PREFAULT_PAGES = 64
+
+
+class MappedWavWriter:
+    """
+    In-flight track capture written through a memory map instead of write() calls.
+
+    The file is preallocated in segments of `segment_frames` (sparse, grown by
+    ftruncate + remap when full, pages prefaulted in the background), so writing
+    a block is a memcpy into the page cache: no syscall, no lock. Every
+    `sync_interval` seconds the mapping is flushed, the RIFF sizes are patched and
+    the file is fsynced, as with JournalWavWriter (same interface). close() trims
+    the unused preallocation.
+    """
+    def __init__(self, path, samplerate, channels, sync_interval=1.0, segment_frames=None):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.sync_interval = sync_interval
+        self.segment_frames = segment_frames or samplerate * 60
+        self.frames = 0
+        self.closed = False
+        self.syncs = 0
+        self.sync_s = 0.0
+        self.segments = 0
+        self._frame_bytes = channels * 4
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        os.write(self._fd, _wav_header(samplerate, channels, 0))
+        self._map = None
+        self._capacity = 0
+        self._prefault_lock = threading.Lock()
+        self._prefault_generation = 0
+        self._prefault_thread = None
+        self._grow(self.segment_frames)
+        self._synced_frames = 0
+        self._last_sync = time.monotonic()
+
+    def _grow(self, frames):
+        """Extends the file by whole segments and remaps it."""
+        segments = -(-frames // self.segment_frames)
+        self._capacity += segments * self.segment_frames
+        self.segments += segments
+        if self._map is not None:
+            self._stop_prefault()
+            self._map.flush()
+            self._map = None  # Last reference: unmapped before the file changes size
+        os.ftruncate(self._fd, _WAV_HEADER_BYTES + self._capacity * self._frame_bytes)
+        self._map = np.memmap(
+            self.path, dtype=np.float32, mode='r+', offset=_WAV_HEADER_BYTES, shape=(self._capacity, self.channels)
+        )
+        self._prefault_thread = threading.Thread(
+            target=self._prefault, args=(self._map, self.frames, self._prefault_generation), daemon=True
+        )
+        self._prefault_thread.start()
+
+    def _prefault(self, mapping, start_frame, generation):
+        """
+        Reads one value per page of a fresh mapping so the page cache and page tables
+        are populated before the writer gets there (a first-touch fault on a sparse
+        file costs milliseconds). Reading never races the writer's memcpy; the lock
+        only keeps the file from being truncated under a chunk being read.
+        """
+        flat = mapping[start_frame:].reshape(-1)
+        step = _PAGE_FLOATS * _PREFAULT_PAGES
+        for start in range(0, len(flat), step):
+            with self._prefault_lock:
+                if generation != self._prefault_generation:
+                    return  # Remapped or closed since
+                flat[start:start + step:_PAGE_FLOATS].sum()
+            time.sleep(0)  # Let the writer have the GIL between chunks
+
+    def _stop_prefault(self):
+        """
+        Stops the prefault thread and waits for it to let go of its view of the
+        mapping, so the map can be released before the file is truncated or removed.
+        """
+        with self._prefault_lock:
+            self._prefault_generation += 1
+        if self._prefault_thread is not None:
+            self._prefault_thread.join()
+            self._prefault_thread = None
+
+    def write(self, data):
+        n = len(data)
+        if self.frames + n > self._capacity:
+            self._grow(self.frames + n - self._capacity)
+        self._map[self.frames:self.frames + n] = data
+        self.frames += n
+        if self.sync_interval is not None and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Flushes the mapped audio, patches the header to the frames written and fsyncs."""
+        if self.closed or self.frames == self._synced_frames:
+            return
+        started = time.perf_counter()
+        self._map.flush()
+        self._commit()
+        self.sync_s += time.perf_counter() - started
+
+    def _commit(self):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _wav_header(self.samplerate, self.channels, self.frames * self._frame_bytes))
+        os.fsync(self._fd)
+        self._synced_frames = self.frames
+        self._last_sync = time.monotonic()
+        self.syncs += 1
+
+    def close(self):
+        if self.closed:
+            return
+        self._stop_prefault()
+        self._map.flush()
+        self._map = None  # Unmapped: nothing references the pages being cut off
+        # Drop the unused preallocation, then make the header final
+        os.ftruncate(self._fd, _WAV_HEADER_BYTES + self.frames * self._frame_bytes)
+        self._commit()
+        self.closed = True
+        os.close(self._fd)
+
+    def abort(self):
+        """Closes and removes the file (a dropped take)."""
+        if not self.closed:
+            self.closed = True
+            self._stop_prefault()
+            self._map = None  # Unmapped before the file goes (Windows can't delete a mapped file)
+            os.close(self._fd)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def map_float_wav(path):
+    """
+    Zero-copy view of a 32-bit float WAV: returns (np.memmap of shape (frames,
+    channels), samplerate), or None if the file is another format.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                body = f.read(size)
+                tag, channels, samplerate = struct.unpack('<HHI', body[:8])
+                bits = struct.unpack('<H', body[14:16])[0]
+                if tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack('<H', body[24:26])[0]  # First two bytes of the sub-format GUID
+                fmt = (tag, channels, samplerate, bits)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if not fmt or fmt[0] != _WAVE_FORMAT_IEEE_FLOAT or fmt[3] != 32:
+                    return None
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size % 2), os.SEEK_CUR)
+        file_size = os.fstat(f.fileno()).st_size
+    _, channels, samplerate, _ = fmt
+    # The header can be stale (unfinished capture): trust it only as far as the file goes
+    frames = min(size, file_size - offset) // (channels * 4)
+    if frames <= 0:
+        return np.zeros((0, channels), dtype=np.float32), samplerate
+    return np.memmap(path, dtype=np.float32, mode='r', offset=offset, shape=(frames, channels)), samplerate
@@ -0,0 +1,201 @@
+import os
+import re
+import time
+import logging
+import threading
+import concurrent.futures
+from collections import deque
+from spufify.config import Config
+from spufify.core.controller import Controller
+from spufify.core.processor import Processor
+from spufify.core.recorder import Recorder
+from spufify.core.sources import LoopbackSource
+from spufify.core.library import get_library_index
+from spufify.core.journal import get_job_journal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+
+
+class SessionConfig:
+    """
+    What differs between recording sessions: the capture device (and the rate
+    to try first on it) and the Spotify account, i.e. its token cache. Every
+    other setting comes from Config and is the same for all sessions.
+    """
+    NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')  # Used in temp file names and metric labels
+
+    def __init__(self, name, device_id=None, samplerate=None, token_cache=None):
+        if not isinstance(name, str) or not self.NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid session name {name!r}: use letters, digits, '-' and '_'")
+        self.name = name
+        self.device_id = device_id  # None = AUDIO_DEVICE_ID, else the default speaker's loopback
+        self.samplerate = samplerate  # None = SAMPLE_RATE
+        self.token_cache = token_cache  # None = OUTPUT_DIR/.spotify_token_cache.<name>
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('name'), data.get('device_id'), data.get('samplerate'), data.get('token_cache'))
+
+    def token_cache_path(self):
+        return self.token_cache or os.path.join(Config.OUTPUT_DIR, f".spotify_token_cache.{self.name}")
+
+
+def session_configs():
+    """Sessions from Config.SESSIONS, or the single session the window app would record."""
+    if not Config.SESSIONS:
+        return [SessionConfig(DEFAULT_SESSION, token_cache=os.path.join(Config.OUTPUT_DIR, '.spotify_token_cache'))]
+    configs = [SessionConfig.from_dict(data) for data in Config.SESSIONS]
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate session names in SESSIONS: {names}")
+    devices = [config.device_id for config in configs]
+    if len(set(devices)) != len(devices):
+        logger.warning("Several sessions capture the same device: each records every account playing on it")
+    return configs
+
+
+class Session:
+    """One Spotify account recorded from one capture device: its recorder and controller."""
+    def __init__(self, name, recorder, controller):
+        self.name = name
+        self.recorder = recorder
+        self.controller = controller
+
+    def status(self):
+        return {
+            'name': self.name,
+            'state': self.controller.state,
+            'user_paused': self.controller.user_paused,
+            'track': self.controller.extrapolated_track(),
+            'authenticated': self.controller.spotify_client.is_authenticated(),
+            'capture': self.recorder.get_stats(),
+            'polling': self.controller.get_stats(),
+        }
+
+    def pause(self):
+        self.controller.manual_pause()
+
+    def resume(self):
+        self.controller.manual_resume()
+
+
+class SessionManager:
+    """
+    Several sessions in one process. They share one Processor (encode pool and
+    crash journal), the process-wide cover cache, library index and HTTP pool.
+    A single scheduler thread keeps every account on its own PollScheduler
+    timetable (a manual resume or a suspected ad moves that session's poll up)
+    and hands due ticks to a small pool, at most one in flight per session, so
+    a slow or rate-limited account never holds up another's track changes.
+    Capture stays one thread pair per device.
+    """
+    def __init__(self, processor=None, clock=time.monotonic):
+        self.processor = processor or Processor()
+        self.clock = clock
+        self.sessions = {}  # Name -> Session, in the order they were added
+        self.running = False
+        self.thread = None
+        self._wake = threading.Event()  # Shared by every controller (manual resume, poll_now, stop, tick done)
+        self._ticker = None  # Runs the ticks, one worker per session
+        self._due = {}  # Session name -> clock time of its next poll
+        self._in_flight = set()  # Sessions whose tick is running
+        self._lock = threading.Lock()
+
+        # Stats: how late polls ran against their schedule, per session
+        self.ticks = 0
+        self.lag_ms = {}
+
+    def create_session(self, config, source=None, spotify_client=None):
+        """Builds a session from a SessionConfig (source/client can be injected, e.g. for benchmarks)."""
+        if config.name in self.sessions:
+            raise ValueError(f"Session {config.name} already exists")
+        if source is None and (config.device_id or config.samplerate):
+            source = LoopbackSource(device_id=config.device_id, samplerate=config.samplerate)
+        if spotify_client is None:
+            from spufify.api.spotify import SpotifyClient
+            spotify_client = SpotifyClient(cache_path=config.token_cache_path())
+        recorder = Recorder(source=source, processor=self.processor, name=config.name)
+        controller = Controller(
+            recorder_ref=recorder, spotify_client=spotify_client, clock=self.clock, wake=self._wake, name=config.name
+        )
+        session = self.sessions[config.name] = Session(config.name, recorder, controller)
+        return session
+
+    def start(self):
+        """Starts every session's capture, journal recovery (once, for the shared processor) and the poll loop."""
+        for session in self.sessions.values():
+            session.recorder.start_capture_thread()
+        if Config.CRASH_JOURNAL:
+            threading.Thread(target=get_job_journal().recover, args=(self.processor,), daemon=True).start()
+        if Config.LIBRARY_INDEX:
+            get_library_index().preload()
+        self.running = True
+        self._ticker = concurrent.futures.ThreadPoolExecutor(max(1, len(self.sessions)), thread_name_prefix="session-tick")
+        self.thread = threading.Thread(target=self._poll_loop, name="session-poll", daemon=True)
+        self.thread.start()
+        logger.info(f"Polling {len(self.sessions)} session(s): {', '.join(self.sessions)}")
+
+    def _poll_loop(self):
+        while self.running:
+            self._wake.clear()
+            for name, session in list(self.sessions.items()):
+                controller = session.controller
+                now = self.clock()
+                with self._lock:
+                    if name in self._in_flight or not self.running:
+                        continue  # A slow tick only delays its own session's next poll
+                    scheduled = self._due.get(name, now)
+                    if not (controller.poll_requested or now >= scheduled):
+                        continue
+                    self._in_flight.add(name)
+                if not controller.poll_requested:
+                    self.lag_ms.setdefault(name, deque(maxlen=200)).append((now - scheduled) * 1000)
+                self._ticker.submit(self._tick, name, controller)
+            with self._lock:
+                waiting = [due for name, due in self._due.items() if name not in self._in_flight]
+            # Finished ticks set the wake event, so an idle or fully in-flight loop can sleep long
+            self._wake.wait(max(0.0, min(waiting) - self.clock()) if waiting else 1.0)
+
+    def _tick(self, name, controller):
+        try:
+            controller.tick()
+        except Exception as e:
+            logger.error(f"Session {name}: poll failed: {e}")
+        finally:
+            with self._lock:
+                self._due[name] = self.clock() + controller.next_poll_interval()
+                self._in_flight.discard(name)
+                self.ticks += 1
+            self._wake.set()
+
+    def stop(self):
+        """Stops polling, then each session's capture (the writers hand open and finished tracks to the processor)."""
+        self.running = False
+        self._wake.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5.0)
+            if self.thread.is_alive():
+                logger.warning("Session poll thread did not stop cleanly")
+        if self._ticker:
+            self._ticker.shutdown(wait=True)  # Lets running ticks finish before capture stops under them
+        for session in self.sessions.values():
+            session.recorder.stop_threads(finish=True)
+
+    def shutdown(self, wait=True):
+        """stop(), then the shared encode pool; with wait=True, queued tracks are encoded first."""
+        self.stop()
+        self.processor.shutdown(wait=wait)
+
+    def get_stats(self):
+        by_session = {name: list(lag) for name, lag in list(self.lag_ms.items())}
+        lag = [value for values in by_session.values() for value in values]
+        return {
+            'sessions': len(self.sessions),
+            'ticks': self.ticks,
+            'in_flight': len(self._in_flight),
+            'avg_poll_lag_ms': sum(lag) / len(lag) if lag else 0.0,
+            'max_poll_lag_ms': max(lag) if lag else 0.0,
+            'max_poll_lag_ms_by_session': {name: max(values) for name, values in by_session.items() if values},
+        }
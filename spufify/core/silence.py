@@ -0,0 +1,101 @@
+import numpy as np
+
+# A window only counts as silent if its peak also stays within this margin of the threshold,
+# so quiet but transient passages (fade-outs, sparse intros) are not mistaken for silence
+PEAK_MARGIN_DB = 12.0
+WINDOW_MS = 10
+
+
+def _db_to_amplitude(db):
+    return 10.0 ** (db / 20.0)
+
+
+def window_levels(audio, window):
+    """
+    RMS and peak (linear amplitude, all channels) of consecutive `window`-frame
+    windows of `audio`; a trailing partial window is measured on its own.
+    Returns (rms, peak) arrays with one entry per window.
+    """
+    if audio.ndim == 1:
+        audio = audio[:, None]
+    frames = len(audio)
+    full = frames // window
+    count = full + (1 if frames % window else 0)
+    rms = np.empty(count, dtype=np.float64)
+    peak = np.empty(count, dtype=np.float64)
+    if full:
+        blocks = audio[:full * window].reshape(full, window * audio.shape[1])
+        rms[:full] = np.sqrt(np.einsum('ij,ij->i', blocks, blocks, dtype=np.float64) / blocks.shape[1])
+        peak[:full] = np.maximum(blocks.max(axis=1), -blocks.min(axis=1))
+    if count > full:
+        tail = audio[full * window:]
+        rms[full] = np.sqrt(np.mean(np.square(tail, dtype=np.float64)))
+        peak[full] = np.abs(tail).max()
+    return rms, peak
+
+
+def levels_db(rms):
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def silent_windows(rms, peak, threshold_db):
+    """Boolean mask of windows whose RMS is below `threshold_db` and whose peak stays near it."""
+    return (rms < _db_to_amplitude(threshold_db)) & (peak < _db_to_amplitude(threshold_db + PEAK_MARGIN_DB))
+
+
+class SilenceAnalyzer:
+    """
+    Classifies captured audio as sound or silence in bulk, using SILENCE_THRESHOLD_DB
+    over short windows (vectorized per writer slice, not per sample), and keeps
+    track of how long the current silence has lasted across slices.
+    """
+    def __init__(self, samplerate, threshold_db=-50.0, min_silence_sec=2.0, window_ms=WINDOW_MS):
+        self.samplerate = int(samplerate)
+        self.window = max(1, self.samplerate * window_ms // 1000)
+        self.threshold_db = threshold_db
+        self.min_silence_frames = int(min_silence_sec * self.samplerate)
+
+        self.silent_run = 0  # Frames of silence up to the end of the last analyzed slice
+
+        # Measurements
+        self.frames_analyzed = 0
+        self.silent_frames = 0
+
+    @property
+    def in_long_silence(self):
+        return self.silent_run >= self.min_silence_frames
+
+    def runs(self, audio):
+        """
+        Splits `audio` into alternating sound/silence runs.
+        Returns (starts, silent): frame offsets where each run begins and whether it is silent.
+        """
+        rms, peak = window_levels(audio, self.window)
+        silent = silent_windows(rms, peak, self.threshold_db)
+        changes = np.flatnonzero(silent[1:] != silent[:-1]) + 1
+        first = np.concatenate(([0], changes))
+        starts = first * self.window
+        run_silent = silent[first]
+
+        frames = len(audio)
+        self.frames_analyzed += frames
+        ends = np.append(starts[1:], frames)
+        quiet = int(np.sum((ends - starts)[run_silent]))
+        self.silent_frames += quiet
+        if run_silent[-1]:
+            last = int(frames - starts[-1])
+            self.silent_run = self.silent_run + last if len(starts) == 1 else last
+        else:
+            self.silent_run = 0
+        return starts, run_silent
+
+    def reset(self):
+        self.silent_run = 0
+
+    def stats(self):
+        return {
+            'threshold_db': self.threshold_db,
+            'frames_analyzed': self.frames_analyzed,
+            'silent_frames': self.silent_frames,
+            'silent_run_frames': self.silent_run,
+        }
@@ -0,0 +1,390 @@
+import sys
+import time
+import types
+import logging
+import warnings
+import threading
+import numpy as np
+from spufify.config import Config
+from spufify.core.device_cache import get_device_cache, device_set_signature
+
+logger = logging.getLogger(__name__)
+
+# Soundcard discontinuity warnings are not printed (cosmetic), but counted on the
+# LoopbackSource whose record() call raised them, so each device's block-size
+# tuner only reacts to its own gaps. Installed on first LoopbackSource use.
+# (warnings.catch_warnings per read would swap the same process-wide hooks from
+# every capture thread at once.)
+_reading = threading.local()  # .source: the LoopbackSource this thread is reading
+_show_warning = warnings.showwarning
+_counter_installed = False
+
+
+def _install_discontinuity_counter(sc):
+    global _counter_installed
+
+    def _count_discontinuity(message, category, *args, **kwargs):
+        if issubclass(category, sc.SoundcardRuntimeWarning):
+            source = getattr(_reading, 'source', None)
+            if source is not None:
+                source.discontinuities += 1
+            return
+        _show_warning(message, category, *args, **kwargs)
+
+    if not _counter_installed:
+        warnings.filterwarnings('always', category=sc.SoundcardRuntimeWarning, message='data discontinuity in recording')
+        warnings.showwarning = _count_discontinuity
+        _counter_installed = True
+
+
+def import_soundcard():
+    """
+    The soundcard module, imported on first use (heavy, and needs an audio backend).
+    Its backends still call numpy.fromstring on binary data, which NumPy 2 rejects:
+    they get a numpy whose fromstring is frombuffer, without patching numpy itself.
+    """
+    import soundcard as sc
+    if hasattr(np, 'frombuffer') and int(np.__version__.split('.')[0]) >= 2:
+        compat = types.ModuleType('numpy')
+        compat.__dict__.update(np.__dict__)
+        compat.fromstring = np.frombuffer
+        for name, module in list(sys.modules.items()):
+            if name.startswith('soundcard') and getattr(module, 'numpy', None) is np:
+                module.numpy = compat
+    return sc
+
+
+class CaptureSource:
+    """
+    Base class for everything the Recorder can capture from.
+
+    Subclasses set `samplerate`, `channels` and `name` in open() and return
+    float32 arrays shaped (frames, channels) from read(). A source that runs
+    out of audio sets `finished` and returns an empty array.
+    """
+    def __init__(self, speed=None):
+        # Playback speed for generated/replayed audio: 1.0 = real time, N = N× faster, None = unpaced
+        self.speed = speed
+        self.samplerate = None
+        self.channels = None
+        self.name = self.__class__.__name__
+        self.finished = False
+        self.discontinuities = 0  # Gaps reported by the backend since open()
+        self.frames_read = 0
+        self._start_time = None
+
+    def open(self):
+        raise NotImplementedError
+
+    def read(self, numframes):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.finished = False
+        self.frames_read = 0
+        self.discontinuities = 0
+        self._start_time = None
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _pace(self, frames):
+        """Sleeps so that delivered frames track the wall clock at `speed`."""
+        if self._start_time is None:
+            self._start_time = time.perf_counter()
+        self.frames_read += frames
+        if self.speed:
+            due = self._start_time + self.frames_read / (self.samplerate * self.speed)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class LoopbackSource(CaptureSource):
+    """
+    System loopback capture through the soundcard library (WASAPI on Windows).
+    Picks the configured device, or the loopback matching the default speaker.
+    """
+    def __init__(self, device_id=None, samplerate=None):
+        super().__init__(speed=1.0)  # Live audio; read() blocks on the device rather than pacing
+        self.device_id = device_id
+        self.preferred_rate = samplerate or Config.SAMPLE_RATE  # Tried first; the device may not accept it
+        self._device = None
+        self._recorder = None
+
+    def _find_device(self, sc, mics):
+        # finding default loopback
+        # NOTE: 'sc.get_microphone' with include_loopback=True on Windows often finds loopbacks.
+        # But specifically we want the default system loopback.
+        # id usually is a complex string.
+
+        # For Windows Loopback via soundcard library:
+        # We need to find the loopback device corresponding to default speaker.
+        loopback_mic = None
+
+        # 1. Try Configured Device
+        if self.device_id:
+            for m in mics:
+                if m.name == self.device_id:
+                     loopback_mic = m
+                     logger.info(f"Using configured device: {m.name}")
+                     break
+
+        # 2. Auto-detect if not found or not configured
+        if not loopback_mic:
+             # Simple heuristic: look for 'Loopback' or match the default speaker name
+             try:
+                 default_spk = sc.default_speaker()
+                 logger.info(f"System Default Speaker: {default_spk.name}")
+
+                 for m in mics:
+                      if m.isloopback and default_spk.name in m.name: # Try to match default speaker
+                          loopback_mic = m
+                          logger.info(f"Auto-selected Loopback matching default: {m.name}")
+                          break
+
+                 # Fallback to ANY loopback
+                 if not loopback_mic:
+                     for m in mics:
+                         if m.isloopback:
+                             loopback_mic = m
+                             logger.info(f"Using first available loopback: {m.name}")
+                             break
+             except Exception as e:
+                 logger.error(f"Error detecting default speaker: {e}")
+
+        if not loopback_mic:
+            logger.error("No loopback device found! Using default mic (WILL BE WRONG).")
+            loopback_mic = sc.default_microphone()
+        return loopback_mic
+
+    # Priority order for sample rates (most common to least)
+    PROBE_RATES = [48000, 44100, 96000, 192000, 32000, 22050, 16000]
+
+    def _open_cached(self, device, cache):
+        """Opens the device at the rate cached for it (no probe). None if nothing is cached or that open fails."""
+        cached = cache.lookup(device.name, self.preferred_rate)
+        if cached is None:
+            return None
+        rate, channels = cached
+        try:
+            started = time.perf_counter()
+            recorder = device.recorder(samplerate=rate, channels=channels)
+            recorder.__enter__()
+        except Exception as e:
+            logger.info(f"Cached configuration {rate} Hz no longer opens ({e}), probing again")
+            cache.forget(device.name, rate)
+            return None
+        cache.record(device.name, channels, rate=rate, open_ms=(time.perf_counter() - started) * 1000)
+        logger.info(f"✓ Using cached configuration: {rate} Hz, {channels} channels")
+        return recorder, rate, channels
+
+    def _open_device_recorder(self, device, cache=None):
+        """
+        Auto-detect the optimal sample rate and channels for the device and open it.
+        The preferred (configured) rate is tried first, and the first configuration that opens
+        is kept open for capture instead of being closed and opened again.
+        What was learned goes into `cache` (rates it refused are skipped next time).
+        Returns (recorder, samplerate, channels).
+        """
+        known_bad = cache.unsupported_rates(device.name) if cache else set()
+        test_rates = [self.preferred_rate] + [
+            rate for rate in self.PROBE_RATES if rate != self.preferred_rate and rate not in known_bad
+        ]
+
+        logger.info(f"Auto-detecting optimal settings for: {device.name}")
+
+        # Get device channels (usually 2 for stereo)
+        optimal_channels = min(device.channels, 2)  # Use 2 max, even if device supports more
+
+        # Test sample rates
+        failed = []
+        for rate in test_rates:
+            try:
+                started = time.perf_counter()
+                recorder = device.recorder(samplerate=rate, channels=optimal_channels)
+                recorder.__enter__()
+            except Exception as e:
+                logger.debug(f"✗ {rate} Hz not supported: {e}")
+                failed.append(rate)
+                continue
+            logger.info(f"✓ Detected working configuration: {rate} Hz, {optimal_channels} channels")
+            if cache:
+                cache.record(device.name, optimal_channels, rate=rate, failed=failed,
+                             open_ms=(time.perf_counter() - started) * 1000)
+            return recorder, rate, optimal_channels
+
+        # Fallback to config values if nothing works
+        logger.warning(f"Could not auto-detect, using config defaults: {Config.SAMPLE_RATE} Hz")
+        recorder = device.recorder(samplerate=Config.SAMPLE_RATE, channels=Config.CHANNELS)
+        recorder.__enter__()
+        return recorder, Config.SAMPLE_RATE, Config.CHANNELS
+
+    def open(self):
+        sc = import_soundcard()  # Only loaded when capturing
+        _install_discontinuity_counter(sc)
+
+        mics = sc.all_microphones(include_loopback=True)
+        self._device = self._find_device(sc, mics)
+        self.name = self._device.name
+        logger.info(f"Recording from: {self._device.name}")
+
+        # AUTO-DETECT optimal settings for this device (detected, not config values which may not match hardware);
+        # a device probed before is opened straight away at its cached rate
+        cache = None
+        if Config.DEVICE_CACHE:
+            cache = get_device_cache()
+            cache.check_device_set(device_set_signature(mics))
+        opened = cache and self._open_cached(self._device, cache)
+        self._recorder, self.samplerate, self.channels = opened or self._open_device_recorder(self._device, cache)
+
+    def read(self, numframes):
+        _reading.source = self
+        try:
+            data = self._recorder.record(numframes=numframes)
+        finally:
+            _reading.source = None
+        self.frames_read += len(data)
+        return data
+
+    def close(self):
+        if self._recorder:
+            try:
+                self._recorder.__exit__(None, None, None)
+            finally:
+                self._recorder = None
+
+
+class FileSource(CaptureSource):
+    """
+    Replays a WAV/FLAC (anything libsndfile reads) as if it were being captured.
+    Delivers frames at real time, N× speed, or unpaced (speed=None).
+    """
+    def __init__(self, path, speed=1.0, loop=False):
+        super().__init__(speed=speed)
+        self.path = path
+        self.loop = loop
+        self._file = None
+
+    def open(self):
+        import soundfile as sf
+        self._file = sf.SoundFile(self.path, mode='r')
+        self.samplerate = self._file.samplerate
+        self.channels = self._file.channels
+        self.name = f"file:{self.path}"
+
+    def read(self, numframes):
+        data = self._file.read(numframes, dtype='float32', always_2d=True)
+        if len(data) < numframes and self.loop:
+            self._file.seek(0)
+            rest = self._file.read(numframes - len(data), dtype='float32', always_2d=True)
+            data = np.concatenate([data, rest])
+        if len(data) == 0:
+            self.finished = True
+            return data
+        self._pace(len(data))
+        return data
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class SignalSource(CaptureSource):
+    """
+    Deterministic signal generator for headless runs.
+
+    `script` is a list of (kind, seconds) segments played in order, where kind
+    is 'sine', 'noise' or 'silence'; a None length plays forever. `gaps` is a
+    list of (start_sec, length_sec) ranges forced to silence, and `dropouts`
+    lists positions (seconds) where a backend discontinuity is simulated.
+    """
+    KINDS = ('sine', 'noise', 'silence')
+
+    def __init__(self, kind='sine', duration=None, samplerate=48000, channels=2, frequency=440.0,
+                 amplitude=0.5, script=None, gaps=(), dropouts=(), speed=1.0, seed=0):
+        super().__init__(speed=speed)
+        self.script = list(script) if script else [(kind, duration)]
+        for segment_kind, _ in self.script:
+            if segment_kind not in self.KINDS:
+                raise ValueError(f"Unknown signal kind: {segment_kind}")
+        self._samplerate = int(samplerate)
+        self._channels = int(channels)
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.gaps = list(gaps)
+        self.dropouts = sorted(dropouts)
+        self.seed = seed
+        self._position = 0
+        self._rng = None
+        self._segments = []
+        self._pending_dropouts = []
+
+    def open(self):
+        self.samplerate = self._samplerate
+        self.channels = self._channels
+        self.name = "signal:" + "+".join(kind for kind, _ in self.script)
+        self._position = 0
+        self._rng = np.random.default_rng(self.seed)
+
+        # Absolute [start, end) frame ranges of each scripted segment
+        self._segments = []
+        start = 0
+        for kind, seconds in self.script:
+            end = None if seconds is None else start + int(seconds * self.samplerate)
+            self._segments.append((kind, start, end))
+            if end is None:
+                break
+            start = end
+        self._pending_dropouts = [int(sec * self.samplerate) for sec in self.dropouts]
+
+    @property
+    def total_frames(self):
+        """Length of the script in frames, or None if it never ends."""
+        return self._segments[-1][2] if self._segments else None
+
+    def read(self, numframes):
+        start = self._position
+        end = start + numframes
+        total = self.total_frames
+        if total is not None:
+            end = min(end, total)
+        if end <= start:
+            self.finished = True
+            return np.zeros((0, self.channels), dtype=np.float32)
+
+        out = np.zeros((end - start, self.channels), dtype=np.float32)
+        for kind, seg_start, seg_end in self._segments:
+            lo = max(start, seg_start)
+            hi = end if seg_end is None else min(end, seg_end)
+            if hi <= lo or kind == 'silence':
+                continue
+            if kind == 'sine':
+                t = np.arange(lo, hi, dtype=np.float64) / self.samplerate
+                wave = (self.amplitude * np.sin(2 * np.pi * self.frequency * t)).astype(np.float32)
+                out[lo - start:hi - start] = wave[:, None]
+            else:
+                out[lo - start:hi - start] = self._rng.uniform(
+                    -self.amplitude, self.amplitude, size=(hi - lo, self.channels)
+                ).astype(np.float32)
+
+        for gap_start, gap_len in self.gaps:
+            lo = max(start, int(gap_start * self.samplerate))
+            hi = min(end, int((gap_start + gap_len) * self.samplerate))
+            if hi > lo:
+                out[lo - start:hi - start] = 0.0
+
+        while self._pending_dropouts and self._pending_dropouts[0] < end:
+            self._pending_dropouts.pop(0)
+            self.discontinuities += 1
+
+        self._position = end
+        self._pace(len(out))
+        return out
@@ -0,0 +1,248 @@
+"""
+Spufify without the window: recorder, controller and processor run headless
+and are driven over a small HTTP API bound to localhost. With SESSIONS set,
+one process records several accounts, each from its own capture device.
+
+Usage:
+    python -m spufify.daemon                                # control API on 127.0.0.1:CONTROL_PORT
+    python -m spufify.daemon --port 0                       # any free port (logged at start)
+    python -m spufify.daemon --authenticate [--session NAME]  # one-time Spotify login, then exit
+
+API (JSON):
+    GET  /status                  every session (state, current track, capture and polling stats)
+                                  and the shared encode queue
+    GET  /sessions/<name>         one session
+    POST /pause, /resume          like the Pause button, for every session
+    POST /sessions/<name>/pause   ... or for one (also /resume)
+    POST /shutdown                same as SIGINT / SIGTERM
+
+Shutdown stops polling and capture, writes out what is still buffered (the
+track being recorded is saved as it is, a partial take) and waits for queued
+encodes to finish before the process exits.
+"""
+import os
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+
+# Shared start-up path with the window app (logging, token cache location, StartupTimer)
+from spufify.main import StartupTimer, check_ffmpeg, check_spotify_credentials
+from spufify.config import Config
+from spufify.utils.metrics import start_exporters
+
+logger = logging.getLogger("spufify.daemon")
+
+# Encode pool counters reported by /status (the per-job history is left out)
+_ENCODE_FIELDS = ('workers', 'queue_depth', 'active', 'submitted', 'completed', 'failed', 'avg_job_s')
+
+
+class Daemon:
+    """
+    Stands in for the Dashboard over a SessionManager: turns API calls and
+    signals into controller actions and reports what the sessions are doing.
+    """
+    def __init__(self, manager):
+        self.manager = manager
+        self.started_at = time.time()
+        self._stop = threading.Event()
+
+    def _sessions(self, name=None):
+        """The named session (KeyError if there is none), or all of them."""
+        if name is None:
+            return list(self.manager.sessions.values())
+        return [self.manager.sessions[name]]
+
+    def status(self, name=None):
+        if name is not None:
+            return self.manager.sessions[name].status()
+        encode = self.manager.processor.get_stats()
+        return {
+            'sessions': [session.status() for session in self._sessions()],
+            'encode': {field: encode[field] for field in _ENCODE_FIELDS},
+            'polling': self.manager.get_stats(),
+            'uptime_sec': time.time() - self.started_at,
+            'stopping': self._stop.is_set(),
+        }
+
+    def pause(self, name=None):
+        for session in self._sessions(name):
+            session.pause()
+        return self.status(name)
+
+    def resume(self, name=None):
+        for session in self._sessions(name):
+            session.resume()
+        return self.status(name)
+
+    def request_shutdown(self):
+        """Safe from signal handlers and HTTP threads: the main thread does the actual shutdown."""
+        self._stop.set()
+
+    def wait(self):
+        # Short waits so the main thread gets to run signal handlers (Windows delivers Ctrl+C between them)
+        while not self._stop.wait(0.5):
+            pass
+
+    def shutdown(self):
+        """Stops polling and capture (open tracks are handed off), then blocks until every queued encode has finished."""
+        self._stop.set()
+        self.manager.stop()
+        pending = self.manager.processor.get_stats()
+        if pending['queue_depth'] or pending['active']:
+            logger.info(f"Draining encode queue ({pending['queue_depth']} queued, {pending['active']} running)...")
+        self.manager.processor.shutdown(wait=True)
+
+
+class ControlServer:
+    """Local HTTP control API of a Daemon (see the module docstring)."""
+    def __init__(self, daemon, port, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        actions = {'pause': daemon.pause, 'resume': daemon.resume}
+
+        class _Handler(BaseHTTPRequestHandler):
+            def _reply(self, document, code=200):
+                body = json.dumps(document, default=str).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self):
+                """(session name, action) of /<action> or /sessions/<name>[/<action>]; None for what is absent."""
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                if parts[0] == 'sessions' and len(parts) in (2, 3):
+                    return parts[1], parts[2] if len(parts) == 3 else None
+                return None, parts[0] if len(parts) == 1 else None
+
+            def do_GET(self):
+                name, action = self._route()
+                if action != ('status' if name is None else None):
+                    self.send_error(404)
+                    return
+                try:
+                    self._reply(daemon.status(name))
+                except KeyError:
+                    self.send_error(404, f"No session {name}")
+
+            def do_POST(self):
+                name, action = self._route()
+                if (name, action) == (None, 'shutdown'):
+                    daemon.request_shutdown()
+                    self._reply({'stopping': True}, code=202)
+                elif action in actions:
+                    try:
+                        self._reply(actions[action](name))
+                    except KeyError:
+                        self.send_error(404, f"No session {name}")
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="control-http", daemon=True)
+        self.thread.start()
+        logger.info(f"Control API: http://{host}:{self.port}/status")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def authenticate(config):
+    """Spotify login without the Settings window: spotipy opens a browser or asks for the redirect URL."""
+    from spufify.api.spotify import SpotifyClient
+    try:
+        return SpotifyClient(cache_path=config.token_cache_path()).authenticate()
+    except Exception as e:
+        logger.error(f"Spotify authentication failed for session {config.name}: {e}")
+        return False
+
+
+def serve(manager, port, timer=None):
+    """
+    Starts the sessions of `manager` and runs them headless until SIGINT,
+    SIGTERM or POST /shutdown, then drains them. Call from the main thread
+    (signal handlers). Returns the exit code.
+    """
+    daemon = Daemon(manager)
+    try:
+        server = ControlServer(daemon, port)
+    except OSError as e:
+        logger.error(f"Could not start control API on port {port}: {e}")
+        return 1
+
+    def _on_signal(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, shutting down...")
+        daemon.request_shutdown()
+    signal.signal(signal.SIGINT, _on_signal)
+    signal.signal(signal.SIGTERM, _on_signal)
+
+    manager.start()
+    if timer:
+        timer.mark('polling_started')
+    try:
+        daemon.wait()
+    finally:
+        server.stop()
+        daemon.shutdown()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Spufify headless with a local control API.")
+    parser.add_argument("--port", type=int, help="Control API port (default: CONTROL_PORT; 0 = any free port)")
+    parser.add_argument("--authenticate", action="store_true", help="Log in to Spotify (token is cached) and exit")
+    parser.add_argument("--session", help="Session to log in with --authenticate (default: every one without a token)")
+    args = parser.parse_args(argv)
+
+    timer = StartupTimer()
+    Config.load_settings()
+    timer.mark('settings_loaded')
+    if not check_ffmpeg() or not check_spotify_credentials():
+        return 1
+    Config.ensure_directories()
+
+    from spufify.core.session import SessionManager, session_configs
+    try:
+        configs = session_configs()
+    except ValueError as e:
+        logger.error(f"Invalid SESSIONS setting: {e}")
+        return 1
+
+    if args.authenticate:
+        if args.session:
+            configs = [config for config in configs if config.name == args.session]
+            if not configs:
+                logger.error(f"No session named {args.session}")
+                return 1
+        else:
+            configs = [config for config in configs if not os.path.exists(config.token_cache_path())]
+        return 0 if all(authenticate(config) for config in configs) else 1
+
+    exporters = start_exporters()
+    try:
+        manager = SessionManager()
+        for config in configs:
+            session = manager.create_session(config)
+            if not session.controller.spotify_client.is_authenticated():
+                logger.warning(f"Session {config.name}: Spotify is not authenticated, run "
+                               f"`python -m spufify.daemon --authenticate --session {config.name}` once.")
+        timer.mark('sessions_ready')
+        return serve(manager, Config.CONTROL_PORT if args.port is None else args.port, timer)
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+        logger.info("Spufify daemon stopped.")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
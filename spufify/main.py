@@ -1,25 +1,24 @@
 import os
 import sys
+import time
 import logging
+import threading
+
+# Startup phases are timed from here (interpreter start-up itself is not included)
+_STARTED = time.perf_counter()
 
 print("Loading Spufify modules...")
 
 # Ensure project root is in path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import numpy as np
-# Monkeypatch for soundcard compatibility with Numpy 2.0+
-# FORCE replace because Numpy 2.0 still has fromstring but it errors on binary data
-np.fromstring = np.frombuffer
-
 # Ensure cache path is writable and absolute
 os.environ["SPOTIPY_CACHE_PATH"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".spotify_cache")
 
+# Only light modules here: numpy, soundcard, spotipy, mutagen, requests and the UI toolkit are
+# imported by the phase that first needs them (see start_core and main)
 from spufify.config import Config
-from spufify.core.controller import Controller
-from spufify.core.recorder import Recorder
-from spufify.ui.dashboard import Dashboard
-import subprocess
+from spufify.utils.metrics import get_metrics, start_exporters
 import shutil
 
 # Configure logging
@@ -30,6 +29,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+class StartupTimer:
+    """
+    Time from process start to each startup phase. Phases are marked from the
+    UI thread and the background start-up thread; each one is also exported
+    as the spufify_startup_seconds gauge.
+    """
+    def __init__(self, started=None):
+        self.started = _STARTED if started is None else started
+        self.phases = {}  # Phase -> seconds since start, in the order reached
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            self.phases[phase] = elapsed
+        get_metrics().gauge('spufify_startup_seconds', "Time from process start to each startup phase",
+                            labels={'phase': phase}).set(elapsed)
+        return elapsed
+
+    def summary(self):
+        with self._lock:
+            return ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases.items())
+
+
 def check_ffmpeg():
     """Verify FFmpeg is available in PATH"""
     if not shutil.which('ffmpeg'):
@@ -46,49 +70,104 @@ def check_spotify_credentials():
     logger.info("Spotify credentials configured.")
     return True
 
+def start_core(timer, source=None, spotify_client=None):
+    """
+    Imports and starts the audio and Spotify side: recorder (capture threads
+    started; the device is probed and opened on the capture thread), controller
+    (not started: whoever shows its state starts it) and journal recovery.
+    Returns (recorder, controller).
+    """
+    from spufify.core.recorder import Recorder
+    from spufify.core.controller import Controller
+    from spufify.core.journal import get_job_journal
+    timer.mark('core_imported')
+
+    # Start Recorder Thread (starts paused)
+    recorder = Recorder(source=source)
+    recorder.start_capture_thread()
+    timer.mark('capture_started')
+
+    controller = Controller(recorder_ref=recorder, spotify_client=spotify_client)
+    timer.mark('controller_ready')
+
+    # Resume tracks the last session left unfinished (in the background: the encode queue may block)
+    if Config.CRASH_JOURNAL:
+        threading.Thread(target=get_job_journal().recover, args=(recorder.processor,), daemon=True).start()
+
+    def _wait_for_audio():
+        if recorder.wait_until_capturing(timeout=30):
+            timer.mark('audio_ready')
+        logger.info(f"Startup: {timer.summary()}")
+    threading.Thread(target=_wait_for_audio, name="startup-audio", daemon=True).start()
+    return recorder, controller
+
 def main():
     try:
+        timer = StartupTimer()
+        Config.load_settings()
+        timer.mark('settings_loaded')
         logger.info("Spufify starting...")
-        
+
         # Pre-flight checks
         if not check_ffmpeg():
             input("Press Enter to exit...")
             return
-        
+
         if not check_spotify_credentials():
             input("Press Enter to exit...")
             return
-        
+
         Config.ensure_directories()
-        
-        # 1. Initialize Core
-        recorder = Recorder()
-        controller = Controller(recorder_ref=recorder)
-        
-        # Start Recorder Thread (starts paused)
-        recorder.start_capture_thread()
-        
-        # 2. Initialize UI
-        app = Dashboard(controller)
-        
+
+        # Optional metrics endpoint / JSON dump (off unless METRICS_PORT / METRICS_DUMP_SEC are set)
+        exporters = start_exporters()
+
+        from spufify.ui.dashboard import Dashboard
+        timer.mark('ui_imported')
+
+        core = {}
+        if Config.FAST_START:
+            # 1. Window first; the recorder and Spotify client are attached when they are up
+            app = Dashboard()
+            timer.mark('ui_shown')
+
+            def _start_core():
+                try:
+                    core['recorder'], core['controller'] = start_core(timer)
+                    app.after(0, app.attach_controller, core['controller'])
+                except Exception as e:
+                    logger.critical(f"CRITICAL ERROR during startup: {e}", exc_info=True)
+            threading.Thread(target=_start_core, name="startup", daemon=True).start()
+        else:
+            # 1. Initialize Core, 2. Initialize UI
+            core['recorder'], core['controller'] = start_core(timer)
+            app = Dashboard(core['controller'])
+            timer.mark('ui_shown')
+
         # Handle graceful exit
         def on_closing():
             logger.info("Shutting down...")
             try:
-                controller.stop()
-                recorder.recording = False
-                recorder.paused = True
-                # Give threads time to cleanup
-                import time
-                time.sleep(0.5)
+                if core.get('controller'):
+                    core['controller'].stop()
+                if core.get('recorder'):
+                    # Joins capture and the writer; the writer hands the open track to the processor first
+                    core['recorder'].stop_threads(finish=True)
             except Exception as e:
                 logger.error(f"Error during shutdown: {e}")
             finally:
                 app.destroy()
-        
+
         app.protocol("WM_DELETE_WINDOW", on_closing)
-        
+
         app.mainloop()
+
+        # Finish encoding tracks that were already recorded (stop_threads is a no-op after on_closing)
+        if core.get('recorder'):
+            core['recorder'].stop_threads(finish=True)
+            core['recorder'].processor.shutdown(wait=True)
+        for exporter in exporters:
+            exporter.stop()
     except Exception as e:
         logger.critical(f"CRITICAL ERROR: {e}", exc_info=True)
 
@@ -1,12 +1,11 @@
 import customtkinter as ctk
-from PIL import Image, ImageTk
-import requests
 from io import BytesIO
 import threading
 import os
+from spufify.utils.cover_cache import get_cover_cache
 
 class Dashboard(ctk.CTk):
-    def __init__(self, controller):
+    def __init__(self, controller=None):
         super().__init__()
         
         self.controller = controller
@@ -64,7 +63,7 @@ class Dashboard(ctk.CTk):
         self.duration_label.grid(row=3, column=0, pady=2)
         
         # Status
-        self.status_label = ctk.CTkLabel(self.main_frame, text="STATUS: WAITING", font=("Roboto Mono", 12), text_color="#3B8ED0")
+        self.status_label = ctk.CTkLabel(self.main_frame, text="STATUS: WAITING" if controller else "STATUS: STARTING", font=("Roboto Mono", 12), text_color="#3B8ED0")
         self.status_label.grid(row=4, column=0, pady=10)
         
         # Record/Pause Button
@@ -74,7 +73,8 @@ class Dashboard(ctk.CTk):
             width=200,
             height=35,
             font=("Roboto Medium", 13),
-            command=self.toggle_recording
+            command=self.toggle_recording,
+            state="normal" if controller else "disabled"  # Enabled once the controller is attached
         )
         self.record_btn.grid(row=5, column=0, pady=10)
         
@@ -107,7 +107,8 @@ class Dashboard(ctk.CTk):
         self.current_cover_url = None
         self.settings_window = None
         self.info_window = None
-        self.start_controller()
+        if self.controller:
+            self.start_controller()
         
         # Check auth status periodically
         self._check_spotify_auth()
@@ -115,6 +116,8 @@ class Dashboard(ctk.CTk):
     
     def toggle_recording(self):
         """Toggle manual recording pause/resume"""
+        if not self.controller:
+            return
         if self.controller.user_paused:
             self.controller.manual_resume()
         else:
@@ -161,6 +164,15 @@ class Dashboard(ctk.CTk):
         """Periodically check auth status"""
         self._check_spotify_auth()
         self.after(5000, self._periodic_auth_check)  # Check every 5 seconds
+
+    def attach_controller(self, controller):
+        """Fast start: the window is up before the recorder and Spotify client exist; they arrive here."""
+        self.controller = controller
+        self.status_label.configure(text="STATUS: WAITING")
+        self.record_btn.configure(state="normal")
+        self.start_controller()
+        self._check_spotify_auth()
+
     def start_controller(self):
         # Pass callback to controller
         self.controller.ui_callback = self.update_ui
@@ -183,11 +195,13 @@ class Dashboard(ctk.CTk):
             status_text += f" • {Config.OUTPUT_FORMAT.upper()}"
         elif state == "PAUSED" and track and track.get('is_ad'):
             status_text += " • Ad detected"
+        elif state == "SKIPPING":
+            status_text += " • Already in library"
         
         self.status_label.configure(text=status_text)
         
         # Update button text based on state
-        if self.controller.user_paused:
+        if self.controller and self.controller.user_paused:
             self.record_btn.configure(text="⏺ Resume Recording")
         else:
             self.record_btn.configure(text="⏸ Pause Recording")
@@ -241,9 +255,11 @@ class Dashboard(ctk.CTk):
     def _load_image(self, url):
         def _fetch():
             try:
-                resp = requests.get(url)
-                if resp.status_code == 200:
-                    img_data = BytesIO(resp.content)
+                # Shared with tagging, so the file on disk is reused for every track of the album
+                cover_data = get_cover_cache().get(url)
+                if cover_data:
+                    from PIL import Image  # Only needed once there is a cover to show
+                    img_data = BytesIO(cover_data)
                     pil_image = Image.open(img_data)
                     pil_image = pil_image.resize((200, 200), Image.Resampling.LANCZOS)
                     ctk_image = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=(200, 200))
@@ -301,5 +317,6 @@ class Dashboard(ctk.CTk):
             print(f"Error setting icon: {e}")
 
     def on_closing(self):
-        self.controller.stop()
+        if self.controller:
+            self.controller.stop()
         self.destroy()
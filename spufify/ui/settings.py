@@ -1,6 +1,6 @@
 import customtkinter as ctk
-import soundcard as sc
 from spufify.config import Config
+from spufify.core.sources import import_soundcard
 import tkinter.filedialog as filedialog
 
 class SettingsWindow(ctk.CTkToplevel):
@@ -48,6 +48,14 @@ class SettingsWindow(ctk.CTkToplevel):
         self.format_combo = ctk.CTkComboBox(self.scroll, values=["mp3", "flac", "wav"])
         self.format_combo.pack(anchor="w", pady=5)
         
+        ctk.CTkLabel(self.scroll, text="Also save as (e.g. mp3, saved into a subfolder)").pack(anchor="w")
+        self.profiles_entry = ctk.CTkEntry(self.scroll)
+        self.profiles_entry.pack(anchor="w", pady=5)
+        
+        self.streaming_var = ctk.BooleanVar(value=Config.STREAMING_ENCODE)
+        self.streaming_check = ctk.CTkCheckBox(self.scroll, text="Encode while recording (no intermediate WAV)", variable=self.streaming_var)
+        self.streaming_check.pack(anchor="w", pady=5)
+        
         # Sample Rate
         ctk.CTkLabel(self.scroll, text="Sample Rate (Hz)").pack(anchor="w")
         self.rate_entry = ctk.CTkEntry(self.scroll)
@@ -58,6 +66,10 @@ class SettingsWindow(ctk.CTkToplevel):
         self.block_entry = ctk.CTkEntry(self.scroll)
         self.block_entry.pack(anchor="w", pady=5)
         
+        self.adaptive_block_var = ctk.BooleanVar(value=Config.ADAPTIVE_BLOCK_SIZE)
+        self.adaptive_block_check = ctk.CTkCheckBox(self.scroll, text="Auto-tune block size while recording", variable=self.adaptive_block_var)
+        self.adaptive_block_check.pack(anchor="w", pady=5)
+        
         # --- Logic Settings ---
         ctk.CTkLabel(self.scroll, text="Recording Logic", font=("Arial", 14, "bold")).pack(anchor="w", pady=(15, 0))
         
@@ -65,6 +77,22 @@ class SettingsWindow(ctk.CTkToplevel):
         self.silence_entry = ctk.CTkEntry(self.scroll)
         self.silence_entry.pack(anchor="w", pady=5)
         
+        self.trim_silence_var = ctk.BooleanVar(value=Config.TRIM_SILENCE)
+        self.trim_silence_check = ctk.CTkCheckBox(self.scroll, text="Trim silence (track start/end, long gaps)", variable=self.trim_silence_var)
+        self.trim_silence_check.pack(anchor="w", pady=5)
+        
+        self.ad_detect_var = ctk.BooleanVar(value=Config.LOCAL_AD_DETECTION)
+        self.ad_detect_check = ctk.CTkCheckBox(self.scroll, text="Detect ads from the audio (Spotify confirms)", variable=self.ad_detect_var)
+        self.ad_detect_check.pack(anchor="w", pady=5)
+        
+        self.skip_known_var = ctk.BooleanVar(value=Config.LIBRARY_SKIP_KNOWN)
+        self.skip_known_check = ctk.CTkCheckBox(self.scroll, text="Skip songs already in the library", variable=self.skip_known_var)
+        self.skip_known_check.pack(anchor="w", pady=5)
+        
+        self.adaptive_poll_var = ctk.BooleanVar(value=Config.ADAPTIVE_POLLING)
+        self.adaptive_poll_check = ctk.CTkCheckBox(self.scroll, text="Poll Spotify less often when idle (tighter near track changes)", variable=self.adaptive_poll_var)
+        self.adaptive_poll_check.pack(anchor="w", pady=5)
+        
         # --- Spotify Authentication ---
         ctk.CTkLabel(self.scroll, text="Spotify Authentication", font=("Arial", 14, "bold")).pack(anchor="w", pady=(15, 0))
         
@@ -103,6 +131,7 @@ class SettingsWindow(ctk.CTkToplevel):
     def _populate_devices(self):
         # We need loopback devices
         try:
+            sc = import_soundcard()
             mics = sc.all_microphones(include_loopback=True)
             # Filter somewhat relevant ones (usually contain the speaker name)
             self.device_names = [m.name for m in mics]
@@ -120,6 +149,7 @@ class SettingsWindow(ctk.CTkToplevel):
     def _load_current_values(self):
         # Load Config into fields
         self.format_combo.set(Config.OUTPUT_FORMAT)
+        self.profiles_entry.insert(0, ", ".join(Config.OUTPUT_PROFILES or []))
         self.rate_entry.insert(0, str(Config.SAMPLE_RATE))
         self.block_entry.insert(0, str(Config.BLOCK_SIZE))
         self.silence_entry.insert(0, str(Config.SILENCE_THRESHOLD_DB))
@@ -131,7 +161,7 @@ class SettingsWindow(ctk.CTkToplevel):
         else:
             # Default to soundcard default if possible
             try:
-                def_mic = sc.default_microphone()
+                def_mic = import_soundcard().default_microphone()
                 # Find best match in list
                 if def_mic.name in self.device_names:
                     self.device_combo.set(def_mic.name)
@@ -194,9 +224,16 @@ class SettingsWindow(ctk.CTkToplevel):
         try:
             # Update Config
             Config.OUTPUT_FORMAT = self.format_combo.get()
+            Config.OUTPUT_PROFILES = [fmt.strip().lower() for fmt in self.profiles_entry.get().split(",") if fmt.strip()]
+            Config.STREAMING_ENCODE = bool(self.streaming_var.get())
             Config.SAMPLE_RATE = int(self.rate_entry.get())
             Config.BLOCK_SIZE = int(self.block_entry.get())
+            Config.ADAPTIVE_BLOCK_SIZE = bool(self.adaptive_block_var.get())
             Config.SILENCE_THRESHOLD_DB = float(self.silence_entry.get())
+            Config.TRIM_SILENCE = bool(self.trim_silence_var.get())
+            Config.LOCAL_AD_DETECTION = bool(self.ad_detect_var.get())
+            Config.LIBRARY_SKIP_KNOWN = bool(self.skip_known_var.get())
+            Config.ADAPTIVE_POLLING = bool(self.adaptive_poll_var.get())
             Config.OUTPUT_DIR = self.path_entry.get()
             Config.AUDIO_DEVICE_ID = self.device_combo.get()
             
@@ -204,6 +241,9 @@ class SettingsWindow(ctk.CTkToplevel):
             Config.save_settings()
             Config.ensure_directories()
             
+            if self.parent.controller:
+                self.parent.controller.poll_scheduler.adaptive = Config.ADAPTIVE_POLLING
+            
             # Hot Reload Audio Engine
             if self.parent.controller and self.parent.controller.recorder:
                 # Run in thread to not block UI
@@ -0,0 +1,243 @@
+import os
+import hashlib
+import logging
+import time
+import queue
+import threading
+from collections import OrderedDict
+from spufify.config import Config
+from spufify.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _download(url):
+    """Download cover art over the shared HTTP pool (which retries with backoff)"""
+    import requests
+    from spufify.utils.http import get_http_client
+    try:
+        resp = get_http_client().get(url)
+        if resp.status_code == 200:
+            return resp.content
+        logger.error(f"Cover download returned status {resp.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to download cover: {e}")
+    return None
+
+
+class CoverCache:
+    """
+    Album art cache keyed by URL.
+    In-memory LRU in front of an on-disk store that is evicted oldest-first
+    once it grows past `max_disk_bytes`. Concurrent requests for the same URL
+    share one download. Prefetches run one at a time on a single background
+    worker, at most `max_prefetch_pending` URLs queued.
+    """
+    def __init__(self, directory, max_disk_bytes=100 * 1024 * 1024, max_memory_items=32, fetcher=None,
+                 max_prefetch_pending=16):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_items = max_memory_items
+        self.max_prefetch_pending = max_prefetch_pending
+        self.fetcher = fetcher or _download
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._disk_bytes = None  # Scanned lazily on first write
+        self._prefetch_queue = queue.Queue()
+        self._prefetching = set()  # Keys queued for (or being fetched by) the prefetch worker
+        self._prefetch_thread = None  # Started on the first prefetch
+
+        # Stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.evictions = 0
+        self.prefetches = 0
+        self.prefetches_skipped = 0  # Already cached, in flight or queued, or the queue was full
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.img")
+
+    def get(self, url):
+        """Returns the image bytes for `url`, downloading at most once. None if unavailable."""
+        if not url:
+            return None
+        key = self._key(url)
+
+        while True:
+            with self._lock:
+                data = self._memory.get(key)
+                if data is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return data
+                pending = self._in_flight.get(key)
+                if pending is None:
+                    # We are the one fetching; others wait on this event
+                    pending = self._in_flight[key] = threading.Event()
+                    break
+            pending.wait()
+            with self._lock:
+                if key not in self._memory and key not in self._in_flight:
+                    return None  # The shared download failed
+
+        try:
+            data = self._read_disk(key)
+            if data is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                started = time.perf_counter()
+                data = self.fetcher(url)
+                get_metrics().histogram(
+                    'spufify_cover_fetch_seconds', "Cover art download time (cache misses)"
+                ).observe(time.perf_counter() - started)
+                if data:
+                    self._write_disk(key, data)
+                else:
+                    self.fetch_errors += 1
+            if data:
+                self._remember(key, data)
+            return data
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            pending.set()
+
+    def prefetch(self, url):
+        """Warms the cache in the background (e.g. as soon as a track starts)."""
+        if not url:
+            return
+        key = self._key(url)
+        with self._lock:
+            if (key in self._memory or key in self._in_flight or key in self._prefetching
+                    or len(self._prefetching) >= self.max_prefetch_pending):
+                self.prefetches_skipped += 1
+                return
+            self._prefetching.add(key)
+            self.prefetches += 1
+            if self._prefetch_thread is None:
+                self._prefetch_thread = threading.Thread(target=self._prefetch_worker, name="cover-prefetch",
+                                                         daemon=True)
+                self._prefetch_thread.start()
+        self._prefetch_queue.put(url)
+
+    def _prefetch_worker(self):
+        while True:
+            url = self._prefetch_queue.get()
+            try:
+                self.get(url)
+            except Exception as e:
+                logger.debug(f"Cover prefetch failed: {e}")
+            finally:
+                with self._lock:
+                    self._prefetching.discard(self._key(url))
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for eviction
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Cover cache read error: {e}")
+            return None
+
+    def _write_disk(self, key, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = self._scan_disk_bytes()
+                else:
+                    self._disk_bytes += len(data)
+                over = self._disk_bytes > self.max_disk_bytes
+            if over:
+                self._evict()
+        except OSError as e:
+            logger.warning(f"Cover cache write error: {e}")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.img'):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                    entries.append((st.st_mtime, st.st_size, name))
+                except OSError:
+                    pass
+        return entries
+
+    def _scan_disk_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Deletes least recently used files until the store is back under 90% of its budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for _, size, name in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_items': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'fetch_errors': self.fetch_errors,
+                'evictions': self.evictions,
+                'prefetches': self.prefetches,
+                'prefetches_skipped': self.prefetches_skipped,
+                'disk_bytes': self._disk_bytes,
+            }
+
+
+_cover_cache = None
+_cover_cache_lock = threading.Lock()
+
+
+def get_cover_cache():
+    """Process-wide cover cache shared by tagging and the UI."""
+    global _cover_cache
+    with _cover_cache_lock:
+        if _cover_cache is None:
+            directory = Config.COVER_CACHE_DIR or os.path.join(Config.OUTPUT_DIR, ".cover_cache")
+            _cover_cache = CoverCache(directory, max_disk_bytes=Config.COVER_CACHE_MAX_MB * 1024 * 1024)
+            cache, metrics = _cover_cache, get_metrics()
+            for result in ('memory_hits', 'disk_hits', 'misses'):
+                metrics.counter(
+                    'spufify_cover_cache_lookups_total', "Cover cache lookups by result",
+                    labels={'result': result}, fn=lambda result=result: getattr(cache, result)
+                )
+        return _cover_cache
@@ -0,0 +1,156 @@
+import time
+import bisect
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from spufify.config import Config
+from spufify.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the request latency histogram buckets
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that limits in-flight requests and reports every send()
+    (including the ones spotipy makes through the shared session) to its client.
+    The limit applies per attempt, so urllib3's retry backoff sleeps without a slot.
+    """
+    def __init__(self, client, **kwargs):
+        self._client = client
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        client = self._client
+
+        class _ClientPool:
+            def _new_conn(self):
+                # Count fresh TCP/TLS connections so the reuse ratio can be reported
+                client._on_new_connection()
+                return super()._new_conn()
+
+            def _make_request(self, *args, **kwargs):
+                # One request on the wire (a single attempt of a retried one) per slot
+                with client._slots:
+                    return super()._make_request(*args, **kwargs)
+
+        class _CountingHTTPPool(_ClientPool, HTTPConnectionPool):
+            pass
+
+        class _CountingHTTPSPool(_ClientPool, HTTPSConnectionPool):
+            pass
+
+        self.poolmanager.pool_classes_by_scheme = {'http': _CountingHTTPPool, 'https': _CountingHTTPSPool}
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self._client.timeout
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            self._client._on_request(time.perf_counter() - start, ok=False)
+            raise
+        self._client._on_request(time.perf_counter() - start, ok=response.status_code < 400)
+        return response
+
+
+class HttpClient:
+    """
+    One requests.Session for all outbound traffic (Spotify API, cover art):
+    keep-alive connection pooling, a cap on concurrent requests, a default
+    timeout and retry with exponential backoff on connection errors and 5xx.
+    429s are returned to the caller so it can back off on its own schedule.
+    """
+    def __init__(self, pool_size=8, max_concurrency=4, timeout=10, retries=3, backoff_factor=0.5):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=None,  # Spotify token refreshes are POSTs
+            raise_on_status=False,
+            # A 429 (or 503) with Retry-After would otherwise be retried here, holding up the caller
+            respect_retry_after_header=False
+        )
+        self.session = requests.Session()
+        adapter = _PooledAdapter(self, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Stats
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.total_latency = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def _on_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def _on_request(self, seconds, ok):
+        ms = seconds * 1000
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            self.total_latency += seconds
+            self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    def stats(self):
+        with self._lock:
+            requests_made = self.requests
+            buckets = {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram)}
+            buckets['gt_10000ms'] = self.histogram[-1]
+            return {
+                'requests': requests_made,
+                'errors': self.errors,
+                'new_connections': self.new_connections,
+                'reuse_ratio': 1.0 - self.new_connections / requests_made if requests_made else 0.0,
+                'avg_latency_ms': self.total_latency / requests_made * 1000 if requests_made else 0.0,
+                'latency_histogram': buckets,
+            }
+
+
+def _register_metrics(client):
+    metrics = get_metrics()
+    metrics.counter('spufify_http_requests_total', "Outbound HTTP requests (Spotify API + covers)",
+                    fn=lambda: client.requests)
+    metrics.counter('spufify_http_errors_total', "Outbound HTTP requests that failed", fn=lambda: client.errors)
+    metrics.counter('spufify_http_new_connections_total', "TCP/TLS connections opened by the pool",
+                    fn=lambda: client.new_connections)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Process-wide HTTP client shared by SpotifyClient, Processor and the UI."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient(
+                pool_size=Config.HTTP_POOL_SIZE,
+                max_concurrency=Config.HTTP_MAX_CONCURRENCY,
+                timeout=Config.HTTP_TIMEOUT_SEC,
+                retries=Config.HTTP_RETRIES
+            )
+            _register_metrics(_http_client)
+        return _http_client
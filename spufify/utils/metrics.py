@@ -0,0 +1,317 @@
+import os
+import json
+import math
+import time
+import bisect
+import logging
+import threading
+from spufify.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels, fn=None):
+        self.name = name
+        self.help = help
+        self.labels = labels  # Tuple of (key, value) pairs
+        self.fn = fn  # Read at scrape time instead of being updated (costs the hot path nothing)
+        self.value = 0
+
+    def read(self):
+        if self.fn is None:
+            return self.value
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.debug(f"Metric {self.name} could not be read: {e}")
+            return math.nan
+        return math.nan if value is None else value
+
+
+class Counter(_Metric):
+    """
+    Monotonic count. inc() is a plain attribute update: under the GIL a rare
+    lost increment between two threads is accepted in exchange for no lock.
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_max(self, value):
+        """High-water mark: keeps the largest value seen."""
+        if value > self.value:
+            self.value = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram (Prometheus semantics: a value lands in the first bucket with bound >= value)."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def time(self):
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def read(self):
+        counts = list(self.counts)
+        cumulative, total = [], 0
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'buckets': dict(zip([str(bound) for bound in self.bounds] + ['+Inf'], cumulative)),
+        }
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms for the whole pipeline. Metrics are
+    created once (get-or-create by name and labels) and then updated without
+    locking; scraping reads them as they are. Values that already live
+    elsewhere (ring buffer fill, pool queue depth) are registered with `fn`
+    and only read when scraped.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _get(self, cls, name, help, labels, fn=None, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = cls(name, help, key[1], **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            if fn is not None:
+                metric.fn = fn  # The newest owner (e.g. a restarted recorder) reports
+            return metric
+
+    def counter(self, name, help="", labels=None, fn=None):
+        return self._get(Counter, name, help, labels, fn=fn)
+
+    def gauge(self, name, help="", labels=None, fn=None):
+        return self._get(Gauge, name, help, labels, fn=fn)
+
+    def histogram(self, name, help="", labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def _families(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+        return families
+
+    def snapshot(self):
+        """All metrics as a JSON-friendly dict: {name: {type, help, values: [{labels, value}]}}."""
+        result = {}
+        for name, metrics in sorted(self._families().items()):
+            values = []
+            for metric in metrics:
+                value = metric.read()
+                if isinstance(value, float) and math.isnan(value):
+                    value = None
+                values.append({'labels': dict(metric.labels), 'value': value})
+            result[name] = {'type': metrics[0].kind, 'help': metrics[0].help, 'values': values}
+        return result
+
+    def prometheus_text(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, metrics in sorted(self._families().items()):
+            lines.append(f"# HELP {name} {metrics[0].help}")
+            lines.append(f"# TYPE {name} {metrics[0].kind}")
+            for metric in metrics:
+                value = metric.read()
+                if metric.kind != 'histogram':
+                    if isinstance(value, float) and math.isnan(value):
+                        continue  # Owner gone or unreadable: no sample
+                    lines.append(f"{name}{_format_labels(metric.labels)} {_format_value(value)}")
+                    continue
+                for bound, count in value['buckets'].items():
+                    lines.append(f"{name}_bucket{_format_labels(metric.labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_sum{_format_labels(metric.labels)} {_format_value(float(value['sum']))}")
+                lines.append(f"{name}_count{_format_labels(metric.labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Local HTTP endpoint: /metrics (Prometheus text) and /metrics.json."""
+    def __init__(self, registry, port, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Only needed with METRICS_PORT set
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body, content_type = registry.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body, content_type = json.dumps(registry.snapshot()).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+        logger.info(f"Metrics endpoint: http://{host}:{self.port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsDumper:
+    """
+    Writes the registry to a JSON file every `interval` seconds (atomically),
+    with per-second rates of the counters since the previous dump.
+    """
+    def __init__(self, registry, path, interval):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.dumps = 0
+        self._previous = None  # (time, {counter key: value})
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        now = time.monotonic()
+        snapshot = self.registry.snapshot()
+        counters = {
+            (name, json.dumps(entry['labels'], sort_keys=True)): entry
+            for name, family in snapshot.items() if family['type'] == 'counter'
+            for entry in family['values'] if entry['value'] is not None
+        }
+        if self._previous:
+            since, previous = self._previous
+            for key, entry in counters.items():
+                if key in previous and now > since:
+                    entry['rate_per_sec'] = max(0.0, entry['value'] - previous[key]) / (now - since)
+        self._previous = (now, {key: entry['value'] for key, entry in counters.items()})
+        document = {'timestamp': time.time(), 'uptime_sec': time.time() - self.registry.started_at, 'metrics': snapshot}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(document, f, indent=1)
+            os.replace(tmp_path, self.path)
+            self.dumps += 1
+        except OSError as e:
+            logger.warning(f"Could not write metrics dump: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join(timeout=2.0)
+        self.dump()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide metrics registry shared by the recorder, processor, controller and Spotify client."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+
+def start_exporters():
+    """Starts the HTTP endpoint and/or the periodic JSON dump enabled in Config. Returns them (call stop())."""
+    exporters = []
+    if Config.METRICS_PORT is not None:
+        try:
+            exporters.append(MetricsServer(get_metrics(), Config.METRICS_PORT))
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on port {Config.METRICS_PORT}: {e}")
+    if Config.METRICS_DUMP_SEC:
+        path = Config.METRICS_DUMP_PATH or os.path.join(Config.OUTPUT_DIR, ".metrics.json")
+        exporters.append(MetricsDumper(get_metrics(), path, Config.METRICS_DUMP_SEC))
+    return exporters